@@ -0,0 +1,6 @@
+"""Benchmarks of SIFT's hot paths.
+
+The suites follow the conventions of `airspeed velocity <https://asv.readthedocs.io>`_
+(``time_*`` and ``track_*`` methods, ``params`` and ``setup``) and can be run with
+``asv run`` or without any extra dependency with ``python -m benchmarks.run``.
+"""
@@ -0,0 +1,77 @@
+"""Benchmarks of the tile calculations and the retile pipeline run on every pan and zoom."""
+
+import numpy as np
+
+from uwsift.common import Box
+
+from .common import TiledImage, full_disk_memmap, measure_allocations, stride_for
+
+CANVAS_SIZES = [(800, 600), (1920, 1080), (3840, 2160)]
+CANVAS_NAMES = ["{}x{}".format(*size) for size in CANVAS_SIZES]
+
+
+class TileCalculatorSuite:
+    """View dependent calculations of the TileCalculator done for every assessment of a layer."""
+
+    params = (CANVAS_NAMES, [1.0, 4.0, 16.0])
+    param_names = ["canvas", "zoom"]
+
+    def setup(self, canvas, zoom):
+        self.image = TiledImage()
+        self.view_box = self.image.zoomed_view_box(CANVAS_SIZES[CANVAS_NAMES.index(canvas)], zoom)
+        self.stride = self.image.calc.calc_stride(self.view_box)
+
+    def time_calc_stride(self, canvas, zoom):
+        self.image.calc.calc_stride(self.view_box)
+
+    def time_visible_tiles(self, canvas, zoom):
+        self.image.calc.visible_tiles(self.view_box, stride=self.stride, extra_tiles_box=Box(1, 1, 1, 1))
+
+
+class RetileSuite:
+    """Preparation of texture and vertex tiles in the background thread for one retile of a full disk image."""
+
+    params = (CANVAS_NAMES, [1, 2, 4, 8])
+    param_names = ["canvas", "stride"]
+    number = 1
+    repeat = 3
+
+    def setup(self, canvas, stride):
+        self.full_disk = full_disk_memmap()
+        self.image = TiledImage(shape=self.full_disk.shape)
+        view_box = self.image.strided_view_box(CANVAS_SIZES[CANVAS_NAMES.index(canvas)], stride)
+        self.stride, self.tile_box = self.image.assess_view(view_box)
+        assert self.stride == stride_for(stride)  # nosec B101
+        # strided like the scene graph does before handing the content to the visual
+        self.data = self.full_disk[:: self.stride[0], :: self.stride[1]]
+        # vertex tiles can only be built for tiles in the texture
+        self.image._build_texture_tiles(self.data, self.stride, self.tile_box)
+
+    def _build_texture_tiles(self):
+        # start from an empty texture, otherwise all tiles are already in and skipped
+        self.image.texture_state.reset()
+        return self.image._build_texture_tiles(self.data, self.stride, self.tile_box)
+
+    def _retile(self):
+        tiles_info = self._build_texture_tiles()
+        return tiles_info, self.image._build_vertex_tiles(self.stride, self.tile_box)
+
+    def time_build_texture_tiles(self, canvas, stride):
+        self._build_texture_tiles()
+
+    def time_build_vertex_tiles(self, canvas, stride):
+        self.image._build_vertex_tiles(self.stride, self.tile_box)
+
+    def time_retile(self, canvas, stride):
+        self._retile()
+
+    def track_retile_allocated_bytes(self, canvas, stride):
+        return measure_allocations(self._retile)
+
+    track_retile_allocated_bytes.unit = "bytes"
+
+    def track_num_tiles(self, canvas, stride):
+        box = self.tile_box
+        return int(np.prod([box.bottom - box.top, box.right - box.left]))
+
+    track_num_tiles.unit = "tiles"
@@ -0,0 +1,212 @@
+"""Benchmarks of the workspace from collecting the metadata of new files to purging their content.
+
+Every suite imports synthetic ABI L1b full disk granules with the Satpy
+``abi_l1b`` reader into a new ``SimpleWorkspace`` or ``CachingWorkspace``,
+optionally resampled to the 9 km SEVIRI full disk grid. Merging segments into
+existing content is measured with synthetic AHI HRIT segments read by the
+``ahi_hrit`` reader.
+"""
+
+import shutil
+import tempfile
+
+import xarray as xr
+from satpy import Scene
+
+import uwsift.model  # noqa: F401, resolves the import cycle between uwsift.model and uwsift.workspace
+import uwsift.workspace.importer
+from uwsift.common import Info
+from uwsift.workspace import CachingWorkspace, SimpleWorkspace
+from uwsift.workspace.statistics import dataset_statistical_analysis
+
+from .common import abi_l1b_granules, ahi_hrit_segments, measure_allocations
+
+READER = "abi_l1b"
+SEGMENTED_READER = "ahi_hrit"
+WORKSPACES = {"simple": SimpleWorkspace, "caching": CachingWorkspace}
+RESAMPLING = {
+    "none": None,
+    "nearest": {
+        "resampler": "nearest",
+        "area_id": "msg_seviri_fes_9km",
+        "radius_of_influence": 20000,
+        "shape": (1237, 1237),
+        "custom": False,
+    },
+}
+
+
+class _WorkspaceBenchmark:
+    """Create a workspace and import the granules up to the stage the suite times."""
+
+    params = (list(WORKSPACES), list(RESAMPLING))
+    param_names = ["workspace", "resampling"]
+    number = 1
+    repeat = 3
+    reader = READER
+
+    def _granule_paths(self):
+        return abi_l1b_granules()
+
+    def setup(self, workspace, resampling):
+        self.paths = self._granule_paths()
+        self.directory = tempfile.mkdtemp(prefix="sift_bench_workspace_")
+        # the caching workspace only works with the inventory database enabled in the storage configuration
+        uwsift.workspace.importer.USE_INVENTORY_DB = workspace == "caching"
+        self.workspace = WORKSPACES[workspace](self.directory)
+        self.importer_kwargs = {
+            "reader": self.reader,
+            "merge_with_existing": False,
+            "resampling_info": RESAMPLING[resampling],
+        }
+        self.uuid = None
+
+    def teardown(self, workspace, resampling):
+        if isinstance(self.workspace, CachingWorkspace):
+            # release the database connections in this thread, otherwise they are garbage collected in another one
+            inventory = self.workspace.metadatabase
+            inventory.SessionRegistry.remove()
+            inventory.connection.close()
+            inventory.engine.dispose()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _importer_kwargs(self):
+        # like the Open File Wizard the scene is created before the import
+        scene = Scene(filenames={self.reader: self.paths})
+        return dict(self.importer_kwargs, scenes={tuple(self.paths): scene})
+
+    def _collect_metadata(self, importer_kwargs):
+        infos = [info for _, info in self.workspace.collect_product_metadata_for_paths(self.paths, **importer_kwargs)]
+        # the granules provide radiances and brightness temperatures, import the latter
+        self.uuid = next(info[Info.UUID] for info in infos if info.get("calibration") == "brightness_temperature")
+        return infos
+
+    def _import_content(self, importer_kwargs):
+        return self.workspace.import_product_content(self.uuid, **importer_kwargs)
+
+    def _deactivate_content(self):
+        if isinstance(self.workspace, CachingWorkspace):
+            with self.workspace.metadatabase as session:
+                self.workspace._deactivate_content_for_product(self.workspace._product_with_uuid(session, self.uuid))
+        else:
+            self.workspace._deactivate_content_for_product(self.workspace._product_with_uuid(None, self.uuid))
+
+
+class CollectMetadataSuite(_WorkspaceBenchmark):
+    def setup(self, workspace, resampling):
+        super().setup(workspace, resampling)
+        self.kwargs = self._importer_kwargs()
+
+    def time_collect_product_metadata(self, workspace, resampling):
+        self._collect_metadata(self.kwargs)
+
+
+class ImportSuite(_WorkspaceBenchmark):
+    def setup(self, workspace, resampling):
+        super().setup(workspace, resampling)
+        self.kwargs = self._importer_kwargs()
+        self._collect_metadata(self.kwargs)
+
+    def time_import_product_content(self, workspace, resampling):
+        self._import_content(self.kwargs)
+
+    def track_import_allocated_bytes(self, workspace, resampling):
+        return measure_allocations(self._import_content, self.kwargs)
+
+    track_import_allocated_bytes.unit = "bytes"
+
+    def track_workspace_bytes(self, workspace, resampling):
+        self._import_content(self.kwargs)
+        # the simple workspace doesn't keep the content files and reports None
+        return self.workspace._total_workspace_bytes
+
+    track_workspace_bytes.unit = "bytes"
+
+
+class ColdContentSuite(_WorkspaceBenchmark):
+    """Access of imported content which is not active anymore.
+
+    The memory map is opened and the statistics are computed again, the
+    operating system may still have the file cached though. Only the caching
+    workspace can reactivate content, the simple workspace removes the content
+    files as soon as they are mapped.
+    """
+
+    params = (["caching"], list(RESAMPLING))
+
+    def setup(self, workspace, resampling):
+        super().setup(workspace, resampling)
+        kwargs = self._importer_kwargs()
+        self._collect_metadata(kwargs)
+        self._import_content(kwargs)
+        self._deactivate_content()
+
+    def time_get_content(self, workspace, resampling):
+        self.workspace.get_content(self.uuid)
+
+
+class WarmContentSuite(_WorkspaceBenchmark):
+    """Access of active content, as done for every probe and retile."""
+
+    def setup(self, workspace, resampling):
+        super().setup(workspace, resampling)
+        kwargs = self._importer_kwargs()
+        self._collect_metadata(kwargs)
+        self._import_content(kwargs)
+        self.content = self.workspace.get_content(self.uuid)
+
+    def time_get_content(self, workspace, resampling):
+        self.workspace.get_content(self.uuid)
+
+    def time_statistics(self, workspace, resampling):
+        dataset_statistical_analysis(xr.DataArray(self.content, attrs=dict(self.workspace.get_info(self.uuid))))
+
+
+class PurgeSuite(_WorkspaceBenchmark):
+    def setup(self, workspace, resampling):
+        super().setup(workspace, resampling)
+        kwargs = self._importer_kwargs()
+        self._collect_metadata(kwargs)
+        self._import_content(kwargs)
+
+    def time_remove_and_purge(self, workspace, resampling):
+        self.workspace.remove(self.uuid)
+        self.workspace.purge_content_for_product_uuids([self.uuid])
+
+
+class MergeSegmentSuite(_WorkspaceBenchmark):
+    """Import of a segment arriving after the other segments of its granule were imported already.
+
+    Like the auto update does with ``merge_with_existing``, the late segment is
+    merged into the content of the existing product instead of importing the
+    whole granule again. Only the simple workspace supports merging and merged
+    data is never resampled. The merge places segments as numbered from south
+    to north like SEVIRI and FCI, the AHI segment therefore ends up in the
+    mirrored rows, which doesn't change the work done.
+    """
+
+    params = (["simple"], ["none"])
+    reader = SEGMENTED_READER
+
+    def _granule_paths(self):
+        return ahi_hrit_segments()
+
+    def setup(self, workspace, resampling):
+        super().setup(workspace, resampling)
+        self.importer_kwargs["merge_with_existing"] = True
+        segments = self.paths
+        self.paths = segments[:-1]
+        self._collect_metadata(self._importer_kwargs())
+        self._import_content(self._importer_kwargs())
+        self.target_uuid = self.uuid
+
+        # the catalogue hands over the grown group, the segments imported already are skipped
+        self.paths = segments
+        self.kwargs = self._importer_kwargs()
+        infos = self._collect_metadata(self.kwargs)
+        info = next(info for info in infos if info[Info.UUID] == self.uuid)
+        merge_target = self.workspace.find_merge_target(self.uuid, info["paths"], info)
+        assert merge_target is not None and merge_target.uuid == self.target_uuid  # nosec B101
+
+    def time_merge_segment(self, workspace, resampling):
+        self.workspace.import_product_content(self.uuid, merge_target_uuid=self.target_uuid, **self.kwargs)
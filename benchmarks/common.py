@@ -0,0 +1,327 @@
+"""Synthetic data and helpers shared by the benchmark suites."""
+
+import os
+import struct
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import xarray as xr
+
+from uwsift.common import (
+    DEFAULT_PROJECTION,
+    DEFAULT_TILE_HEIGHT,
+    DEFAULT_TILE_WIDTH,
+    PREFERRED_SCREEN_TO_TEXTURE_RATIO,
+    Box,
+    Point,
+    ViewBox,
+)
+from uwsift.view.visuals import SIFTTiledGeolocatedMixin
+
+# ABI full disk at 2 km, the most common image size in SIFT
+FULL_DISK_SHAPE = (5424, 5424)
+FULL_DISK_CELL_SIZE = 2004.017315487541
+# same as the scene graph uses for the tiled image layers
+TEXTURE_SHAPE = (4, 16)
+
+_MEMMAPS: dict = {}
+_DATA_DIRECTORY = None
+
+
+def data_directory() -> str:
+    """Get the temporary directory holding the synthetic data of this process.
+
+    The directory is removed by :func:`remove_data` or at the latest when the
+    interpreter exits.
+    """
+    global _DATA_DIRECTORY
+    if _DATA_DIRECTORY is None:
+        _DATA_DIRECTORY = tempfile.TemporaryDirectory(prefix="sift_bench_")
+    return _DATA_DIRECTORY.name
+
+
+def remove_data():
+    """Forget the cached synthetic data and remove the files created for it."""
+    global _DATA_DIRECTORY
+    _MEMMAPS.clear()
+    _GRANULES.clear()
+    _SEGMENTS.clear()
+    if _DATA_DIRECTORY is not None:
+        _DATA_DIRECTORY.cleanup()
+        _DATA_DIRECTORY = None
+
+
+def full_disk_memmap(shape=FULL_DISK_SHAPE, dtype=np.float32, directory=None) -> np.memmap:
+    """Get a memory mapped array looking like a geostationary full disk image.
+
+    The data is smooth inside the earth disk and NaN outside of it, like the
+    content the workspace hands to the retiling. Arrays are created once per
+    process and shape in :func:`data_directory` unless `directory` is given.
+    """
+    key = (tuple(shape), np.dtype(dtype).str)
+    if key in _MEMMAPS:
+        return _MEMMAPS[key]
+    directory = directory or data_directory()
+    path = os.path.join(directory, "full_disk_{}x{}.dat".format(*shape))
+    data = np.memmap(path, dtype=dtype, mode="w+", shape=tuple(shape))
+    radius_y, radius_x = shape[0] / 2.0, shape[1] / 2.0
+    x = (np.arange(shape[1]) - radius_x + 0.5) / radius_x
+    # fill in row blocks to keep the memory usage of the generation low
+    for row in range(0, shape[0], 512):
+        y = (np.arange(row, min(row + 512, shape[0])) - radius_y + 0.5)[:, None] / radius_y
+        dist = x[None, :] ** 2 + y**2
+        block = 200.0 + 100.0 * np.cos(8.0 * x[None, :]) * np.sin(6.0 * y)
+        block[dist >= 1.0] = np.nan
+        data[row : row + block.shape[0]] = block
+    data.flush()
+    _MEMMAPS[key] = data
+    return data
+
+
+class TiledImage(SIFTTiledGeolocatedMixin):
+    """Geolocated tiling of an image without the vispy visual, so no OpenGL context is needed."""
+
+    def __init__(
+        self,
+        shape=FULL_DISK_SHAPE,
+        cell_size=FULL_DISK_CELL_SIZE,
+        tile_shape=(DEFAULT_TILE_HEIGHT, DEFAULT_TILE_WIDTH),
+        texture_shape=TEXTURE_SHAPE,
+    ):
+        self.name = "benchmark"
+        origin_x = -shape[1] / 2.0 * cell_size
+        origin_y = shape[0] / 2.0 * cell_size
+        self._init_geo_parameters(
+            origin_x,
+            origin_y,
+            cell_size,
+            -cell_size,
+            DEFAULT_PROJECTION,
+            texture_shape,
+            tile_shape,
+            False,
+            tuple(shape),
+            None,
+        )
+
+    def view_box(self, canvas_size, world_per_pixel) -> ViewBox:
+        """Get the view of a canvas of `canvas_size` (width, height) pixels centered on the image."""
+        center = self.calc.image_center
+        half_width = canvas_size[0] / 2.0 * world_per_pixel
+        half_height = canvas_size[1] / 2.0 * world_per_pixel
+        return ViewBox(
+            bottom=center.y - half_height,
+            left=center.x - half_width,
+            top=center.y + half_height,
+            right=center.x + half_width,
+            dy=world_per_pixel,
+            dx=world_per_pixel,
+        )
+
+    def zoomed_view_box(self, canvas_size, zoom) -> ViewBox:
+        """Get the view with the whole image width fitting the canvas `zoom` times."""
+        extents = self.calc.image_extents_box
+        return self.view_box(canvas_size, (extents.right - extents.left) / (canvas_size[0] * zoom))
+
+    def strided_view_box(self, canvas_size, stride) -> ViewBox:
+        """Get the view for which the tiling would choose the given `stride`."""
+        world_per_pixel = 0.999 * stride * self.calc.pixel_rez.dx / PREFERRED_SCREEN_TO_TEXTURE_RATIO
+        return self.view_box(canvas_size, world_per_pixel)
+
+    def assess_view(self, view_box):
+        """Stride and tile box a retile for `view_box` would use, as :meth:`assess` determines them."""
+        stride = self._get_stride(view_box)
+        tile_box = self.calc.visible_tiles(view_box, stride=stride, extra_tiles_box=Box(1, 1, 1, 1))
+        return stride, tile_box
+
+
+def stride_for(stride) -> Point:
+    return Point(np.int64(stride), np.int64(stride))
+
+
+def measure_allocations(func, *args, **kwargs) -> int:
+    """Get the peak number of bytes Python allocated while running `func`."""
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+# scan angle (radians) of the outermost pixel centers of the ABI full disk
+ABI_FULL_DISK_SCAN_ANGLE = 0.151844
+
+_GRANULES: dict = {}
+
+
+def write_abi_l1b_granule(directory, start_time, shape=FULL_DISK_SHAPE) -> str:
+    """Write a synthetic GOES-16 ABI L1b full disk file of the 10.3 µm channel (C13).
+
+    The file has the layout the Satpy ``abi_l1b`` reader expects, so importing
+    it runs through the same code as real data. For a `shape` smaller than the
+    native 2 km grid the pixels are enlarged to still cover the full disk.
+    """
+    rows, cols = shape
+    end_time = start_time + timedelta(minutes=10)
+    step_x = 2 * ABI_FULL_DISK_SCAN_ANGLE / cols
+    step_y = 2 * ABI_FULL_DISK_SCAN_ANGLE / rows
+    x = (np.arange(cols) - cols / 2.0 + 0.5) / (cols / 2.0)
+    y = (np.arange(rows) - rows / 2.0 + 0.5)[:, None] / (rows / 2.0)
+    counts = (2000 + 1000 * np.cos(6.0 * x)[None, :] * np.sin(4.0 * y)).astype(np.int16)
+    counts[(x[None, :] ** 2 + y**2) >= 1.0] = 4095  # space
+    radiance = xr.DataArray(
+        counts,
+        dims=("y", "x"),
+        attrs={
+            "scale_factor": 0.04,
+            "add_offset": -1.6,
+            "_FillValue": np.int16(4095),
+            "units": "mW m-2 sr-1 (cm-1)-1",
+            "valid_range": np.array([0, 4094], dtype=np.int16),
+        },
+    )
+    projection = xr.DataArray(
+        np.int32(-2147483647),
+        attrs={
+            "semi_major_axis": 6378137.0,
+            "semi_minor_axis": 6356752.31414,
+            "perspective_point_height": 35786023.0,
+            "longitude_of_projection_origin": -75.0,
+            "latitude_of_projection_origin": 0.0,
+            "sweep_angle_axis": "x",
+        },
+    )
+    granule = xr.Dataset(
+        data_vars={
+            "Rad": radiance,
+            "band_id": np.array([13], dtype=np.int8),
+            "goes_imager_projection": projection,
+            "yaw_flip_flag": np.int8(0),
+            "planck_fk1": np.float32(10803.3),
+            "planck_fk2": np.float32(1392.74),
+            "planck_bc1": np.float32(0.0755),
+            "planck_bc2": np.float32(0.99959),
+            "esun": np.float32(np.nan),
+            "earth_sun_distance_anomaly_in_AU": np.float32(0.99),
+            "nominal_satellite_subpoint_lat": np.float32(0.0),
+            "nominal_satellite_subpoint_lon": np.float32(-75.0),
+            "nominal_satellite_height": np.float32(35786.023),
+        },
+        coords={
+            "x": xr.DataArray(
+                np.arange(cols, dtype=np.int16),
+                dims=("x",),
+                attrs={"scale_factor": step_x, "add_offset": -ABI_FULL_DISK_SCAN_ANGLE + step_x / 2, "units": "rad"},
+            ),
+            "y": xr.DataArray(
+                np.arange(rows, dtype=np.int16),
+                dims=("y",),
+                attrs={"scale_factor": -step_y, "add_offset": ABI_FULL_DISK_SCAN_ANGLE - step_y / 2, "units": "rad"},
+            ),
+            "t": np.float64(0.0),
+        },
+        attrs={
+            "time_coverage_start": start_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "time_coverage_end": end_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "platform_ID": "G16",
+            "scene_id": "Full Disk",
+        },
+    )
+    time_format = "%Y%j%H%M%S0"
+    filename = "OR_ABI-L1b-RadF-M6C13_G16_s{}_e{}_c{}.nc".format(
+        start_time.strftime(time_format), end_time.strftime(time_format), end_time.strftime(time_format)
+    )
+    path = os.path.join(directory, filename)
+    granule.to_netcdf(path)
+    return path
+
+
+def abi_l1b_granules(count=1, shape=FULL_DISK_SHAPE) -> list:
+    """Get the paths of `count` consecutive synthetic ABI full disk granules, created once per process."""
+    key = (count, tuple(shape))
+    if key not in _GRANULES:
+        directory = tempfile.mkdtemp(prefix="granules_", dir=data_directory())
+        start = datetime(2024, 1, 1, 12, 0)
+        _GRANULES[key] = [
+            write_abi_l1b_granule(directory, start + idx * timedelta(minutes=10), shape) for idx in range(count)
+        ]
+    return _GRANULES[key]
+
+
+# Himawari AHI 4 km infrared full disk as disseminated in 10 JMA HRIT segments
+AHI_IR_FULL_DISK_SHAPE = (2750, 2750)
+AHI_SEGMENTS = 10
+AHI_IR_CFAC = 10233137
+
+_SEGMENTS: dict = {}
+
+
+def _hrit_record(hdr_id, payload: bytes) -> bytes:
+    return struct.pack(">BH", hdr_id, len(payload) + 3) + payload
+
+
+def write_ahi_hrit_segment(directory, start_time, segment, shape=AHI_IR_FULL_DISK_SHAPE, segments=AHI_SEGMENTS) -> str:
+    """Write segment `segment` (counting from 1) of a synthetic Himawari AHI 10.4 µm channel (B13) JMA HRIT full disk.
+
+    The file has the layout the Satpy ``ahi_hrit`` reader expects, so
+    segmented data runs through the same code as real data, including the
+    merging of segments into already imported content. `shape` is the shape
+    of the full disk, its rows are split evenly into `segments`.
+    """
+    rows, cols = shape
+    lines = rows // segments
+    scale = AHI_IR_FULL_DISK_SHAPE[1] / cols
+    x = (np.arange(cols) - cols / 2.0 + 0.5) / (cols / 2.0)
+    y = (np.arange((segment - 1) * lines, segment * lines) - rows / 2.0 + 0.5)[:, None] / (rows / 2.0)
+    counts = (8000 + 4000 * np.cos(6.0 * x)[None, :] * np.sin(4.0 * y)).astype(">u2")
+    counts[(x[None, :] ** 2 + y**2) >= 1.0] = 65535  # space
+
+    # modified julian day of the first and the last line
+    mjd = (start_time - datetime(1858, 11, 17)).total_seconds() / 86400.0
+    first_line = (segment - 1) * lines + 1
+    observation_times = "LINE:={}\rTIME:={:.6f}\rLINE:={}\rTIME:={:.6f}\r".format(
+        first_line, mjd + (segment - 1) * 60.0 / 86400.0, first_line + lines - 1, mjd + segment * 60.0 / 86400.0
+    )
+    records = [
+        _hrit_record(1, struct.pack(">BHHB", 16, cols, lines, 0)),
+        _hrit_record(
+            2,
+            struct.pack(
+                ">32siiii",
+                b"GEOS(140.70)".ljust(32),
+                round(AHI_IR_CFAC / scale),
+                round(AHI_IR_CFAC / scale),
+                cols // 2,
+                rows // 2,
+            ),
+        ),
+        _hrit_record(3, b"$HALFTONE:=16\r_NAME:=INFRARED\r_UNIT:=KELVIN\r0:=330.0\r16383:=150.0\r"),
+        _hrit_record(128, struct.pack(">BBH", segment, segments, first_line)),
+        _hrit_record(131, observation_times.encode()),
+    ]
+    header_length = 16 + sum(len(record) for record in records)
+    primary = _hrit_record(0, struct.pack(">BIQ", 0, header_length, counts.size * 16))
+
+    filename = "IMG_DK01IR1_{}_{:03d}".format(start_time.strftime("%Y%m%d%H%M"), segment)
+    path = os.path.join(directory, filename)
+    with open(path, "wb") as fh:
+        fh.write(primary)
+        fh.writelines(records)
+        fh.write(counts.tobytes())
+    return path
+
+
+def ahi_hrit_segments(shape=AHI_IR_FULL_DISK_SHAPE) -> list:
+    """Get the paths of all segments of a synthetic AHI full disk, created once per process."""
+    key = tuple(shape)
+    if key not in _SEGMENTS:
+        directory = tempfile.mkdtemp(prefix="segments_", dir=data_directory())
+        start = datetime(2024, 1, 1, 12, 0)
+        _SEGMENTS[key] = [
+            write_ahi_hrit_segment(directory, start, segment, shape) for segment in range(1, AHI_SEGMENTS + 1)
+        ]
+    return _SEGMENTS[key]
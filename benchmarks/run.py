@@ -0,0 +1,156 @@
+"""Run the benchmark suites without airspeed velocity and write the results as JSON.
+
+Usage::
+
+    python -m benchmarks.run --output results.json --bench RetileSuite
+
+Like with asv, ``setup`` is run before every sample, so benchmarks may change
+the state they are timed on (e.g. remove a dataset from the workspace). Every
+``time_*`` method is sampled ``repeat`` times (a class attribute, default 5)
+after one warm-up sample, so JIT compilation and first time file access are not
+measured. Unless the class defines ``number``, fast methods are called
+repeatedly per sample until at least ``MIN_SAMPLE_TIME`` seconds passed.
+``track_*`` methods report their return value. The synthetic data is removed
+after every suite.
+"""
+
+import argparse
+import importlib
+import inspect
+import itertools
+import json
+import logging
+import pkgutil
+import platform
+import re
+import sys
+from datetime import datetime
+from statistics import median
+from time import perf_counter
+
+LOG = logging.getLogger(__name__)
+
+MIN_SAMPLE_TIME = 0.01
+DEFAULT_REPEAT = 5
+
+
+def iter_suites(package_name="benchmarks"):
+    """Get the benchmark classes of all ``bench_*`` modules of the package."""
+    package = importlib.import_module(package_name)
+    for module_info in pkgutil.iter_modules(package.__path__):
+        if not module_info.name.startswith("bench_"):
+            continue
+        module = importlib.import_module(f"{package_name}.{module_info.name}")
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ == module.__name__ and name.endswith("Suite"):
+                yield f"{module_info.name}.{name}", cls
+
+
+def _param_combinations(cls):
+    params = getattr(cls, "params", None)
+    if params is None:
+        return [()]
+    if not isinstance(params, tuple):
+        params = (params,)
+    return list(itertools.product(*params))
+
+
+def _time_method(instance, name, params, repeat, number):
+    """Time the method `name`, like with asv the instance is set up afresh for every sample."""
+
+    def _sample(calls):
+        if hasattr(instance, "setup"):
+            instance.setup(*params)
+        method = getattr(instance, name)
+        try:
+            start = perf_counter()
+            for _ in range(calls):
+                method(*params)
+            return perf_counter() - start
+        finally:
+            if hasattr(instance, "teardown"):
+                instance.teardown(*params)
+
+    warmup = _sample(1)
+    if number is None:
+        number = max(1, int(MIN_SAMPLE_TIME / max(warmup, 1e-9)))
+    samples = [_sample(number) / number for _ in range(repeat)]
+    return {"unit": "seconds", "number": number, "samples": samples, "min": min(samples), "median": median(samples)}
+
+
+def run_suite(suite_name, cls, pattern=None):
+    """Run all benchmarks of one suite matching the regular expression `pattern`."""
+    methods = [name for name in dir(cls) if name.startswith(("time_", "track_")) and callable(getattr(cls, name))]
+    methods = [name for name in methods if pattern is None or re.search(pattern, f"{suite_name}.{name}")]
+    if not methods:
+        return []
+    param_names = getattr(cls, "param_names", [])
+    results = []
+    for params in _param_combinations(cls):
+        instance = cls()
+        for name in sorted(methods):
+            if name.startswith("time_"):
+                result = _time_method(
+                    instance, name, params, getattr(cls, "repeat", DEFAULT_REPEAT), getattr(cls, "number", None)
+                )
+            else:
+                if hasattr(instance, "setup"):
+                    instance.setup(*params)
+                try:
+                    method = getattr(instance, name)
+                    result = {"unit": getattr(method, "unit", "unit"), "value": method(*params)}
+                finally:
+                    if hasattr(instance, "teardown"):
+                        instance.teardown(*params)
+            result.update(name=f"{suite_name}.{name}", params=dict(zip(param_names, params)))
+            LOG.info("%s %s: %s", result["name"], result["params"], result.get("median", result.get("value")))
+            results.append(result)
+    return results
+
+
+def run(pattern=None, suite_pattern=None):
+    from .common import remove_data
+
+    results = []
+    for suite_name, cls in iter_suites():
+        if suite_pattern is None or re.search(suite_pattern, suite_name):
+            try:
+                results.extend(run_suite(suite_name, cls, pattern=pattern))
+            finally:
+                remove_data()
+    return results
+
+
+def _environment():
+    from uwsift import __version__
+
+    return {
+        "uwsift": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run SIFT's benchmark suites")
+    parser.add_argument("--bench", help="only run the suites matching this regular expression")
+    parser.add_argument("--filter", help="only run the benchmarks (suite.method) matching this regular expression")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file instead of stdout")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every result while running")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    output = {"environment": _environment(), "results": run(pattern=args.filter, suite_pattern=args.bench)}
+    if args.output:
+        with open(args.output, "w") as json_file:
+            json.dump(output, json_file, indent=1, default=str)
+    else:
+        json.dump(output, sys.stdout, indent=1, default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -229,10 +229,11 @@ setup(
     tests_requires=["pytest", "pytest-qt", "pytest-mock"],
     python_requires=">=3.8, <=3.12",  # limiting to 3.12 until ecmwflibs is available for 3.13
     extras_require=extras_require,
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     entry_points={
         "console_scripts": [
             "SIFT = uwsift.__main__:main",
+            "SIFT-batch = uwsift.batch:main",
         ],
     },
     cmdclass={
@@ -66,6 +66,7 @@ from uwsift.util import (
 )
 from uwsift.util.common import normalize_longitude
 from uwsift.util.logger import configure_loggers
+from uwsift.util.tracing import start_tracing
 from uwsift.view.algebraic_config import AlgebraicLayerConfigPane
 from uwsift.view.colormap_editor import ColormapEditor
 from uwsift.view.export_image import ExportImageHelper
@@ -790,33 +791,11 @@ class Main(QtWidgets.QMainWindow):
         self.layer_model = LayerModel(self.document)
 
         self.document.didAddDataset.connect(self.layer_model.add_dataset)
-
-        self.layer_model.didCreateLayer.connect(self.scene_manager.add_node_for_layer)
-        self.layer_model.didAddImageDataset.connect(self.scene_manager.add_node_for_image_dataset)
-        self.layer_model.didAddLinesDataset.connect(self.scene_manager.add_node_for_lines_dataset)
-        self.layer_model.didAddMCImageDataset.connect(self.scene_manager.add_node_for_mc_image_dataset)
-        self.layer_model.didAddPointsDataset.connect(self.scene_manager.add_node_for_points_dataset)
-
-        self.layer_model.didAddSystemLayer.connect(self.scene_manager.add_node_for_system_generated_data)
-
-        self.layer_model.didReorderLayers.connect(self.scene_manager.update_layers_z)
-
-        self.layer_model.didChangeLayerVisible.connect(self.scene_manager.change_layer_visible)
-        self.layer_model.didChangeLayerOpacity.connect(self.scene_manager.change_layer_opacity)
-
-        self.layer_model.didChangeColormap.connect(self.scene_manager.change_dataset_nodes_colormap)
+        self.document.didUpdateBasicDataset.connect(self.layer_model.update_dataset_content)
         self.document.didUpdateUserColormap.connect(self.layer_model.update_user_colormap_for_layers)
-        self.layer_model.didChangeGamma.connect(self.scene_manager.change_dataset_nodes_gamma)
-        self.layer_model.didChangeColorLimits.connect(self.scene_manager.change_dataset_nodes_color_limits)
-
-        self.scene_manager.animation_controller.connect_to_model(self.layer_model)
-        self.layer_model.didActivateProductDataset.connect(self.scene_manager.change_dataset_visible)
-        self.layer_model.didAddCompositeDataset.connect(self.scene_manager.add_node_for_composite_dataset)
-        self.layer_model.didChangeCompositeProductDataset.connect(self.scene_manager.change_node_for_composite_dataset)
-        self.layer_model.willDeleteProductDataset.connect(self.scene_manager.purge_dataset)
-        self.layer_model.didRequestSelectionOfLayer.connect(self.ui.treeView.setCurrentIndex)
 
-        self.layer_model.willRemoveLayer.connect(self.scene_manager.remove_layer_node)
+        self.scene_manager.connect_to_model(self.layer_model)
+        self.layer_model.didRequestSelectionOfLayer.connect(self.ui.treeView.setCurrentIndex)
 
         # Connect to an unnamed slot (lambda: ...) to strip off the argument
         # (of type list) from the signal 'didDeleteProductDataset'
@@ -1409,6 +1388,12 @@ def main() -> int:
     parser.add_argument(
         "--profile-heap", type=float, help="take a snapshot of the heap in the given interval (in seconds)"
     )
+    parser.add_argument(
+        "--trace",
+        metavar="TRACE_JSON",
+        help="record the time spent in import, retiling, statistics, algebra and plotting tasks "
+        "and write it as Chrome trace / Perfetto JSON to the given file on exit",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -1423,6 +1408,9 @@ def main() -> int:
         heap_profiler = HeapProfiler(args.profile_heap)
         heap_profiler.start()
 
+    if args.trace:
+        start_tracing(args.trace)
+
     check_grib_definition_dir()
     check_imageio_deps()
 
@@ -0,0 +1,505 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Render images and animations of products without the GUI.
+
+Example::
+
+    python -m uwsift.batch -r abi_l1b -P C13 -o "{product}_loop.mp4" /data/OR_ABI-L1b-RadF-M6C13_*.nc
+
+The files are grouped into time steps like in the Open File Wizard. Every
+product is loaded into its own workspace, shown with the presentation the
+guidebook and the configuration suggest for it (colormap, color limits) and
+rendered frame by frame on an offscreen vispy canvas by a
+:class:`~uwsift.view.scene_graph.SceneGraphManager`.
+
+Products, and the time steps of a product if there are more processes than
+products, are rendered as independent jobs in separate processes. With an
+image file output (``.png``, ``.jpg``) every frame is written by the job
+rendering it, the frames of an animation (``.gif``, ``.mp4``, ``.m4v``) are
+collected from all jobs of the product and encoded in order afterwards. The
+time spent per stage (scanning the files, setting up, importing, rendering,
+writing, encoding) is logged for every job and summarized at the end.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+from PIL import Image
+from PyQt5.QtQml import QQmlEngine
+from PyQt5.QtWidgets import QApplication
+from satpy.dataset.data_dict import TooManyResults, get_key
+from satpy.dataset.dataid import DataQuery
+from satpy.readers import group_files
+from vispy import app
+
+from uwsift import USE_INVENTORY_DB, config
+from uwsift.control.qml_utils import QmlBackend
+from uwsift.model.document import Document
+from uwsift.model.layer_model import LayerModel
+from uwsift.queue import TaskQueue
+from uwsift.util import DOCUMENT_SETTINGS_DIR
+from uwsift.util.common import create_scenes
+from uwsift.util.logger import configure_loggers
+from uwsift.util.tracing import is_tracing, start_tracing, stop_tracing, trace_span
+from uwsift.view.export_image import (
+    PYAV_ANIMATION_PARAMS,
+    AnimationWriter,
+    ExportImageHelper,
+    is_gif_filename,
+)
+from uwsift.view.scene_graph import SceneGraphManager
+from uwsift.workspace import CachingWorkspace, SimpleWorkspace
+from uwsift.workspace.importer import filter_dataset_ids
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CANVAS_SIZE = "800x600"
+DEFAULT_FPS = 10.0
+DEFAULT_VISPY_BACKEND = "egl"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+ANIMATION_EXTENSIONS = (".gif", ".mp4", ".m4v")
+
+
+class StageTimings:
+    """Accumulate the wall clock time spent per stage of a job."""
+
+    def __init__(self):
+        self.seconds: OrderedDict = OrderedDict()
+
+    @contextmanager
+    def stage(self, name: str):
+
+        start = time.perf_counter()
+        try:
+            with trace_span(f"batch.{name}"):
+                yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def __str__(self):
+        return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.seconds.items())
+
+
+@dataclass
+class BatchJob:
+    """Render the frames of one product for some of its time steps."""
+
+    name: str
+    product: str
+    reader: str
+    data_id: object  # satpy DataID of the product
+    file_groups: list  # one tuple of file paths per time step, in time order
+    frame_paths: list  # where to write the frame of every time step
+    workspace_dir: str
+    canvas_size: tuple
+    projection: Optional[str] = None
+    center: Optional[tuple] = None
+    frame_options: dict = field(default_factory=dict)  # colorbar/footer options as used by the export dialog
+    trace_path: Optional[str] = None
+
+
+@dataclass
+class JobResult:
+    name: str
+    product: str
+    frame_paths: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class HeadlessPipeline:
+    """The parts of the SIFT main window needed to load and render data, without a window."""
+
+    def __init__(self, workspace_dir, canvas_size, projection=None, center=None):
+
+        self.queue = TaskQueue()
+        if USE_INVENTORY_DB:
+            self.workspace = CachingWorkspace(workspace_dir, queue=self.queue)
+        else:
+            self.workspace = SimpleWorkspace(workspace_dir)
+        self.document = Document(self.workspace, config_dir=DOCUMENT_SETTINGS_DIR, queue=self.queue)
+        self.scene_manager = SceneGraphManager(self.document, self.workspace, self.queue, center=center)
+        self.scene_manager.main_canvas.size = canvas_size
+
+        self.layer_model = LayerModel(self.document)
+        self.document.didAddDataset.connect(self.layer_model.add_dataset)
+        self.document.didUpdateBasicDataset.connect(self.layer_model.update_dataset_content)
+        self.scene_manager.connect_to_model(self.layer_model)
+
+        # there is no timeline to show, but the time manager selects the frames through its QML backend
+        time_manager = self.scene_manager.animation_controller.time_manager
+        time_manager.qml_engine = QQmlEngine()
+        time_manager.qml_backend = QmlBackend()
+        time_manager.qml_backend.didJumpInTimeline.connect(self.scene_manager.animation_controller.jump)
+        time_manager.qml_backend.didChangeTimebase.connect(time_manager.on_timebase_change)
+        time_manager.qml_backend.qml_layer_manager = time_manager.qml_layer_manager
+
+        self.layer_model.init_system_layers()
+        self.document.change_projection(projection)
+        self.export_image = ExportImageHelper(None, self.scene_manager, self.layer_model)
+
+    def import_files(self, reader, data_id, file_groups):
+        """Import the product `data_id` for every group of files (time step)."""
+
+        scenes: dict = {}
+        create_scenes(scenes, {group: {reader: list(group)} for group in file_groups})
+        paths = [path for group in file_groups for path in group]
+        importer_kwargs = {
+            "reader": reader,
+            "scenes": scenes,
+            "dataset_ids": [data_id],
+            "merge_with_existing": False,
+        }
+        for _ in self.document.import_files(paths, **importer_kwargs):
+            pass
+
+    def wait_until_idle(self, poll_interval=0.01):
+        """Process events until the background tasks (e.g. retiling) are done."""
+        self.scene_manager.on_view_change(None)
+        while True:
+            QApplication.processEvents()
+            if self.queue.idle:
+                break
+            time.sleep(poll_interval)
+        # deliver the completion signals of the last tasks
+        QApplication.processEvents()
+
+    def iter_frames(self):
+        """Render every frame of the animation, see `SceneGraphManager.iter_screenshot_arrays`."""
+        frame_count = max(self.scene_manager.animation_controller.get_frame_count(), 1)
+        return self.scene_manager.iter_screenshot_arrays(range(frame_count), offscreen=True)
+
+
+_APP = None
+
+
+def _init_app(vispy_backend):
+    """Create the Qt application (for signals and tasks) and select the vispy backend, once per process."""
+    global _APP
+    if _APP is not None:
+        return
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if vispy_backend == "egl":
+        # render without any display server
+        os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+    _APP = QApplication.instance() or QApplication([sys.argv[0]])
+    app.use_app(vispy_backend)
+
+
+def run_job(job: BatchJob, vispy_backend=DEFAULT_VISPY_BACKEND) -> JobResult:
+    """Import, render and write the frames of `job`, errors are logged and reported in the result."""
+    # a job run in the main process is recorded in its trace
+    own_trace = job.trace_path is not None and not is_tracing()
+    if own_trace:
+        start_tracing(job.trace_path)
+    timings = StageTimings()
+    result = JobResult(job.name, job.product, timings=timings.seconds)
+    try:
+        with timings.stage("setup"):
+            _init_app(vispy_backend)
+            pipeline = HeadlessPipeline(job.workspace_dir, job.canvas_size, job.projection, job.center)
+        with timings.stage("import"):
+            pipeline.import_files(job.reader, job.data_id, job.file_groups)
+            pipeline.wait_until_idle()
+
+        frames = pipeline.iter_frames()
+        for frame_path in job.frame_paths:
+            with timings.stage("render"):
+                frame = next(frames, None)
+            if frame is None:
+                break
+            with timings.stage("write"):
+                image = pipeline.export_image.compose_frame(job.frame_options, *frame)
+                if frame_path.lower().endswith((".jpg", ".jpeg")):
+                    image = image.convert("RGB")
+                image.save(frame_path)
+            result.frame_paths.append(frame_path)
+        frames.close()
+
+        if len(result.frame_paths) != len(job.frame_paths):
+            LOG.warning(f"{job.name}: rendered {len(result.frame_paths)} of {len(job.frame_paths)} frames")
+    except Exception as err:  # reported in the summary, the other jobs continue
+        LOG.exception(f"{job.name}: batch rendering failed")
+        result.error = f"{type(err).__name__}: {err}"
+    LOG.info(f"{job.name}: {timings}")
+    if own_trace:
+        stop_tracing()
+    return result
+
+
+def _run_job_in_worker(job_and_backend) -> JobResult:
+    return run_job(*job_and_backend)
+
+
+def run_jobs(jobs: list, processes: int, vispy_backend=DEFAULT_VISPY_BACKEND) -> list:
+    """Run the jobs, each in a fresh process if there is more than one.
+
+    Fresh processes are needed because the task queue and the workspace
+    database are singletons per process.
+    """
+    if len(jobs) == 1:
+        return [run_job(jobs[0], vispy_backend)]
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes=min(processes, len(jobs)), maxtasksperchild=1) as pool:
+        return pool.map(_run_job_in_worker, [(job, vispy_backend) for job in jobs], chunksize=1)
+
+
+def group_time_steps(paths, reader):
+    """Group the files into time steps.
+
+    Returns:
+        The list of ``(start_time, file_group)`` tuples in time order and the
+        satpy DataIDs of all products found.
+    """
+
+    group_keys = config.get(f"data_reading.{reader}.group_keys", None)
+    file_groups = group_files(paths, reader=reader, group_keys=group_keys)
+    # like in the Open File Wizard a group is identified by its sorted files
+    file_group_map = {
+        tuple(sorted(fn for group in file_group.values() for fn in group)): file_group for file_group in file_groups
+    }
+    scenes: dict = {}
+    data_ids = create_scenes(scenes, file_group_map)
+    time_steps = sorted((scene.start_time, group) for group, scene in scenes.items())
+    return time_steps, data_ids
+
+
+def select_products(data_ids, products=None) -> OrderedDict:
+    """Choose the DataID to render for every product name.
+
+    Args:
+        data_ids: DataIDs available in the files
+        products: names of the products, optionally with the calibration
+            (``C13:radiance``). If not given, all products are rendered.
+    """
+
+    data_ids = list(filter_dataset_ids(data_ids))
+    if not products:
+        return OrderedDict((data_id["name"], data_id) for data_id in sorted(data_ids))
+    selected = OrderedDict()
+    for product in products:
+        name, _, calibration = product.partition(":")
+        query = DataQuery(name=name, calibration=calibration) if calibration else DataQuery(name=name)
+        try:
+            selected[name] = get_key(query, data_ids)
+        except (KeyError, TooManyResults):
+            raise ValueError(f"Product '{product}' isn't available in the files") from None
+    return selected
+
+
+def _chunks(items, num_chunks):
+    size = math.ceil(len(items) / num_chunks)
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def create_jobs(args, time_steps, products, frame_dir, workspace_dir) -> tuple[list, OrderedDict]:
+    """Split the rendering of all products into jobs.
+
+    Returns:
+        The jobs and, for animation outputs, the filename of the animation of every product.
+    """
+    is_animation = args.output.lower().endswith(ANIMATION_EXTENSIONS)
+    chunks_per_product = max(1, math.ceil(args.processes / len(products)))
+    frame_options = {"colorbar": args.colorbar, "include_footer": args.footer, "font_size": args.font_size}
+
+    jobs = []
+    animations = OrderedDict()
+    for product, data_id in products.items():
+        frames = list(enumerate(time_steps))
+        if is_animation:
+            animations[product] = args.output.format(product=product, start_time=time_steps[0][0], frame=0)
+        for chunk_idx, chunk in enumerate(_chunks(frames, chunks_per_product)):
+            name = product if chunks_per_product == 1 else f"{product}_{chunk_idx}"
+            if is_animation:
+                frame_paths = [os.path.join(frame_dir, f"{product}_{frame:05d}.png") for frame, _ in chunk]
+            else:
+                frame_paths = [
+                    args.output.format(product=product, start_time=start_time, frame=frame)
+                    for frame, (start_time, _) in chunk
+                ]
+            jobs.append(
+                BatchJob(
+                    name=name,
+                    product=product,
+                    reader=args.reader,
+                    data_id=data_id,
+                    file_groups=[group for _, (_, group) in chunk],
+                    frame_paths=frame_paths,
+                    workspace_dir=os.path.join(workspace_dir, name),
+                    canvas_size=args.size,
+                    projection=args.projection,
+                    center=tuple(args.center) if args.center else None,
+                    frame_options=frame_options,
+                    trace_path=f"{os.path.splitext(args.trace)[0]}_{name}.json" if args.trace else None,
+                )
+            )
+    return jobs, animations
+
+
+def _animation_parameters(filename, fps, num_frames):
+
+    if is_gif_filename(filename):
+        # PIL duration in milliseconds
+        return {"duration": [1000.0 / fps] * num_frames, "loop": 0}
+    return dict(PYAV_ANIMATION_PARAMS, fps=float(fps))
+
+
+def encode_animation(filename, frame_paths, fps):
+    """Stream the frame images into the animation file."""
+
+    params = _animation_parameters(filename, fps, len(frame_paths))
+    writer = AnimationWriter(filename, params, lambda _, path: Image.open(path))
+    writer.start()
+    try:
+        for frame_path in frame_paths:
+            writer.put(None, frame_path)
+    finally:
+        writer.finish()
+
+
+def encode_animations(animations, results, fps):
+    """Encode the animation of every product whose jobs all succeeded.
+
+    A failed job leaves a gap in the frames of its product, so no animation
+    is written for that product rather than one silently missing frames.
+    """
+    for product, filename in animations.items():
+        product_results = [result for result in results if result.product == product]
+        failed = [result.name for result in product_results if result.error]
+        if failed:
+            LOG.error(f"{product}: not writing {filename}, rendering failed in {', '.join(failed)}")
+            continue
+        frame_paths = [path for result in product_results for path in result.frame_paths]
+        if frame_paths:
+            encode_animation(filename, frame_paths, fps)
+
+
+def _canvas_size(text):
+    try:
+        width, height = (int(x) for x in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got '{text}'") from None
+    return width, height
+
+
+def _validate_output(parser, args, num_products, num_frames):
+    output = args.output.lower()
+    if not output.endswith(IMAGE_EXTENSIONS + ANIMATION_EXTENSIONS):
+        parser.error(f"unsupported output format: {args.output}")
+    if num_products > 1 and "{product" not in args.output:
+        parser.error("the output filename needs a {product} field to render more than one product")
+    if output.endswith(IMAGE_EXTENSIONS) and num_frames > 1 and not ("{start_time" in output or "{frame" in output):
+        parser.error("the output filename needs a {start_time} or {frame} field to write more than one frame")
+
+
+def _log_summary(results, timings):
+    totals = StageTimings()
+    for result in results:
+        for name, seconds in result.timings.items():
+            totals.seconds[name] = totals.seconds.get(name, 0.0) + seconds
+        status = f"failed ({result.error})" if result.error else f"{len(result.frame_paths)} frames"
+        LOG.info(f"{result.name}: {status}; {', '.join(f'{n} {s:.2f}s' for n, s in result.timings.items())}")
+    LOG.info(f"total (all jobs): {totals}")
+    LOG.info(f"total (main process): {timings}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Render images and animations of products without the SIFT GUI")
+    parser.add_argument("files", nargs="+", help="data files to render")
+    parser.add_argument("-r", "--reader", required=True, help="Satpy reader to load the files with")
+    parser.add_argument(
+        "-P",
+        "--product",
+        dest="products",
+        action="append",
+        metavar="NAME[:CALIBRATION]",
+        help="product to render [MULTIPLE ALLOWED], all products in the files if not given",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="output filename, may contain the fields {product}, {start_time} and {frame}, e.g. "
+        "'{product}_{start_time:%%Y%%m%%d_%%H%%M}.png' for one image per frame or '{product}.mp4' for an animation",
+    )
+    parser.add_argument(
+        "-w",
+        "--workspace-dir",
+        help="keep the workspaces of the jobs in this directory, so that a caching workspace can reuse the imported "
+        "content when rendering the same files again (default: temporary directory)",
+    )
+    parser.add_argument("--size", type=_canvas_size, default=DEFAULT_CANVAS_SIZE, help="canvas size WIDTHxHEIGHT")
+    parser.add_argument("--projection", help="name of the area definition to display the data in")
+    parser.add_argument("-c", "--center", nargs=2, type=float, help="center longitude and latitude for camera")
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS, help="frames per second of animations")
+    parser.add_argument("--colorbar", choices=("vertical", "horizontal"), help="append a colorbar to the frames")
+    parser.add_argument("--footer", action="store_true", help="add a footer with the product name to the frames")
+    parser.add_argument("--font-size", type=int, default=11, help="font size of the footer")
+    parser.add_argument(
+        "-j",
+        "--processes",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of processes rendering products or time steps in parallel (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--vispy-backend",
+        default=DEFAULT_VISPY_BACKEND,
+        help="vispy backend creating the OpenGL context, 'egl' renders without a display",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="TRACE_JSON",
+        help="record the time spent per stage and in SIFT's hot paths as Chrome trace JSON, "
+        "every job writes its own file next to it named after the job",
+    )
+    args = parser.parse_args(argv)
+
+    configure_loggers()
+    if args.trace:
+        start_tracing(args.trace)
+
+    timings = StageTimings()
+    with timings.stage("scan"):
+        time_steps, data_ids = group_time_steps(args.files, args.reader)
+        try:
+            products = select_products(data_ids, args.products)
+        except ValueError as err:
+            parser.error(str(err))
+    if not time_steps or not products:
+        parser.error("no products found in the files")
+    _validate_output(parser, args, len(products), len(time_steps))
+
+    frame_dir = tempfile.mkdtemp(prefix="sift_batch_frames_")
+    workspace_dir = args.workspace_dir or tempfile.mkdtemp(prefix="sift_batch_workspace_")
+    try:
+        jobs, animations = create_jobs(args, time_steps, products, frame_dir, workspace_dir)
+        LOG.info(f"Rendering {len(time_steps)} time steps of {len(products)} products in {len(jobs)} jobs")
+        results = run_jobs(jobs, args.processes, args.vispy_backend)
+
+        with timings.stage("encode"):
+            encode_animations(animations, results, args.fps)
+    finally:
+        shutil.rmtree(frame_dir, ignore_errors=True)
+        if not args.workspace_dir:
+            shutil.rmtree(workspace_dir, ignore_errors=True)
+
+    _log_summary(results, timings)
+    return 1 if any(result.error for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
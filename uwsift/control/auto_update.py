@@ -6,7 +6,7 @@ from uuid import UUID
 from vispy import app
 
 from uwsift import config
-from uwsift.model.catalogue import Catalogue
+from uwsift.model.catalogue import Catalogue, CatalogueIndex
 from uwsift.queue import TASK_DOING, TASK_PROGRESS, TheQueue
 
 LOG = logging.getLogger(__name__)
@@ -16,6 +16,7 @@ class StartTimeGranuleUpdatePolicy:
     def __init__(self, query_catalogue_for_satpy_importer_args: Callable):
         self._query_catalogue_for_satpy_importer_args = query_catalogue_for_satpy_importer_args
         self._last_scene_files = None
+        self._last_scene_start_time = None
 
     # Check scenes list returned from catalogue
     # Compare last found scene with scene loaded in the previous update,
@@ -37,9 +38,15 @@ class StartTimeGranuleUpdatePolicy:
         if not sorted_scenes_dict:
             return None
         most_recent_scene_item = sorted_scenes_dict.pop()
+        start_time = most_recent_scene_item[1].start_time
+        if self._last_scene_start_time is not None and start_time < self._last_scene_start_time:
+            # late files of an older granule
+            return None
 
+        # the granule loaded last is loaded again when it grew by late files, they are merged into the loaded data
         if most_recent_scene_item[0] != self._last_scene_files:
             self._last_scene_files = deepcopy(most_recent_scene_item[0])
+            self._last_scene_start_time = start_time
 
             importer_kwargs = {
                 "reader": reader_scenes_ds_ids["reader"],
@@ -70,6 +77,9 @@ class AutoUpdateManager:
         self._old_uuids = []
 
         self._init_catalogue()
+        self._catalogue_index = CatalogueIndex(
+            self.reader, self.search_path, self.filter_patterns, self.group_keys, self.products
+        )
 
         def update_in_background(event):
             TheQueue.add("auto update", self.update(), None)
@@ -84,9 +94,8 @@ class AutoUpdateManager:
         self._auto_update_policy = StartTimeGranuleUpdatePolicy(self._query_for_satpy_importer_kwargs_and_readers)
 
     def _query_for_satpy_importer_kwargs_and_readers(self, current_constraints):
-        return Catalogue.query_for_satpy_importer_kwargs_and_readers(
-            self.reader, self.search_path, self.filter_patterns, self.group_keys, current_constraints, self.products
-        )
+        # only groups of files which are new since the previous update cycle are reported
+        return self._catalogue_index.query_for_satpy_importer_kwargs_and_readers(current_constraints)
 
     def _init_catalogue(self):
         catalogue_config = config.get("catalogue", None)
@@ -1,5 +1,10 @@
 from datetime import datetime
-from typing import Callable, List, Optional
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+from uuid import UUID
+
+import numpy as np
+
+from uwsift.control.time_matcher_policies import epoch_microseconds
 
 
 class TimeMatcher:
@@ -13,3 +18,70 @@ class TimeMatcher:
             policy = self.policy
         matched = policy(timeline, t_sim)
         return matched
+
+
+class _LayerMatches(NamedTuple):
+    timeline_version: int
+    epochs: np.ndarray
+    dataset_uuids: List[UUID]
+    # index into dataset_uuids for every time step of the driving timeline, -1 where there is no match
+    matches: np.ndarray
+
+
+class TimeMatchTable:
+    """Matches of every time step of the driving timeline to the datasets of the dynamic layers.
+
+    The timeline of each layer is kept as a sorted array of epoch
+    microseconds and matched to the whole driving timeline at once with an
+    index policy (see ``INDEX_POLICIES`` in
+    :mod:`uwsift.control.time_matcher_policies`). The matches of a layer are
+    only computed again when its timeline changed, so matching the times of
+    an animation tick is a lookup in the table.
+    """
+
+    def __init__(self, index_policy: Callable):
+        self.index_policy = index_policy
+        self._driving_timeline: Optional[Sequence[datetime]] = None
+        self._driving_index: Dict[datetime, int] = {}
+        self._driving_epochs = np.empty(0, dtype=np.int64)
+        self._layers: Dict[UUID, _LayerMatches] = {}
+
+    def set_driving_timeline(self, timeline: Optional[Sequence[datetime]]):
+        """Set the timeline the table is computed for, the driving policy replaces it whenever it changes."""
+        if timeline is self._driving_timeline:
+            return
+        self._driving_timeline = timeline
+        self._driving_index = {t: idx for idx, t in enumerate(timeline or ())}
+        self._driving_epochs = epoch_microseconds(timeline or ())
+        self._layers.clear()
+
+    def match(self, layers, t_sim: datetime) -> dict:
+        """Get the dataset UUID (or None) matching `t_sim` for every layer, in the form of
+        :meth:`uwsift.model.time_manager.TimeManager._match_times`."""
+        row = self._driving_index.get(t_sim)
+        t_matched_dict = {}
+        for layer in layers:
+            layer_matches = self._layer_matches(layer)
+            if row is not None:
+                idx = layer_matches.matches[row]
+            else:
+                # not a time step of the driving timeline (e.g. there is none)
+                idx = self.index_policy(layer_matches.epochs, epoch_microseconds([t_sim]))[0]
+            t_matched_dict[layer.uuid] = [layer_matches.dataset_uuids[idx] if idx >= 0 else None]
+        if len(self._layers) > len(t_matched_dict):
+            # forget the removed layers
+            self._layers = {uuid: self._layers[uuid] for uuid in t_matched_dict}
+        return t_matched_dict
+
+    def _layer_matches(self, layer) -> _LayerMatches:
+        layer_matches = self._layers.get(layer.uuid)
+        if layer_matches is None or layer_matches.timeline_version != layer.timeline_version:
+            timeline = layer.timeline
+            epochs = epoch_microseconds(timeline.keys())
+            layer_matches = self._layers[layer.uuid] = _LayerMatches(
+                layer.timeline_version,
+                epochs,
+                [product_dataset.uuid for product_dataset in timeline.values()],
+                self.index_policy(epochs, self._driving_epochs),
+            )
+        return layer_matches
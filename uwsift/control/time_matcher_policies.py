@@ -1,8 +1,12 @@
-from datetime import datetime
-from typing import List, Optional
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional
 
 import numpy as np
 
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
 
 # Example time Matching policies
 def find_nearest(ref: List[datetime], query: datetime) -> Optional[datetime]:
@@ -13,11 +17,40 @@ def find_nearest(ref: List[datetime], query: datetime) -> Optional[datetime]:
 
 
 def find_nearest_past(ref: List[datetime], query: datetime) -> Optional[datetime]:
-    query_np = np.asarray(query)
-    ref_np = np.array([t for t in ref])
-    past_idcs = ref_np <= query_np
-    if np.any(past_idcs):
-        distances = np.abs(ref_np[past_idcs] - query_np)
-        return ref_np[np.argmin(distances)]
-    else:
-        return None
+    """Find the latest time in `ref` not after `query`, `ref` must be sorted like a layer's timeline."""
+    ref = ref if isinstance(ref, list) else list(ref)
+    idx = bisect_right(ref, query)
+    return ref[idx - 1] if idx else None
+
+
+def epoch_microseconds(times: Iterable[datetime]) -> np.ndarray:
+    """Convert datetimes (naive ones are taken as UTC) to an int64 array of microseconds since the epoch."""
+    return np.array(
+        [
+            ((t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo else t) - _EPOCH) // _MICROSECOND
+            for t in times
+        ],
+        dtype=np.int64,
+    )
+
+
+# Index versions of the time matching policies
+# matching many queries to sorted epoch arrays at once, -1 where there is no match
+def nearest_indexes(ref: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    if not ref.size:
+        return np.full(queries.shape, -1, dtype=np.intp)
+    after = np.searchsorted(ref, queries).clip(max=ref.size - 1)
+    before = (after - 1).clip(min=0)
+    # like find_nearest the earlier time wins on a tie
+    take_after = np.abs(ref[after] - queries) < np.abs(queries - ref[before])
+    return np.where(take_after, after, before)
+
+
+def nearest_past_indexes(ref: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    return np.searchsorted(ref, queries, side="right") - 1
+
+
+INDEX_POLICIES: Dict[Callable, Callable] = {
+    find_nearest: nearest_indexes,
+    find_nearest_past: nearest_past_indexes,
+}
@@ -31,6 +31,11 @@ class TimeTransformer:
         self.t_sim = self._translation_policy.curr_t_sim()
         self.timeline_index = self._translation_policy.curr_timeline_index()
 
+    @property
+    def timeline(self):
+        """The timeline of the driving layer, replaced by a new list whenever it changes."""
+        return self._translation_policy.timeline
+
     def create_formatted_time_stamp(self, fmt=DEFAULT_TIME_FORMAT):
         return self.t_sim.strftime(fmt)
 
@@ -1,9 +1,11 @@
 import collections
 import logging
 import os
+import re
+import time
 from datetime import datetime, timezone
-from glob import glob
-from typing import Dict, List, Optional, Set, Tuple, Union
+from glob import glob, has_magic
+from typing import Dict, Iterator, List, Optional, Pattern, Set, Tuple, Union
 
 import trollsift
 from dateutil.relativedelta import relativedelta
@@ -12,6 +14,7 @@ from satpy.readers import group_files
 
 from uwsift import config
 from uwsift.util.common import create_scenes, is_datetime_format
+from uwsift.util.storage_agent import RACY_MTIME_NS
 
 LOG = logging.getLogger(__name__)
 
@@ -84,30 +87,53 @@ class Catalogue:
         return importer_kwargs, files_to_load
 
     @staticmethod
-    def glob_find_files(patterns: List[str], search_path: str) -> Set[str]:
+    def glob_find_files(patterns: List[str], search_path: str, file_names: Optional[List[str]] = None) -> Set[str]:
         """
         Use given globbing *patterns* to find matching files in the directory
         given by *search_path*.
+
+        The directory is listed only once and all file names are matched at
+        once by a regular expression compiled from the patterns by
+        :meth:`GlobbingCreator.compile_globbing_patterns`. Only patterns
+        reaching into subdirectories (and search paths containing wildcards)
+        are still handed to ``glob()``. If the *file_names* in the directory
+        are given, they are matched instead of listing it.
         """
-        found_files: List[str] = []
+        found_files: Set[str] = set()
+        file_name_patterns: List[str] = []
         for p in patterns:
-            globbing_pattern_with_path = os.path.join(search_path, p)
-            found_files.extend(glob(globbing_pattern_with_path))
-
-        # Make sure there are no duplicates in the result list
-        unique_found_files = set(found_files)
-        return unique_found_files
+            if os.sep in p or (os.altsep and os.altsep in p) or has_magic(search_path):
+                found_files.update(glob(os.path.join(search_path, p)))
+            else:
+                file_name_patterns.append(p)
+        if not file_name_patterns:
+            return found_files
+
+        matcher = GlobbingCreator.compile_globbing_patterns(file_name_patterns)
+        if file_names is not None:
+            found_files.update(os.path.join(search_path, name) for name in file_names if matcher.match(name))
+            return found_files
+        try:
+            with os.scandir(search_path or os.curdir) as entries:
+                found_files.update(
+                    os.path.join(search_path, entry.name) for entry in entries if matcher.match(entry.name)
+                )
+        except OSError as e:
+            # like glob() treat a missing or unreadable directory as empty
+            LOG.debug(f"Can't list search path '{search_path}': {e}")
+        return found_files
 
     # FIXME refactor.rename/split into call sequence:
     #   pattern = compute_globbing_pattern(...)
     #   glob_find_files(pattern, search_path)
     @staticmethod
     def collect_files_for_data_catalogue(
-        search_path: str, filter_patterns: List[str], filter: dict
+        search_path: str, filter_patterns: List[str], filter: dict, file_names: Optional[List[str]] = None
     ) -> Optional[Set[str]]:
         """
         This method summarize all methods which are needed to create the
         data catalogue. So it regulates the creation.
+        *file_names* are passed on to :meth:`glob_find_files`.
         """
 
         # For datetime constraints calculated relative to the current time
@@ -121,7 +147,7 @@ class Catalogue:
             return None
         for i in globbing_patterns:
             LOG.debug(f"Globbing pattern: {i}")
-        return Catalogue.glob_find_files(globbing_patterns, search_path)
+        return Catalogue.glob_find_files(globbing_patterns, search_path, file_names)
 
     @staticmethod
     def group_files_by_group_keys(files: Set[str], group_keys: List[str], reader: str) -> Optional[dict]:
@@ -155,6 +181,111 @@ class Catalogue:
         return file_group_map
 
 
+class CatalogueIndex:
+    """Files and file groups of a catalogue query seen in previous scans of its search path.
+
+    The auto update mode queries the catalogue repeatedly. Instead of
+    processing all matching files again in every cycle only the differences to
+    the previous scan are handled: the search path is only listed again when
+    its mtime changed, the files are only grouped again when new ones were
+    found and a group is reported as soon as it is *complete*, i.e. it was
+    found unchanged in two consecutive scans. Late files of a reported group
+    (e.g. segments arriving after the others of their granule) make it grow,
+    the grown group is reported again once it is complete, so the late files
+    can be merged into the loaded data. Files which do not match the query
+    anymore (e.g. because they are deleted or a ``recent_datetime`` constraint
+    moved on) are forgotten.
+
+    Only a search path without wildcards and filter patterns without
+    subdirectories are listed incrementally, others are globbed in every scan.
+    """
+
+    def __init__(self, reader: str, search_path: str, filter_patterns: List[str], group_keys: List[str], products):
+        self.reader = reader
+        self.search_path = search_path
+        self.filter_patterns = filter_patterns
+        self.group_keys = group_keys
+        self.products = products
+
+        self._known_files: Set[str] = set()
+        self._reported_files: Set[str] = set()
+        # groups with files not reported yet as found in the previous scan
+        self._pending_groups: Dict[tuple, dict] = {}
+        # names in the search path and its mtime in nanoseconds when it was listed, None if it has to be listed again
+        self._file_names: Optional[List[str]] = None
+        self._search_path_mtime: Optional[int] = None
+
+    def query_for_satpy_importer_kwargs_and_readers(self, constraints: dict):
+        """
+        Scan the search path for files matching the *constraints* and generate
+        importer keyword arguments for the groups which are complete since the
+        previous call, in the form of
+        :meth:`Catalogue.query_for_satpy_importer_kwargs_and_readers`.
+        """
+        try:
+            files = Catalogue.collect_files_for_data_catalogue(
+                self.search_path, self.filter_patterns, constraints, self._list_search_path()
+            )
+        except Exception as e:
+            LOG.error(f"Create data catalogue failed. Error occurred: {e}")
+            return None, None
+
+        file_group_map = self.update(files or set())
+        if not file_group_map:
+            LOG.debug("No new complete file groups were found for the given query.")
+            return None, None
+
+        LOG.info(f"Found new file groups: {list(file_group_map)}")
+        return Catalogue._compose_satpy_importer_kwargs(file_group_map, self.products, self.reader)
+
+    def _list_search_path(self) -> Optional[List[str]]:
+        """Get the names in the search path, it is only listed again if its mtime changed since the previous scan.
+
+        None if it can't be listed this way, see :meth:`Catalogue.glob_find_files`.
+        """
+        if has_magic(self.search_path) or any(
+            os.sep in p or (os.altsep and os.altsep in p) for p in self.filter_patterns
+        ):
+            return None
+        search_path = self.search_path or os.curdir
+        try:
+            mtime = os.stat(search_path).st_mtime_ns
+            if self._file_names is None or mtime != self._search_path_mtime:
+                with os.scandir(search_path) as entries:
+                    self._file_names = [entry.name for entry in entries]
+                # entries created right after the listing may not change the mtime, list it again next time then
+                self._search_path_mtime = None if time.time_ns() - mtime < RACY_MTIME_NS else mtime
+        except OSError as e:
+            LOG.debug(f"Can't list search path '{search_path}': {e}")
+            self._file_names, self._search_path_mtime = [], None
+        return self._file_names
+
+    def update(self, files: Set[str]) -> dict:
+        """Update the index with the *files* found by a scan and get the map of the groups completed by it."""
+        new_files = files - self._known_files
+        removed_files = self._known_files - files
+        self._known_files = set(files)
+        self._reported_files -= removed_files
+
+        if new_files or any(fn in removed_files for group_id in self._pending_groups for fn in group_id):
+            # late files are grouped together with the reported files of their group, groups of reported files only
+            # are left out
+            groups = Catalogue.group_files_by_group_keys(self._known_files, self.group_keys, self.reader) or {}
+            groups = {
+                group_id: group for group_id, group in groups.items() if not self._reported_files.issuperset(group_id)
+            }
+        else:
+            groups = self._pending_groups
+
+        complete_groups = {group_id: group for group_id, group in groups.items() if group_id in self._pending_groups}
+        self._pending_groups = {
+            group_id: group for group_id, group in groups.items() if group_id not in complete_groups
+        }
+        for group_id in complete_groups:
+            self._reported_files.update(group_id)
+        return complete_groups
+
+
 class GlobbingCreator:
     """Create glob patterns from series of constraints.
 
@@ -712,6 +843,88 @@ class GlobbingCreator:
 
         return globbing_patterns
 
+    @staticmethod
+    def compile_globbing_patterns(globbing_patterns: List[str]) -> Pattern:
+        """Compile the given *globbing_patterns* into one regular expression matching a file name to any of them.
+
+        The expanded constraints yield many patterns which only differ in a few
+        replacement fields. To not try them one after the other for every file
+        name, the patterns are merged into a prefix tree first, so that their
+        common beginnings are matched only once. Like ``glob()`` file names
+        starting with a dot are only matched by patterns starting with a dot.
+
+        Returns: a compiled regular expression to be used with ``match()``
+        """
+        trie: dict = {}
+        for globbing_pattern in globbing_patterns:
+            node = trie
+            for atom in GlobbingCreator._globbing_pattern_atoms(globbing_pattern):
+                node = node.setdefault(atom, {})
+            node[None] = {}
+
+        branches = [
+            (atom if atom == re.escape(".") else r"(?!\.)" + atom) + GlobbingCreator._trie_to_regex(child)
+            for atom, child in trie.items()
+            if atom is not None
+        ]
+        flags = re.DOTALL if os.path.normcase("A") == "A" else re.DOTALL | re.IGNORECASE
+        return re.compile("(?:" + "|".join(branches) + r")\Z", flags)
+
+    @staticmethod
+    def _trie_to_regex(node: dict) -> str:
+        """Get the regular expression for the subtree *node* of the prefix tree of globbing pattern atoms."""
+        branches = [atom + GlobbingCreator._trie_to_regex(child) for atom, child in node.items() if atom is not None]
+        if None in node:
+            branches.append("")
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    @staticmethod
+    def _globbing_pattern_atoms(globbing_pattern: str) -> Iterator[str]:
+        """
+        Split *globbing_pattern* into the regular expressions for its
+        characters, wildcards and character sets, following
+        ``fnmatch.translate()``.
+        """
+        i, n = 0, len(globbing_pattern)
+        while i < n:
+            c = globbing_pattern[i]
+            i += 1
+            if c == "*":
+                while i < n and globbing_pattern[i] == "*":
+                    i += 1
+                yield ".*"
+            elif c == "?":
+                yield "."
+            elif c == "[":
+                atom, i = GlobbingCreator._globbing_char_set(globbing_pattern, i)
+                yield atom
+            else:
+                yield re.escape(c)
+
+    @staticmethod
+    def _globbing_char_set(globbing_pattern: str, start: int) -> Tuple[str, int]:
+        """
+        Get the regular expression for the character set beginning after the
+        ``[`` at *start* - 1 of *globbing_pattern* and the index after its end.
+        """
+        end = start
+        if end < len(globbing_pattern) and globbing_pattern[end] == "!":
+            end += 1
+        if end < len(globbing_pattern) and globbing_pattern[end] == "]":
+            end += 1
+        end = globbing_pattern.find("]", end)
+        if end < 0:
+            # no closing bracket, so it is a plain character
+            return re.escape("["), start
+        chars = globbing_pattern[start:end].replace("\\", "\\\\")
+        if chars[:1] == "!":
+            chars = "^" + chars[1:]
+        elif chars[:1] == "^":
+            chars = "\\" + chars
+        return f"[{chars}]", end + 1
+
 
 class SceneManager:
     """The (future) purpose of this class is to keep information about already seen Satpy Scenes.
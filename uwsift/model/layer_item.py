@@ -1,4 +1,6 @@
 import logging
+from bisect import bisect_left, insort
+from collections.abc import Mapping
 from datetime import datetime
 from types import MappingProxyType
 from typing import Dict, List, Optional, Tuple
@@ -18,6 +20,57 @@ from uwsift.workspace.workspace import frozendict
 LOG = logging.getLogger(__name__)
 
 
+class Timeline(Mapping):
+    """The ProductDatasets of a layer by their scheduling time, iterated in time order.
+
+    The times are kept in a sorted list next to the mappings from time and
+    from UUID to the dataset, so adding a dataset (usually a newer one) is a
+    binary search instead of sorting the whole timeline again and looking up
+    a dataset by its UUID doesn't scan the timeline.
+    """
+
+    def __init__(self):
+        self._times: List[datetime] = []
+        self._datasets: Dict[datetime, ProductDataset] = {}
+        # the UUIDs at the time of insertion, the info of a dataset may change later on
+        self._times_by_uuid: Dict[UUID, datetime] = {}
+        self._uuids_by_time: Dict[datetime, UUID] = {}
+
+    def __getitem__(self, sched_time: datetime) -> ProductDataset:
+        return self._datasets[sched_time]
+
+    def __iter__(self):
+        return iter(self._times)
+
+    def __len__(self):
+        return len(self._times)
+
+    def __contains__(self, sched_time):
+        return sched_time in self._datasets
+
+    def insert(self, sched_time: datetime, product_dataset: ProductDataset):
+        if sched_time in self._datasets:
+            raise KeyError(f"There already is a dataset for {sched_time} in the timeline")
+        if not self._times or self._times[-1] < sched_time:
+            self._times.append(sched_time)
+        else:
+            insort(self._times, sched_time)
+        self._datasets[sched_time] = product_dataset
+        self._times_by_uuid[product_dataset.uuid] = sched_time
+        self._uuids_by_time[sched_time] = product_dataset.uuid
+
+    def pop(self, sched_time: datetime) -> Optional[ProductDataset]:
+        product_dataset = self._datasets.pop(sched_time, None)
+        if product_dataset is None:
+            return None
+        del self._times[bisect_left(self._times, sched_time)]
+        del self._times_by_uuid[self._uuids_by_time.pop(sched_time)]
+        return product_dataset
+
+    def time_of(self, uuid: UUID) -> Optional[datetime]:
+        return self._times_by_uuid.get(uuid)
+
+
 class LayerItem:
     def __init__(
         self,
@@ -47,7 +100,13 @@ class LayerItem:
 
         self._parent = parent
 
-        self._timeline: Dict[datetime, ProductDataset] = {}
+        self._timeline = Timeline()
+        # incremented whenever the timeline changes, to know when to update what is derived from it
+        self._timeline_version = 0
+        # the actual range of the layer, folded together from the ranges of its datasets
+        self._dataset_ranges: Dict[UUID, Tuple] = {}
+        self._pending_range_uuids: List[UUID] = []
+        self._actual_range: Tuple = INVALID_COLOR_LIMITS
         self._presentation = presentation
         self.info = self.extract_layer_info(info)
 
@@ -248,6 +307,10 @@ class LayerItem:
     def timeline(self):
         return MappingProxyType(self._timeline)
 
+    @property
+    def timeline_version(self) -> int:
+        return self._timeline_version
+
     @property
     def dynamic(self):
         return len(self._timeline) != 0
@@ -280,22 +343,21 @@ class LayerItem:
             return None
 
         product_dataset = ProductDataset(self.uuid, info, presentation)
-        self._timeline[sched_time] = product_dataset
-        self._sort_timeline()
+        self._add_to_timeline(sched_time, product_dataset)
         return product_dataset
 
     def has_in_timeline(self, dataset_uuid) -> bool:
-        return dataset_uuid in [pds.uuid for pds in self._timeline.values()]
+        return self._timeline.time_of(dataset_uuid) is not None
 
-    def _sort_timeline(self):
-        self._timeline = dict(sorted(self._timeline.items()))
+    def _add_to_timeline(self, sched_time: datetime, product_dataset: ProductDataset):
+        self._timeline.insert(sched_time, product_dataset)
+        self._timeline_version += 1
+        # its range is only looked up when the range of the layer is needed
+        self._pending_range_uuids.append(product_dataset.uuid)
 
     def get_dataset_by_uuid(self, uuid: UUID) -> Optional[ProductDataset]:
-        items_for_uuid = [item for item in self.timeline.items() if item[1].uuid == uuid]
-        if not items_for_uuid:
-            return None
-        assert len(items_for_uuid) == 1  # nosec B101
-        return items_for_uuid[0][1]
+        sched_time = self._timeline.time_of(uuid)
+        return None if sched_time is None else self._timeline[sched_time]
 
     def get_datasets_uuids(self) -> List[UUID]:
         return [pd.uuid for pd in self.timeline.values()]
@@ -348,8 +410,7 @@ class LayerItem:
         if product_dataset is None:
             return None
 
-        self._timeline[sched_time] = product_dataset
-        self._sort_timeline()
+        self._add_to_timeline(sched_time, product_dataset)
         return product_dataset
 
     def remove_dataset(self, sched_time):
@@ -358,7 +419,10 @@ class LayerItem:
         Gracefully ignores if no dataset with the given sched_time exists in
         the layer.
         """
-        self._timeline.pop(sched_time, None)
+        product_dataset = self._timeline.pop(sched_time)
+        if product_dataset is not None:
+            self._timeline_version += 1
+            self._forget_dataset_range(product_dataset.uuid)
         LOG.debug(f"ProductDataset with sched_time '{sched_time}' removed.")
 
     def add_algebraic_dataset(
@@ -378,8 +442,7 @@ class LayerItem:
 
         product_dataset = ProductDataset.get_algebraic_dataset(self.uuid, info, presentation, input_datasets_uuids)
 
-        self._timeline[sched_time] = product_dataset
-        self._sort_timeline()
+        self._add_to_timeline(sched_time, product_dataset)
         return product_dataset
 
     def describe_timeline(self):
@@ -401,26 +464,51 @@ class LayerItem:
         return self._get_actual_range_from_dataset(first_active_dataset.uuid) if first_active_dataset else (None, None)
 
     def get_actual_range_from_layer(self) -> Tuple:
-        """Calculate on the fly the actual range of the layer.
+        """Get the actual range of the layer.
 
-        The 'actual range' of a layer is the union of the 'actual ranges' of all datasets belonging to that layer."""
+        The 'actual range' of a layer is the union of the 'actual ranges' of all datasets belonging to that layer.
+        It is kept up to date as datasets are added and removed, only the ranges of the datasets added since the last
+        call and the ones which weren't known then are looked up in the workspace."""
 
         if len(self._timeline) == 0:
             return None, None
 
-        MIN = 0  # noqa   Define constants for indexes just to increase readability ...
-        MAX = 1  # noqa   ... but spell checker complains without 'noqa'.
-
-        actual_range = list(INVALID_COLOR_LIMITS)  # In tuples values cannot be updated in place
-        for dataset in self._timeline.values():
-            dataset_actual_range = self._get_actual_range_from_dataset(dataset.uuid)
+        pending_uuids, self._pending_range_uuids = self._pending_range_uuids, []
+        for uuid in pending_uuids:
+            if self._timeline.time_of(uuid) is None:
+                # removed in the meantime
+                continue
+            dataset_actual_range = self._get_actual_range_from_dataset(uuid)
+            if None in dataset_actual_range:
+                # not known yet (e.g. the content isn't loaded), look it up again next time
+                self._pending_range_uuids.append(uuid)
+                continue
+            self._dataset_ranges[uuid] = dataset_actual_range
+            self._actual_range = self._union_range(self._actual_range, dataset_actual_range)
+
+        return self._actual_range
+
+    def update_dataset_range(self, uuid: UUID):
+        """Look up the actual range of the dataset again, e.g. when new segments were merged into its content."""
+        if self._timeline.time_of(uuid) is None:
+            return
+        self._forget_dataset_range(uuid)
+        if uuid not in self._pending_range_uuids:
+            self._pending_range_uuids.append(uuid)
 
-            if actual_range[MIN] > dataset_actual_range[MIN]:
-                actual_range[MIN] = dataset_actual_range[MIN]
-            if actual_range[MAX] < dataset_actual_range[MAX]:
-                actual_range[MAX] = dataset_actual_range[MAX]
+    @staticmethod
+    def _union_range(range_a: Tuple, range_b: Tuple) -> Tuple:
+        return min(range_a[0], range_b[0]), max(range_a[1], range_b[1])
 
-        return tuple(actual_range)
+    def _forget_dataset_range(self, uuid: UUID):
+        dataset_actual_range = self._dataset_ranges.pop(uuid, None)
+        if dataset_actual_range is None:
+            return
+        if dataset_actual_range[0] <= self._actual_range[0] or dataset_actual_range[1] >= self._actual_range[1]:
+            # the range of the dataset was a limit of the layer's range, fold the remaining ones together again
+            self._actual_range = INVALID_COLOR_LIMITS
+            for other_range in self._dataset_ranges.values():
+                self._actual_range = self._union_range(self._actual_range, other_range)
 
     def determine_initial_clims(self):
         """Get a min/max value pair to be used as limits for colour mapping.
@@ -3,7 +3,7 @@ from __future__ import annotations
 import logging
 import struct
 from datetime import datetime
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 from uuid import UUID
 
 from PyQt5.QtCore import QAbstractItemModel, QMimeData, QModelIndex, Qt, pyqtSignal
@@ -107,6 +107,8 @@ class LayerModel(QAbstractItemModel):
             self.policy = policy(model=self)
 
         self.layers: List[LayerItem] = []
+        # all datasets of the layers with their layer, kept up to date when datasets are added or removed
+        self._datasets_by_uuid: Dict[UUID, Tuple[LayerItem, ProductDataset]] = {}
 
         self._supportedRoles = [Qt.DisplayRole, Qt.EditRole, Qt.TextAlignmentRole]
 
@@ -337,6 +339,7 @@ class LayerModel(QAbstractItemModel):
         #  according control flow that could be chosen by the user.
         product_dataset = layer.add_dataset(info)
         if product_dataset is not None:
+            self._register_dataset(layer, product_dataset)
             if product_dataset.kind == Kind.IMAGE:
                 self.didAddImageDataset.emit(layer, product_dataset)
             elif product_dataset.kind == Kind.LINES:
@@ -351,6 +354,18 @@ class LayerModel(QAbstractItemModel):
             self.didUpdateLayers.emit()
         self._update_dependent_recipe_layers(layer)
 
+    def update_dataset_content(self, uuid: UUID, kind: Kind) -> None:
+        """
+        Slot for Document's `didUpdateBasicDataset` signal, emitted when new
+        data (e.g. late segments) was merged into the content of a dataset.
+
+        :param uuid: UUID of the dataset
+        :param kind: kind of the dataset
+        """
+        layer_and_dataset = self._datasets_by_uuid.get(uuid)
+        if layer_and_dataset is not None:
+            layer_and_dataset[0].update_dataset_range(uuid)
+
     def mimeTypes(self):
         return ["text/plain", "text/xml"]
 
@@ -473,12 +488,14 @@ class LayerModel(QAbstractItemModel):
             for layer in self.get_probeable_layers():
                 layer.probe_value = None
         else:
-            for layer in self.get_probeable_layers():
+            layers = self.get_probeable_layers()
+            uuids = []
+            for layer in layers:
                 product_dataset = layer.get_first_active_product_dataset()
-
-                layer.probe_value = (
-                    None if not product_dataset else self._workspace.get_content_point(product_dataset.uuid, xy_pos)
-                )
+                uuids.append(None if not product_dataset else product_dataset.uuid)
+            # all layers at once, the position is only projected once per projection
+            for layer, value in zip(layers, self._workspace.get_content_points(uuids, xy_pos)):
+                layer.probe_value = value
 
         self._refresh()
 
@@ -563,6 +580,7 @@ class LayerModel(QAbstractItemModel):
         """
         self.willDeleteProductDataset.emit(dataset_uuid)
         layer.remove_dataset(sched_time)
+        self._datasets_by_uuid.pop(dataset_uuid, None)
         self._document.remove_dataset_info(dataset_uuid)
         self._workspace.remove(dataset_uuid)
         self.didDeleteProductDataset.emit([dataset_uuid])
@@ -592,6 +610,7 @@ class LayerModel(QAbstractItemModel):
             input_datasets_infos = self._get_datasets_infos_of_multichannel_dataset(sched_time, input_layers)
 
             dataset = rgb_layer.add_multichannel_dataset(None, sched_time, input_datasets_uuids, input_datasets_infos)
+            self._register_dataset(rgb_layer, dataset)
 
             self.didAddCompositeDataset.emit(rgb_layer, dataset)
 
@@ -869,6 +888,7 @@ class LayerModel(QAbstractItemModel):
                 return
 
             dataset = algebraic_layer.add_algebraic_dataset(None, frozendict(info), sched_time, input_datasets_uuids)
+            self._register_dataset(algebraic_layer, dataset)
 
             self.didAddImageDataset.emit(algebraic_layer, dataset)
 
@@ -894,11 +914,12 @@ class LayerModel(QAbstractItemModel):
         :param dataset_uuid:
         :return: dataset if found, None else
         """
-        for layer in self.layers:
-            dataset = layer.get_dataset_by_uuid(dataset_uuid)
-            if dataset:
-                return dataset
-        return None
+        layer_and_dataset = self._datasets_by_uuid.get(dataset_uuid)
+        return None if layer_and_dataset is None else layer_and_dataset[1]
+
+    def _register_dataset(self, layer: LayerItem, dataset: Optional[ProductDataset]):
+        if dataset is not None:
+            self._datasets_by_uuid[dataset.uuid] = (layer, dataset)
 
     def remove_datasets_from_all_layers(self, dataset_uuids):
         """
@@ -910,10 +931,9 @@ class LayerModel(QAbstractItemModel):
         """
         did_remove_any_dataset = False
         for dataset_uuid in dataset_uuids:
-            dataset = self.get_dataset_by_uuid(dataset_uuid)
+            layer, dataset = self._datasets_by_uuid.get(dataset_uuid, (None, None))
             LOG.debug(f"Dataset for uuid {dataset_uuid}: {dataset}")
             if dataset:
-                layer = self.get_layer_by_uuid(dataset.layer_uuid)
                 self._remove_dataset(layer, dataset.info[Info.SCHED_TIME], dataset.info[Info.UUID])
                 LOG.debug(f"Removing {dataset}")
                 did_remove_any_dataset = True
@@ -992,10 +1012,9 @@ class LayerModel(QAbstractItemModel):
         return derived_layers
 
     def _get_layer_by_dataset(self, dataset: ProductDataset):
-        for layer in self.layers:
-            for sched_time in layer.timeline:
-                if layer.timeline.get(sched_time) == dataset:
-                    return layer
+        layer_and_dataset = self._datasets_by_uuid.get(dataset.uuid)
+        if layer_and_dataset is not None and layer_and_dataset[1] is dataset:
+            return layer_and_dataset[0]
 
     def get_dataset_presentation_by_uuid(self, uuid):
         """Get the presentation of the dataset with the given UUID. If the dataset has no presentation
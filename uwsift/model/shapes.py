@@ -21,14 +21,122 @@ __author__ = "rayg"
 __docformat__ = "reStructuredText"
 
 import logging
+import threading
+from collections import OrderedDict
 
 import numpy as np
 import shapely.geometry.polygon as sgp
+from numba import boolean, float64, int64, jit
 from rasterio import Affine
-from rasterio.features import rasterize
 
 LOG = logging.getLogger(__name__)
 
+# index masks of recently probed regions, reused while the region and the grid stay the same
+MAX_CACHED_MASKS = 16
+
+
+class MaskCache:
+    """Thread-safe LRU cache of masks computed for a region on a grid.
+
+    Region probe plots are rebuilt from task queue threads for every layer
+    and time step, so the same region is usually masked on the same grid
+    many times in a row. The cached arrays are made read-only as they are
+    shared between all users.
+    """
+
+    def __init__(self, max_size: int = MAX_CACHED_MASKS):
+        self.max_size = max_size
+        self._masks: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, create):
+        """Get the mask for `key`, calling `create()` to compute it if it isn't cached."""
+        with self._lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                return mask
+        mask = create()
+        for arr in mask:
+            arr.setflags(write=False)
+        with self._lock:
+            self._masks[key] = mask
+            while len(self._masks) > self.max_size:
+                self._masks.popitem(last=False)
+        return mask
+
+    def clear(self):
+        with self._lock:
+            self._masks.clear()
+
+
+_INDEX_MASKS = MaskCache()
+
+
+@jit(boolean[:, :](float64[:], float64[:], int64, int64), nopython=True, cache=True, nogil=True)
+def _scanline_fill(xs, ys, height, width):
+    """Rasterize the polygon with the vertices `xs`, `ys` (in pixel units) by scanlines.
+
+    Like rasterio (GDAL) a pixel belongs to the polygon if its center is
+    inside (even-odd rule), so concave polygons and self intersections are
+    handled the same way.
+    """
+    mask = np.zeros((height, width), dtype=np.bool_)
+    num_vertices = xs.shape[0]
+    crossings = np.empty(num_vertices, dtype=np.float64)
+    for row in range(height):
+        y = row + 0.5
+        num_crossings = 0
+        for i in range(num_vertices):
+            j = (i + 1) % num_vertices
+            y0 = ys[i]
+            y1 = ys[j]
+            # half-open so that a vertex on the scanline is counted once
+            if (y0 <= y < y1) or (y1 <= y < y0):
+                crossings[num_crossings] = xs[i] + (y - y0) * (xs[j] - xs[i]) / (y1 - y0)
+                num_crossings += 1
+        row_crossings = np.sort(crossings[:num_crossings])
+        for k in range(0, num_crossings - 1, 2):
+            # pixel centers col + 0.5 in (start, end], rounded like GDAL
+            first_col = max(int(np.floor(row_crossings[k] + 0.5)), 0)
+            end_col = min(int(np.floor(row_crossings[k + 1] + 0.5)), width)
+            for col in range(first_col, end_col):
+                mask[row, col] = True
+    return mask
+
+
+def polygon_index_mask(trans: Affine, shape: sgp.LinearRing, content_shape: tuple):
+    """Get the (row, column) indexes of the pixels of a grid within a polygon.
+
+    :param trans: affine transform between content array indices and screen coordinates
+    :param shape: LinearRing in screen coordinates (e.g. mercator meters)
+    :param content_shape: (rows, columns) of the content array
+    :return: index_mask:(rows:ndarray, columns:ndarray), read-only and shared with other callers
+    """
+    key = (tuple(trans), tuple(shape.coords), tuple(content_shape[:2]))
+    return _INDEX_MASKS.get(key, lambda: _rasterize_index_mask(trans, shape, content_shape))
+
+
+def _rasterize_index_mask(trans: Affine, shape: sgp.LinearRing, content_shape: tuple):
+    # convert the vertices to content index coordinates
+    # (0, 0) image index is upper-left origin of data (needs more work if otherwise)
+    coords = np.asarray(shape.coords, dtype=np.float64)
+    xs, ys = ~trans * (coords[:, 0], coords[:, 1])
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+
+    # limit the rasterized array to the bounding box of the polygon within the content
+    rows, cols = content_shape[:2]
+    first_row, end_row = max(int(np.floor(ys.min())), 0), min(int(np.ceil(ys.max())), rows)
+    first_col, end_col = max(int(np.floor(xs.min())), 0), min(int(np.ceil(xs.max())), cols)
+    if first_row >= end_row or first_col >= end_col:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    mask = _scanline_fill(xs - first_col, ys - first_row, end_row - first_row, end_col - first_col)
+    row_index, col_index = np.nonzero(mask)
+    # translate the mask indexes back to the original data array coordinates
+    return row_index + first_row, col_index + first_col
+
 
 def content_within_shape(content: np.ndarray, trans: Affine, shape: sgp.LinearRing):
     """
@@ -36,34 +144,9 @@ def content_within_shape(content: np.ndarray, trans: Affine, shape: sgp.LinearRi
     :param content: data being displayed on the screen
     :param trans: affine transform between content array indices and screen coordinates
     :param shape: LinearRing in screen coordinates (e.g. mercator meters)
-    :return: masked_content:masked_array, (y_index_offset:int, x_index_offset:int)
-        containing minified masked content array
+    :return: index_mask:(rows:ndarray, columns:ndarray), masked_content:ndarray
+        the indexes of the pixels within the shape and their content
 
     """
-    # Get the bounds so we can limit how big our rasterize boolean array actually is
-    inv_trans = ~trans
-    # convert bounding box to content coordinates
-    # (0, 0) image index is upper-left origin of data (needs more work if otherwise)
-    nx, ny, mx, my = shape.bounds  # minx,miny,maxx,maxy
-    nx, my = inv_trans * (nx, my)
-    mx, ny = inv_trans * (mx, ny)
-    nx, my = int(nx), int(my)
-    mx, ny = int(np.ceil(mx)), int(np.ceil(ny))
-
-    # subset the content (ny is the higher *index*, my is the lower *index*)
-    w = (mx - nx) + 1
-    h = (ny - my) + 1
-
-    # Make our linear ring a properly oriented shapely polygon
-    shape = sgp.Polygon(shape)
-    shape = sgp.orient(shape)
-    # create a transform that is shifted to where the polygon is
-    offset_trans = trans * Affine.translation(nx, my)
-
-    # Get boolean mask for where the polygon is and get an index mask of those positions
-    index_mask = np.nonzero(
-        rasterize([shape], out_shape=(h, w), transform=offset_trans, default_value=1).astype(np.bool_)
-    )
-    # translate the mask indexes back to the original data array coordinates (original index mask is read-only)
-    index_mask = (index_mask[0] + my, index_mask[1] + nx)
+    index_mask = polygon_index_mask(trans, shape, content.shape)
     return index_mask, content[index_mask]
@@ -6,8 +6,8 @@ from uuid import UUID
 from PyQt5.QtCore import QDateTime, QObject, pyqtSignal
 
 from uwsift.control.qml_utils import QmlBackend, QmlLayerManager, TimebaseModel
-from uwsift.control.time_matcher import TimeMatcher
-from uwsift.control.time_matcher_policies import find_nearest_past
+from uwsift.control.time_matcher import TimeMatcher, TimeMatchTable
+from uwsift.control.time_matcher_policies import INDEX_POLICIES, find_nearest_past
 from uwsift.control.time_transformer import TimeTransformer
 from uwsift.control.time_transformer_policies import WrappingDrivingPolicy
 from uwsift.model.layer_item import LayerItem
@@ -37,6 +37,9 @@ class TimeManager(QObject):
         super().__init__()
         self._animation_speed = animation_speed
         self._time_matcher = TimeMatcher(matching_policy)
+        # the policies with an index version are matched by table lookups
+        index_policy = INDEX_POLICIES.get(matching_policy)
+        self._match_table = None if index_policy is None else TimeMatchTable(index_policy)
 
         self._layer_model: Optional[LayerModel] = None
 
@@ -156,6 +159,11 @@ class TimeManager(QObject):
         visible.
         """
         assert self._layer_model is not None  # nosec B101 # suppress mypy [union-attr]
+        if self._match_table is not None:
+            assert self._time_transformer is not None  # nosec B101 # suppress mypy [union-attr]
+            self._match_table.set_driving_timeline(self._time_transformer.timeline)
+            return self._match_table.match(self._layer_model.get_dynamic_layers(), t_sim)
+
         t_matched_dict = {}
         for layer in self._layer_model.get_dynamic_layers():
             t_matched = self._time_matcher.match(layer.timeline, t_sim)
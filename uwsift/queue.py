@@ -23,9 +23,15 @@ __author__ = "rayg"
 __docformat__ = "reStructuredText"
 
 import logging
+import threading
+import time
 from collections import OrderedDict
+from enum import IntEnum
 
-from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
+
+from uwsift import config
+from uwsift.util.task_statistics import TaskStatistics
 
 LOG = logging.getLogger(__name__)
 
@@ -37,9 +43,17 @@ TASK_PROGRESS = ("progress", float)  # 0.0 - 1.0 progress
 TheQueue = None
 
 
+class TaskPriority(IntEnum):
+    """Priority classes of background tasks."""
+
+    INTERACTIVE = 0  # the user is waiting for the result, e.g. re-tiling
+    PREFETCH = 1  # results likely needed soon, e.g. re-tiling the next time steps of an animation
+    BACKGROUND = 2  # everything else, e.g. importing data
+
+
 class Worker(QThread):
     """
-    Worker thread use by TaskQueue
+    Worker thread use by TaskQueue, runs tasks of the priority classes it serves until there are none left
     """
 
     # worker id, sequence of dictionaries listing update information to be propagated to view
@@ -47,17 +61,14 @@ class Worker(QThread):
     # task-key, ok: False if exception occurred else True
     workerDidCompleteTask = pyqtSignal(str, bool)
 
-    def __init__(self, myid: int):
+    def __init__(self, myid: int, scheduler, priorities):
         super(Worker, self).__init__()
-        self.queue: OrderedDict = OrderedDict()
-        self.depth = 0
         self.id = myid
-
-    def add(self, key, task_iterable):
-        # FUTURE: replace queued task if key matches
-        self.queue[key] = task_iterable
-        self.depth = len(self.queue)
-        self.start()
+        self.scheduler = scheduler  # TaskQueue handing out the tasks
+        self.priorities = tuple(priorities)  # priority classes served by this worker, most urgent first
+        # both are only changed by the scheduler while holding its lock
+        self.current_key = None  # key of the task being worked on
+        self.cancel_requested = False
 
     def _did_progress(self, task_status):
         """
@@ -70,19 +81,35 @@ class Worker(QThread):
         self.workerDidMakeProgress.emit(self.id, info)
 
     def run(self):
-        while len(self.queue) > 0:
-            key, task = self.queue.popitem(last=False)
+        statistics = self.scheduler.statistics
+        while True:
+            key, task = self.scheduler._next_task(self)
+            if key is None:
+                break
             # LOG.debug('starting background work on {}'.format(key))
+            record = statistics.task_started(key)
             ok = True
+            cancelled = False
             try:
                 for status in task:
+                    statistics.task_progressed(record, status.get(TASK_DOING, "") if status else "")
                     self._did_progress(status)
+                    if self.cancel_requested:
+                        cancelled = True
+                        break
+                if cancelled and hasattr(task, "close"):
+                    # give the generator the chance to hand over results which are still valid
+                    task.close()
             except Exception:
                 # LOG.error("Background task failed")
                 LOG.error("Background task exception: ", exc_info=True)
                 ok = False
+            statistics.task_finished(record, ok, cancelled)
+            if cancelled:
+                # the newer task with the same key reports completion
+                LOG.debug("Background task '%s' superseded by a newer one", key)
+                continue
             self.workerDidCompleteTask.emit(key, ok)
-        self.depth = 0
         self._did_progress(None)
 
 
@@ -90,8 +117,14 @@ class TaskQueue(QObject):
     """
     Global background task queue for loading, rendering, et cetera.
     Includes state updates and GUI links.
-    Eventually will include thread pools and multiprocess pools.
-    Two threads for interactive tasks (high priority), one thread for background tasks (low priority): 0, 1, 2
+
+    Tasks are queued per priority class (see TaskPriority) and handed out to two pools of worker threads:
+    the interactive pool only runs interactive tasks, the background pool runs prefetch tasks before
+    background tasks. The pool sizes are configured by ``task_queue.interactive_threads`` and
+    ``task_queue.background_threads``.
+
+    Timing of every task, the queue depth over time and failure counts are collected in `statistics`.
+    They can be logged and written to a JSON file periodically, see ``task_queue.statistics``.
     """
 
     didMakeProgress = pyqtSignal(list)  # sequence of dictionaries listing update information to be propagated to view
@@ -100,19 +133,33 @@ class TaskQueue(QObject):
     # finished : inherited
     # terminated : inherited
 
-    def __init__(self, process_pool=None):
+    def __init__(self, interactive_threads=None, background_threads=None):
         super(TaskQueue, self).__init__()
-        self._interactive_round_robin = 0  # swaps between 0 and 1 for interactive tasks
-        self.process_pool = process_pool  # thread pool for background activity
         self._completion_futures = {}  # dictionary of id(task) : completion(bool)
         self._last_status = []  # list of last status reports for different workers
+        self._pending = {priority: OrderedDict() for priority in TaskPriority}  # {priority: {key: task}}
+        self._lock = threading.Lock()
+        self._depth = 0  # number of tasks queued since the queue was idle the last time
+        self.statistics = TaskStatistics()
+        self._statistics_timer = self._init_statistics_report()
+
+        if interactive_threads is None:
+            interactive_threads = int(config.get("task_queue.interactive_threads", 2))
+        if background_threads is None:
+            background_threads = int(config.get("task_queue.background_threads", 2))
+        pools = (
+            ((TaskPriority.INTERACTIVE,), interactive_threads),
+            ((TaskPriority.PREFETCH, TaskPriority.BACKGROUND), background_threads),
+        )
         self.workers = []  # thread pool for background activity
-        for id in range(3):
-            worker = Worker(id)
-            worker.workerDidMakeProgress.connect(self._did_progress)
-            worker.workerDidCompleteTask.connect(self._did_complete_task)
-            self.workers.append(worker)
-            self._last_status.append(None)
+        for priorities, num_threads in pools:
+            for _ in range(max(1, num_threads)):
+                worker = Worker(len(self.workers), self, priorities)
+                worker.workerDidMakeProgress.connect(self._did_progress)
+                worker.workerDidCompleteTask.connect(self._did_complete_task)
+                worker.finished.connect(self._did_finish_worker)
+                self.workers.append(worker)
+                self._last_status.append(None)
 
         global TheQueue
         assert TheQueue is None  # nosec B101
@@ -120,22 +167,22 @@ class TaskQueue(QObject):
 
     @property
     def depth(self):
-        return sum([x.depth for x in self.workers])
+        return self._depth
 
     @property
     def remaining(self):
-        return sum([len(x.queue) for x in self.workers])
-
-    def add(
-        self,
-        key,
-        task_iterable,
-        description,
-        interactive=False,
-        and_then=None,
-        use_process_pool=False,
-        use_thread_pool=False,
-    ):
+        with self._lock:
+            return sum(len(tasks) for tasks in self._pending.values())
+
+    @property
+    def idle(self) -> bool:
+        """True if no task is waiting or running, completion callbacks may still be pending in the event loop."""
+        with self._lock:
+            if any(self._pending.values()):
+                return False
+        return not any(worker.isRunning() for worker in self.workers)
+
+    def add(self, key, task_iterable, description, interactive=False, and_then=None, priority=None):
         """Add an iterable task which will yield progress information dictionaries.
 
         Expect behavior like this::
@@ -147,19 +194,109 @@ class TaskQueue(QObject):
 
         Args:
             key (str): unique key for task. Queuing the same key will result in the old task being removed
-                and the new one deferred to the end
+                and the new one deferred to the end. If the old task is already running it is cancelled
+                the next time it yields.
             task_iterable (iter): callable resulting in an iterable, or an iterable itself to be run on the background
+            description (str): human readable description of the task
+            interactive (bool): shortcut for ``priority=TaskPriority.INTERACTIVE``
+            and_then (callable): called with True or False (task failed) once the task is complete
+            priority (TaskPriority): priority class of the task, BACKGROUND if not given and not interactive
 
         """
-        if interactive:
-            wdex = self._interactive_round_robin
-            self._interactive_round_robin += 1
-            self._interactive_round_robin %= 2  # TODO(nk) worker count is hardcoded: worker_count-1
-        else:
-            wdex = 2
+        if priority is None:
+            priority = TaskPriority.INTERACTIVE if interactive else TaskPriority.BACKGROUND
         if callable(and_then):
             self._completion_futures[key] = and_then
-        self.workers[wdex].add(key, task_iterable)
+
+        with self._lock:
+            replaced = False
+            for tasks in self._pending.values():
+                replaced = tasks.pop(key, None) is not None or replaced
+            for worker in self.workers:
+                if worker.current_key == key:
+                    worker.cancel_requested = True
+            self._pending[TaskPriority(priority)][key] = task_iterable
+            if not replaced:
+                self._depth += 1
+        self.statistics.task_enqueued(key, priority)
+        self._dispatch()
+
+    def withdraw(self, key, poll_interval=0.005):
+        """Remove the task `key` from the queue, e.g. to do its work in the calling thread instead.
+
+        A waiting task is dropped together with its completion callback. A running task is cancelled
+        the next time it yields and this call blocks until the worker stopped working on it.
+        """
+        with self._lock:
+            for tasks in self._pending.values():
+                tasks.pop(key, None)
+            running = [worker for worker in self.workers if worker.current_key == key]
+            for worker in running:
+                worker.cancel_requested = True
+        self._completion_futures.pop(key, None)
+        while any(worker.current_key == key for worker in running):
+            time.sleep(poll_interval)
+
+    def _dispatch(self):
+        """Start idle workers for the priority classes with waiting tasks."""
+        with self._lock:
+            waiting = {priority: len(tasks) for priority, tasks in self._pending.items() if tasks}
+        for worker in self.workers:
+            if worker.isRunning():
+                continue
+            priority = next((p for p in worker.priorities if waiting.get(p)), None)
+            if priority is None:
+                continue
+            waiting[priority] -= 1
+            worker.start()
+
+    def _next_task(self, worker):
+        """Hand out the most urgent waiting task the worker serves, called from the worker's thread.
+
+        Tasks whose key is still running on another worker (because they were superseded and are about
+        to stop) are skipped for now.
+        """
+        with self._lock:
+            worker.current_key = None
+            running_keys = {other.current_key for other in self.workers}
+            for priority in worker.priorities:
+                tasks = self._pending[priority]
+                key = next((k for k in tasks if k not in running_keys), None)
+                if key is not None:
+                    worker.current_key = key
+                    worker.cancel_requested = False
+                    return key, tasks.pop(key)
+            return None, None
+
+    def _did_finish_worker(self):
+        # a worker may have left tasks behind which were blocked by a running task with the same key
+        self._dispatch()
+        with self._lock:
+            if not any(self._pending.values()) and not any(w.current_key is not None for w in self.workers):
+                self._depth = 0
+
+    def get_statistics(self) -> dict:
+        """Get latency distributions and failure counts per task category, see `TaskStatistics.summary`."""
+        return self.statistics.summary()
+
+    def _init_statistics_report(self):
+        interval = float(config.get("task_queue.statistics.interval", 0))
+        if interval <= 0:
+            return None
+        timer = QTimer(self)
+        timer.setInterval(int(interval * 1000))
+        timer.timeout.connect(self._report_statistics)
+        timer.start()
+        return timer
+
+    def _report_statistics(self):
+        self.statistics.log_summary()
+        json_path = config.get("task_queue.statistics.json_path", None)
+        if json_path:
+            try:
+                self.statistics.dump(json_path, include_records=True)
+            except OSError as e:
+                LOG.warning(f"Could not write task statistics to '{json_path}': {e}")
 
     def _did_progress(self, worker_id, worker_status):
         """
@@ -171,7 +308,7 @@ class TaskQueue(QObject):
 
         self._last_status[worker_id] = worker_status
 
-        # report on the lowest worker number that's active; (0,1 interactive; 2 background)
+        # report on the lowest worker number that's active; interactive workers come first
         # yes, this will be redundant
         # FUTURE make this a more useful signal content, rather than relying on progress_ratio back-query
         for wdex, status in enumerate(self._last_status):
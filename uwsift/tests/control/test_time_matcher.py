@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from uuid import uuid1
+
+import numpy as np
+import pytest
+
+from uwsift.control.time_matcher import TimeMatchTable
+from uwsift.control.time_matcher_policies import (
+    INDEX_POLICIES,
+    epoch_microseconds,
+    find_nearest,
+    find_nearest_past,
+)
+
+START = datetime(2024, 1, 1, 12)
+
+
+class _Layer:
+    """Stands in for a LayerItem, only its timeline is matched."""
+
+    def __init__(self, times):
+        self.uuid = uuid1()
+        self.timeline = {t: SimpleNamespace(uuid=uuid1()) for t in times}
+        self.timeline_version = 0
+
+    def add(self, t):
+        self.timeline = dict(sorted({**self.timeline, t: SimpleNamespace(uuid=uuid1())}.items()))
+        self.timeline_version += 1
+
+
+def _minutes(*minutes):
+    return [START + timedelta(minutes=m) for m in minutes]
+
+
+@pytest.mark.parametrize("policy", [find_nearest, find_nearest_past])
+def test_index_policies_match_policies(policy):
+    """The index versions of the policies match like the policies themselves"""
+    ref = _minutes(0, 10, 15, 30)
+    queries = _minutes(-5, 0, 3, 5, 12, 20, 22.5, 25, 45)
+    indexes = INDEX_POLICIES[policy](epoch_microseconds(ref), epoch_microseconds(queries))
+    for query, idx in zip(queries, indexes):
+        assert (ref[idx] if idx >= 0 else None) == policy(ref, query)
+
+
+def test_time_match_table():
+    """Every tick is looked up, the matches of a layer are updated when its timeline changes"""
+    driving = _Layer(_minutes(0, 10, 20, 30))
+    other = _Layer(_minutes(5, 25))
+    table = TimeMatchTable(INDEX_POLICIES[find_nearest_past])
+    table.set_driving_timeline(list(driving.timeline))
+
+    other_uuids = [pds.uuid for pds in other.timeline.values()]
+    expected = [None, other_uuids[0], other_uuids[0], other_uuids[1]]
+    for t_sim, other_uuid in zip(driving.timeline, expected):
+        matched = table.match([driving, other], t_sim)
+        assert matched == {driving.uuid: [driving.timeline[t_sim].uuid], other.uuid: [other_uuid]}
+
+    other.add(START + timedelta(minutes=20))
+    assert table.match([other], START + timedelta(minutes=20)) == {other.uuid: [other.timeline[_minutes(20)[0]].uuid]}
+    # times not in the driving timeline are matched directly
+    assert table.match([other], START + timedelta(minutes=7)) == {other.uuid: [other_uuids[0]]}
+    assert np.array_equal(
+        epoch_microseconds(_minutes(0)), [(START - datetime(1970, 1, 1)) // timedelta(microseconds=1)]
+    )
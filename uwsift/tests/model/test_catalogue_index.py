@@ -0,0 +1,95 @@
+"""Tests for the incremental catalogue index of the auto update mode."""
+
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+from uwsift.control.auto_update import StartTimeGranuleUpdatePolicy
+from uwsift.model.catalogue import CatalogueIndex
+
+GROUP_KEYS = ["start_time", "platform_shortname", "service"]
+
+
+def _hrit_file(channel, segment, start_time):
+    return f"/data/H-000-MSG4__-MSG4________-{channel:_<9s}-{segment:_<9s}-{start_time}-__"
+
+
+def test_catalogue_index_reports_complete_groups_once():
+    """A group is reported after it was found unchanged twice, files of reported groups aren't grouped again."""
+    index = CatalogueIndex("seviri_l1b_hrit", "/data", [], GROUP_KEYS, {})
+    first_segment = _hrit_file("IR_108", "000001", "201910211200")
+    files = {first_segment}
+
+    assert index.update(files) == {}
+    files.add(_hrit_file("IR_108", "000002", "201910211200"))
+    # still growing
+    assert index.update(files) == {}
+
+    groups = index.update(files)
+    assert list(groups) == [tuple(sorted(files))]
+    assert index.update(files) == {}
+
+    later_segment = _hrit_file("IR_108", "000001", "201910211215")
+    files.add(later_segment)
+    assert index.update(files) == {}
+    assert list(index.update(files)) == [(later_segment,)]
+
+    # files which don't match anymore are forgotten, matching again they make their group grow
+    files.discard(first_segment)
+    assert index.update(files) == {}
+    files.add(first_segment)
+    index.update(files)
+    assert list(index.update(files)) == [groups_id := tuple(sorted(files - {later_segment}))]
+    assert first_segment in groups_id
+
+
+def test_late_segment_of_loaded_granule_reloaded():
+    """A segment arriving after its granule was loaded makes the granule load again with all of its segments."""
+    index = CatalogueIndex("seviri_l1b_hrit", "/data", [], GROUP_KEYS, {})
+    files = {_hrit_file("IR_108", "000001", "201910211200"), _hrit_file("IR_108", "000002", "201910211200")}
+
+    def _query(constraints):
+        groups = index.update(files)
+        if not groups:
+            return None, None
+        scenes = {
+            group_id: SimpleNamespace(start_time=datetime.strptime(group_id[0][-15:-3], "%Y%m%d%H%M"))
+            for group_id in groups
+        }
+        return {"reader": "seviri_l1b_hrit", "scenes": scenes, "dataset_ids": []}, ["seviri_l1b_hrit"]
+
+    policy = StartTimeGranuleUpdatePolicy(_query)
+    assert policy.update({}) is None
+    _, importer_kwargs = policy.update({})
+    assert list(importer_kwargs["scenes"]) == [tuple(sorted(files))]
+
+    files.add(_hrit_file("IR_108", "000003", "201910211200"))
+    assert policy.update({}) is None
+    _, importer_kwargs = policy.update({})
+    assert list(importer_kwargs["scenes"]) == [tuple(sorted(files))]
+    assert policy.update({}) is None
+
+    # late files of an older granule are ignored
+    files.add(_hrit_file("IR_108", "000001", "201910211145"))
+    assert policy.update({}) is None
+    assert policy.update({}) is None
+
+
+def test_search_path_listed_when_modified(tmp_path, monkeypatch):
+    """The search path is only listed again after its mtime changed."""
+    listed = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: listed.append(path) or scandir(path))
+    index = CatalogueIndex("seviri_l1b_hrit", str(tmp_path), ["{name}.dat"], GROUP_KEYS, {})
+    (tmp_path / "a.dat").touch()
+    # not modified recently, otherwise it is listed again in case its mtime doesn't show a modification yet
+    os.utime(tmp_path, ns=(0, 1_000_000_000))
+
+    assert index._list_search_path() == ["a.dat"]
+    assert index._list_search_path() == ["a.dat"]
+    assert len(listed) == 1
+
+    (tmp_path / "b.dat").touch()
+    os.utime(tmp_path, ns=(0, 2_000_000_000))
+    assert sorted(index._list_search_path()) == ["a.dat", "b.dat"]
+    assert len(listed) == 2
@@ -136,3 +136,32 @@ def test_construct_globbing_patterns(globbing_creator, filter_patterns, constrai
     constraints = request.getfixturevalue(constraints)
     gp_abs = globbing_creator.construct_globbing_patterns(filter_patterns, constraints)
     assert gp_abs == expected_result
+
+
+def test_glob_find_files_single_scan(tmp_path):
+    """Listing the directory once and matching the compiled patterns finds the same files as glob()."""
+    from glob import glob
+
+    from uwsift.model.catalogue import Catalogue
+
+    patterns = [
+        "A-*-MSG4-______-*-???-2000010100??-B-????????????-C",
+        "A-*-MSG4-IR_108-*-???-2000010100??-B-????????????-C",
+        "A-*-MSG4-______-*-???-1999123123??-B-????????????-C",
+        "A-*-MSG4-IR_108-*-???-1999123123??-B-????????????-C",
+        "[!A]-*-MSG4-[IV]*",
+    ]
+    for name in [
+        "A-x-MSG4-IR_108-y-abc-200001010005-B-200001010015-C",
+        "A-x-MSG4-______-y-abc-199912312355-B-200001010005-C",
+        "A-x-MSG4-VIS006-y-abc-200001010005-B-200001010015-C",
+        "A-x-MSG4-IR_108-y-abc-199912312255-B-199912312305-C",
+        "B-x-MSG4-VIS006",
+        ".A-x-MSG4-IR_108-y-abc-200001010005-B-200001010015-C",
+    ]:
+        (tmp_path / name).touch()
+
+    expected = {fn for pattern in patterns for fn in glob(str(tmp_path / pattern))}
+    assert len(expected) == 3
+    assert Catalogue.glob_find_files(patterns, str(tmp_path)) == expected
+    assert Catalogue.glob_find_files(patterns, str(tmp_path / "missing")) == set()
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from uuid import uuid1
+
+from uwsift.common import (
+    INVALID_COLOR_LIMITS,
+    Info,
+    Instrument,
+    Kind,
+    Platform,
+    Presentation,
+)
+from uwsift.model.layer_item import LayerItem, Timeline
+from uwsift.workspace.workspace import frozendict
+
+
+def test_timeline_sorted_by_time():
+    """Datasets are iterated in time order however they are added, and are found by their UUID"""
+    start = datetime(2024, 1, 1, 12)
+    times = [start + timedelta(minutes=m) for m in (10, 20, 0, 30, 15)]
+    datasets = {t: SimpleNamespace(uuid=uuid1()) for t in times}
+    timeline = Timeline()
+    for t in times:
+        timeline.insert(t, datasets[t])
+
+    assert list(timeline) == sorted(times)
+    assert list(timeline.values()) == [datasets[t] for t in sorted(times)]
+    assert timeline.time_of(datasets[times[2]].uuid) == times[2]
+
+    assert timeline.pop(times[1]) is datasets[times[1]]
+    assert timeline.pop(times[1]) is None
+    assert times[1] not in timeline
+    assert timeline.time_of(datasets[times[1]].uuid) is None
+    assert list(timeline) == sorted(times[:1] + times[2:])
+
+
+def test_actual_range_maintained():
+    """The range of a layer follows its datasets, the range of each dataset is only looked up once"""
+    ranges = {}
+    lookups = []
+
+    def _get_min_max(uuid):
+        lookups.append(uuid)
+        return ranges[uuid]
+
+    model = SimpleNamespace(_workspace=SimpleNamespace(get_min_max_value_for_dataset_by_uuid=_get_min_max))
+    info = {Info.KIND: Kind.IMAGE, Info.PLATFORM: Platform.GOES_16, Info.INSTRUMENT: Instrument.ABI, "name": "C13"}
+    layer = LayerItem(model, frozendict(info), Presentation(uuid=None, kind=Kind.IMAGE))
+    start = datetime(2024, 1, 1, 12)
+    sched_times = [start + timedelta(minutes=m) for m in range(3)]
+    uuids = []
+    for sched_time, actual_range in zip(sched_times, [(0.0, 5.0), (-2.0, 3.0), (1.0, 9.0)]):
+        uuid = uuid1()
+        uuids.append(uuid)
+        ranges[uuid] = actual_range
+        layer.add_dataset(frozendict({Info.UUID: uuid, Info.SCHED_TIME: sched_time, Info.KIND: Kind.IMAGE}))
+
+    assert layer.get_actual_range_from_layer() == (-2.0, 9.0)
+    assert layer.get_actual_range_from_layer() == (-2.0, 9.0)
+    assert lookups == uuids
+
+    layer.remove_dataset(sched_times[2])
+    assert layer.get_actual_range_from_layer() == (-2.0, 5.0)
+    layer.remove_dataset(sched_times[0])
+    assert layer.get_actual_range_from_layer() == (-2.0, 3.0)
+    assert lookups == uuids
+
+
+def test_unknown_actual_range_retried():
+    """A dataset whose range isn't known yet is looked up again until it is"""
+    ranges = {}
+    model = SimpleNamespace(_workspace=SimpleNamespace(get_min_max_value_for_dataset_by_uuid=ranges.get))
+    info = {Info.KIND: Kind.IMAGE, Info.PLATFORM: Platform.GOES_16, Info.INSTRUMENT: Instrument.ABI, "name": "C13"}
+    layer = LayerItem(model, frozendict(info), Presentation(uuid=None, kind=Kind.IMAGE))
+    uuid = uuid1()
+    ranges[uuid] = (None, None)
+    layer.add_dataset(frozendict({Info.UUID: uuid, Info.SCHED_TIME: datetime(2024, 1, 1, 12), Info.KIND: Kind.IMAGE}))
+
+    assert layer.get_actual_range_from_layer() == INVALID_COLOR_LIMITS
+    ranges[uuid] = (1.0, 4.0)
+    assert layer.get_actual_range_from_layer() == (1.0, 4.0)
+
+
+def test_merged_dataset_range_updated():
+    """The range of a dataset whose content grew by merged segments is looked up again"""
+    ranges = {}
+    model = SimpleNamespace(_workspace=SimpleNamespace(get_min_max_value_for_dataset_by_uuid=ranges.get))
+    info = {Info.KIND: Kind.IMAGE, Info.PLATFORM: Platform.GOES_16, Info.INSTRUMENT: Instrument.ABI, "name": "C13"}
+    layer = LayerItem(model, frozendict(info), Presentation(uuid=None, kind=Kind.IMAGE))
+    uuid = uuid1()
+    ranges[uuid] = (1.0, 4.0)
+    layer.add_dataset(frozendict({Info.UUID: uuid, Info.SCHED_TIME: datetime(2024, 1, 1, 12), Info.KIND: Kind.IMAGE}))
+    assert layer.get_actual_range_from_layer() == (1.0, 4.0)
+
+    ranges[uuid] = (1.0, 7.0)
+    layer.update_dataset_range(uuid)
+    assert layer.get_actual_range_from_layer() == (1.0, 7.0)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+import shapely.geometry.polygon as sgp
+from rasterio import Affine
+from rasterio.features import rasterize
+
+from uwsift.model.shapes import content_within_shape, polygon_index_mask
+
+TRANS = Affine(2000.0, 0.0, -1.0e6, 0.0, -2000.0, 1.0e6)
+CONTENT = np.arange(1000 * 1000, dtype=np.float32).reshape((1000, 1000))
+
+
+@pytest.mark.parametrize(
+    "points",
+    [
+        [(-5.0e5, -5.0e5), (5.0e5, -4.0e5), (3.0e5, 6.0e5)],
+        # concave
+        [(-8.0e5, -8.0e5), (8.0e5, -8.0e5), (8.0e5, 8.0e5), (0.0, -1.0e5), (-8.0e5, 8.0e5)],
+        # partly outside of the content
+        [(-1.5e6, -2.0e5), (2.0e5, -2.0e5), (2.0e5, 1.6e6)],
+    ],
+)
+def test_content_within_shape_matches_rasterio(points):
+    shape = sgp.LinearRing(points)
+    index_mask, data = content_within_shape(CONTENT, TRANS, shape)
+
+    expected = rasterize([sgp.Polygon(shape)], out_shape=CONTENT.shape, transform=TRANS, default_value=1)
+    np.testing.assert_array_equal(index_mask, np.nonzero(expected))
+    np.testing.assert_array_equal(data, CONTENT[expected.astype(bool)])
+
+
+def test_polygon_index_mask_cached():
+    """The mask is computed once per region and grid."""
+    shape = sgp.LinearRing([(-1.0e5, -1.0e5), (1.0e5, -1.0e5), (0.0, 1.0e5)])
+    index_mask = polygon_index_mask(TRANS, shape, CONTENT.shape)
+    assert polygon_index_mask(TRANS, sgp.LinearRing(shape.coords), CONTENT.shape) is index_mask
+    assert not index_mask[0].flags.writeable
+    assert polygon_index_mask(TRANS * Affine.translation(1, 0), shape, CONTENT.shape) is not index_mask
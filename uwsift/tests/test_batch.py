@@ -0,0 +1,75 @@
+import argparse
+from datetime import datetime, timedelta
+
+import pytest
+
+from uwsift.batch import JobResult, create_jobs, encode_animations, main
+
+
+def _args(output, processes=1):
+    return argparse.Namespace(
+        output=output,
+        processes=processes,
+        reader="abi_l1b",
+        size=(800, 600),
+        projection=None,
+        center=None,
+        colorbar=None,
+        footer=False,
+        font_size=11,
+        trace=None,
+    )
+
+
+def _time_steps(num):
+    start = datetime(2024, 1, 1, 12)
+    return [(start + timedelta(minutes=10 * idx), (f"file_{idx}.nc",)) for idx in range(num)]
+
+
+def test_create_jobs_images(tmp_path):
+    """Without spare processes every product is one job writing its frames directly."""
+    products = {"C13": "C13_id", "C14": "C14_id"}
+    jobs, animations = create_jobs(
+        _args("{product}_{start_time:%H%M}.png", processes=2), _time_steps(3), products, "frames", str(tmp_path)
+    )
+    assert animations == {}
+    assert [job.name for job in jobs] == ["C13", "C14"]
+    assert jobs[0].frame_paths == ["C13_1200.png", "C13_1210.png", "C13_1220.png"]
+    assert jobs[1].file_groups == [("file_0.nc",), ("file_1.nc",), ("file_2.nc",)]
+    assert jobs[1].workspace_dir == str(tmp_path / "C14")
+
+
+def test_create_jobs_animation_chunks(tmp_path):
+    """Spare processes split the time steps of a product, the animation is encoded from all chunks."""
+    jobs, animations = create_jobs(
+        _args("{product}.mp4", processes=4), _time_steps(5), {"C13": "C13_id"}, "frames", str(tmp_path)
+    )
+    assert animations == {"C13": "C13.mp4"}
+    assert [job.name for job in jobs] == ["C13_0", "C13_1", "C13_2"]
+    assert [len(job.frame_paths) for job in jobs] == [2, 2, 1]
+    frame_paths = [path for job in jobs for path in job.frame_paths]
+    assert frame_paths == sorted(frame_paths)
+
+
+def test_encode_animations_skips_failed_products(monkeypatch):
+    """No animation is written for a product when one of its chunks failed."""
+    encoded = []
+    monkeypatch.setattr("uwsift.batch.encode_animation", lambda filename, paths, fps: encoded.append((filename, paths)))
+    results = [
+        JobResult("C13_0", "C13", frame_paths=["C13_0.png"]),
+        JobResult("C13_1", "C13", error="RuntimeError: no data"),
+        JobResult("C14_0", "C14", frame_paths=["C14_0.png"]),
+        JobResult("C14_1", "C14", frame_paths=["C14_1.png"]),
+    ]
+    encode_animations({"C13": "C13.mp4", "C14": "C14.mp4"}, results, 5.0)
+    assert encoded == [("C14.mp4", ["C14_0.png", "C14_1.png"])]
+
+
+@pytest.mark.parametrize("output", ["frames.png", "frames.tif"])
+def test_invalid_output(monkeypatch, output):
+    """Outputs which can't hold all frames are rejected before rendering."""
+    monkeypatch.setattr("uwsift.batch.configure_loggers", lambda: None)
+    monkeypatch.setattr("uwsift.batch.group_time_steps", lambda paths, reader: (_time_steps(2), []))
+    monkeypatch.setattr("uwsift.batch.select_products", lambda data_ids, products: {"C13": "C13_id"})
+    with pytest.raises(SystemExit):
+        main(["-r", "abi_l1b", "-o", output, "file_0.nc", "file_1.nc"])
@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+from uwsift.queue import TaskPriority, TaskQueue, Worker
+
+
+@pytest.fixture
+def task_queue(monkeypatch):
+    """Provide a task queue whose workers are only run when the test calls them."""
+    monkeypatch.setattr("uwsift.queue.TheQueue", None)
+    monkeypatch.setattr(Worker, "start", lambda self: None)
+    return TaskQueue(interactive_threads=1, background_threads=2)
+
+
+def _worker_for(task_queue, priority):
+    return next(worker for worker in task_queue.workers if priority in worker.priorities)
+
+
+def test_worker_cancels_superseded_task(task_queue):
+    """A task queued with the key of the running task stops the running one at its next yield."""
+    completed = []
+    for worker in task_queue.workers:
+        worker.workerDidCompleteTask.connect(lambda key, ok: completed.append((key, ok)))
+    events = []
+
+    def _old_task():
+        try:
+            events.append("old start")
+            task_queue.add("retile", _new_task(), "new", interactive=True)
+            yield {}
+            events.append("old continued")
+            yield {}
+        except GeneratorExit:
+            events.append("old closed")
+            raise
+
+    def _new_task():
+        events.append("new start")
+        yield {}
+
+    task_queue.add("retile", _old_task(), "old", interactive=True)
+    task_queue.add("other", iter([{}]), "other", interactive=True)
+    _worker_for(task_queue, TaskPriority.INTERACTIVE).run()
+
+    assert events == ["old start", "old closed", "new start"]
+    assert completed == [("other", True), ("retile", True)]
+
+
+def test_queue_replaces_waiting_task(task_queue):
+    """Queuing a key that is already waiting drops the old task and defers the new one to the end."""
+    first, second = iter([]), iter([])
+    task_queue.add("a", first, "a")
+    task_queue.add("b", iter([]), "b")
+    task_queue.add("a", second, "a", priority=TaskPriority.PREFETCH)
+
+    assert task_queue.remaining == 2
+    assert task_queue.depth == 2
+    worker = _worker_for(task_queue, TaskPriority.BACKGROUND)
+    # prefetch tasks are served before background tasks
+    assert task_queue._next_task(worker) == ("a", second)
+
+
+def test_interactive_pool_ignores_background_tasks(task_queue):
+    """Background work never blocks the interactive workers."""
+    task_queue.add("import", iter([]), "import")
+    worker = _worker_for(task_queue, TaskPriority.INTERACTIVE)
+    assert task_queue._next_task(worker) == (None, None)
+    assert task_queue.remaining == 1
+
+
+def test_withdraw_drops_waiting_task(task_queue):
+    """A withdrawn task is neither run nor reported as completed."""
+    completed = []
+    task_queue.add("retile", iter([{}]), "retile", interactive=True, and_then=completed.append)
+    task_queue.withdraw("retile")
+
+    assert task_queue.remaining == 0
+    assert "retile" not in task_queue._completion_futures
+    assert task_queue._next_task(_worker_for(task_queue, TaskPriority.INTERACTIVE)) == (None, None)
+
+
+def test_withdraw_waits_for_running_task(task_queue):
+    """Withdrawing a running task cancels it and returns once the worker stopped working on it."""
+    started = threading.Event()
+    events = []
+
+    def _task():
+        try:
+            while True:
+                started.set()
+                yield {}
+        except GeneratorExit:
+            events.append("closed")
+            raise
+
+    task_queue.add("retile", _task(), "retile", interactive=True)
+    worker = _worker_for(task_queue, TaskPriority.INTERACTIVE)
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    started.wait(5)
+    task_queue.withdraw("retile")
+
+    assert events == ["closed"]
+    assert worker.current_key is None
+    thread.join(5)
@@ -0,0 +1,48 @@
+import os
+import time
+
+from uwsift.util.storage_agent import StorageAgent
+
+HOUR = 3600
+
+
+def _age(path, seconds):
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_storage_agent_scans_changed_directories(tmp_path, monkeypatch):
+    """Only modified directories are listed again, expired entries are removed before their directories."""
+    sub_dir = tmp_path / "sub"
+    sub_dir.mkdir()
+    for path in (tmp_path / "old.txt", sub_dir / "old.txt", tmp_path / "new.txt"):
+        path.write_text("data")
+    _age(tmp_path / "old.txt", 2 * HOUR)
+    _age(sub_dir / "old.txt", 2 * HOUR)
+    for path in (sub_dir, tmp_path):
+        _age(path, 2 * HOUR)
+
+    agent = StorageAgent(HOUR, None)
+    agent.dir_paths = [str(tmp_path)]
+    scanned = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scanned.append(path) or scandir(path))
+
+    deletable = agent._check_for_deletable_entries()
+    assert [entry.path for entry in deletable] == [str(sub_dir / "old.txt"), str(sub_dir), str(tmp_path / "old.txt")]
+    assert sorted(scanned) == [str(tmp_path), str(sub_dir)]
+
+    # nothing changed: the directories are not listed again
+    (tmp_path / "new.txt").write_text("modified")
+    scanned.clear()
+    assert agent._check_for_deletable_entries() == []
+    assert scanned == []
+
+    agent._remove_entries(deletable)
+    assert sorted(os.listdir(tmp_path)) == ["new.txt"]
+    assert list(agent._fs_entries) == [str(tmp_path / "new.txt")]
+
+    # entries deleted by the user are forgotten
+    (tmp_path / "new.txt").unlink()
+    agent._check_for_deletable_entries()
+    assert agent._fs_entries == {}
@@ -0,0 +1,38 @@
+import json
+from uuid import uuid1
+
+from uwsift.util.task_statistics import TaskStatistics, task_category
+
+
+def test_task_category_replaces_uuids():
+    assert task_category(f"{uuid1()}_retile") == "<uuid>_retile"
+    assert task_category("load_files") == "load_files"
+
+
+def test_task_statistics_summary():
+    """Finished tasks are summarized per category, failures are counted per key."""
+    statistics = TaskStatistics()
+    keys = [f"{uuid1()}_retile" for _ in range(3)]
+    for key in keys:
+        statistics.task_enqueued(key, 0)
+    for idx, key in enumerate(keys):
+        record = statistics.task_started(key)
+        for _ in range(10):
+            statistics.task_progressed(record, "Re-tiling")
+        statistics.task_finished(record, ok=idx != 2)
+        # one total per activity, however often the task yields
+        assert list(record.stages) == ["Re-tiling"]
+
+    summary = statistics.summary()
+    retile = summary["categories"]["<uuid>_retile"]
+    assert retile["run"]["count"] == 3
+    assert retile["wait"]["count"] == 3
+    assert retile["failed"] == 1
+    assert retile["stages"]["Re-tiling"]["count"] == 3
+    assert summary["failures_per_key"] == {keys[2]: 1}
+    assert summary["waiting"] == summary["running"] == 0
+
+    data = json.loads(statistics.to_json(include_records=True))
+    assert len(data["records"]) == 3
+    # enqueue, start and finish of every task
+    assert len(data["depth_samples"]) == 9
@@ -0,0 +1,55 @@
+import json
+import threading
+
+import pytest
+
+from uwsift.util import tracing
+from uwsift.util.tracing import start_tracing, stop_tracing, trace_span, traced
+
+
+@traced()
+def _compute(value):
+    return value * 2
+
+
+@traced("task")
+def _task():
+    yield 1
+    yield 2
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    path = tmp_path / "trace.json"
+    start_tracing(str(path))
+    yield path
+    stop_tracing()
+
+
+def test_tracing_disabled():
+    """Without tracing the decorators don't wrap anything and spans are no-ops."""
+    assert tracing._TRACER is None
+    assert trace_span("nothing") is trace_span("other")
+    assert _compute(2) == 4
+    assert list(_task()) == [1, 2]
+
+
+def test_tracing_writes_chrome_trace(trace_path):
+    """Spans of all threads end up as complete events in the trace file."""
+    assert _compute(2) == 4
+    assert list(_task()) == [1, 2]
+    thread = threading.Thread(target=_compute, args=(1,), name="worker")
+    thread.start()
+    thread.join()
+    with pytest.raises(ValueError):
+        with trace_span("failing", size=3):
+            raise ValueError()
+    stop_tracing()
+
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    spans = [event for event in events if event["ph"] == "X"]
+    assert [span["name"] for span in spans] == ["_compute", "task", "_compute", "failing"]
+    assert spans[0]["tid"] != spans[2]["tid"]
+    assert spans[3]["args"] == {"size": 3, "exception": "ValueError"}
+    thread_names = {event["args"]["name"] for event in events if event["ph"] == "M"}
+    assert "worker" in thread_names
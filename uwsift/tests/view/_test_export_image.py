@@ -7,8 +7,6 @@ from typing import Any, Optional
 import imageio.v3 as imageio
 import numpy as np
 import pytest
-from matplotlib import pyplot as plt
-from numpy.testing import assert_array_equal
 from PIL import Image
 from PyQt5.QtCore import Qt
 
@@ -112,59 +110,15 @@ class _MockSGM:
         self.rng = np.random.default_rng()
         self._frame_order = frame_order
 
-    def get_screenshot_array(self, fr):
-        if self._frame_order is False and fr is None:
+    def iter_screenshot_arrays(self, frame_indexes):
+        if self._frame_order is False and frame_indexes is None:
             # no data loaded
-            return [("", self.rng.integers(0, 255, self.fake_screenshot_shape, dtype=np.uint8))]
-        if fr is None:
-            fr = (1, 1)
-        frames = []
-        for frame_idx in range(fr[0], fr[1] + 1):
-            frames.append(
-                (
-                    str(frame_idx),
-                    self.rng.integers(0, 255, self.fake_screenshot_shape, dtype=np.uint8),
-                )
-            )
-        return frames
-
-
-@pytest.mark.parametrize(
-    "size,mode,exp",
-    [
-        ((100, 100), "vertical", [0.1, 1.2]),
-        ((100, 100), "horizontal", [1.2, 0.1]),
-    ],
-)
-def test_create_colorbar(size, mode, exp, monkeypatch, window):
-    """Test colorbar is created correctly given dimensions and the colorbar append direction."""
-    monkeypatch.setattr(window.export_image, "model", _get_mock_model())
-    monkeypatch.setattr(window.export_image.sgm.main_canvas, "dpi", 100)
-
-    res = window.export_image._create_colorbar(mode, None, size)
-
-    assert_array_equal(res.get_size_inches(), exp)
-    assert res.dpi == 100
-
-
-@pytest.mark.parametrize(
-    "mode,cbar_size,exp",
-    [
-        (None, (0, 0), (100, 100)),
-        ("vertical", (10, 120), (108, 100)),
-        ("horizontal", (110, 10), (100, 109)),
-    ],
-)
-def test_append_colorbar(mode, cbar_size, exp, monkeypatch, window):
-    """Test colorbar is appended to the appropriate location given the colorbar append direction."""
-    monkeypatch.setattr(window.export_image, "model", _get_mock_model())
-    monkeypatch.setattr(window.export_image.sgm.main_canvas, "dpi", 100)
-    monkeypatch.setattr(window.export_image, "_create_colorbar", lambda x, y, z: plt.figure(figsize=cbar_size))
-
-    im = Image.new("RGBA", (100, 100))
-    res = window.export_image._append_colorbar(mode, im, None)
-
-    assert res.size == exp
+            yield "", self.rng.integers(0, 255, self.fake_screenshot_shape, dtype=np.uint8)
+            return
+        if frame_indexes is None:
+            frame_indexes = [1]
+        for frame_idx in frame_indexes:
+            yield str(frame_idx), self.rng.integers(0, 255, self.fake_screenshot_shape, dtype=np.uint8)
 
 
 @pytest.mark.parametrize("size,fs,exp", [((100, 100), 10, (100, 110))])
@@ -218,9 +172,8 @@ def test_convert_frame_range(range, exp, window):
 def test_get_animation_parameters(info, exp, monkeypatch, window):
     """Test animation parameters are calculated correctly."""
     monkeypatch.setattr(window.export_image, "model", _get_mock_model())
-    im = Image.new("RGBA", (100, 100))
 
-    res = window.export_image._get_animation_parameters(info, [(0, im), (0, im)])
+    res = window.export_image._get_animation_parameters(info, [0, 0])
     assert res == exp
 
 
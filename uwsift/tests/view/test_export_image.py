@@ -0,0 +1,221 @@
+"""Tests for composing exported frames and streaming them into animation files."""
+
+import threading
+
+import imageio.v3 as imageio
+import matplotlib as mpl
+import numpy as np
+import pytest
+from matplotlib.figure import Figure
+from numpy.testing import assert_array_equal
+from PIL import Image
+from vispy.color import Colormap
+
+from uwsift.common import Info
+from uwsift.view import export_image
+from uwsift.view.colormap import COLORMAP_MANAGER
+from uwsift.view.export_image import AnimationWriter, ExportImageHelper
+
+
+class _Presentation:
+    def __init__(self):
+        self.colormap = "Rainbow (IR Default)"
+        self.climits = (0, 1)
+
+
+class _Dataset:
+    def __init__(self, u):
+        self.info = {
+            Info.UNIT_CONVERSION: ("K", lambda t: t, lambda t: t),
+            Info.DISPLAY_NAME: f"dataset {u}",
+        }
+
+
+class _GUIThreadModel:
+    """Layer model which may only be used by the thread it was created in, like the real one."""
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.presentation = _Presentation()
+
+    def _check_thread(self):
+        assert threading.current_thread() is self.thread  # nosec B101
+
+    def get_dataset_presentation_by_uuid(self, u):
+        self._check_thread()
+        return self.presentation
+
+    def get_dataset_by_uuid(self, u):
+        self._check_thread()
+        return _Dataset(u)
+
+
+class _Canvas:
+    dpi = 100
+
+
+class _SceneGraph:
+    main_canvas = _Canvas()
+
+    def __init__(self, num_frames, shape=(40, 60, 4)):
+        self.frames = [np.full(shape, 50 * idx, dtype=np.uint8) for idx in range(num_frames)]
+
+    def iter_screenshot_arrays(self, frame_indexes):
+        for idx in frame_indexes:
+            yield idx + 1, self.frames[idx]
+
+
+@pytest.fixture
+def helper():
+    return ExportImageHelper(None, _SceneGraph(1), _GUIThreadModel())
+
+
+@pytest.fixture
+def edited_colormap():
+    """Name of a user colormap, which is removed again after the test."""
+    name = "test export colormap"
+    COLORMAP_MANAGER[name] = Colormap(["black", "white"])
+    yield name
+    del COLORMAP_MANAGER[name]
+
+
+def _count_created_colorbars(monkeypatch, helper, figsize=(10, 120)):
+    created = []
+
+    def _create_colorbar(colorbar):
+        created.append(colorbar)
+        return Figure(figsize=figsize, dpi=colorbar.dpi)
+
+    monkeypatch.setattr(helper, "_create_colorbar", _create_colorbar)
+    return created
+
+
+def _append_colorbar(helper, mode, u=1, size=(100, 100)):
+    im = Image.new("RGBA", size)
+    return helper._append_colorbar(im, helper._colorbar_inputs(mode, u, im.size))
+
+
+@pytest.mark.parametrize(
+    "size,mode,exp",
+    [
+        ((100, 100), "vertical", [0.1, 1.2]),
+        ((100, 100), "horizontal", [1.2, 0.1]),
+    ],
+)
+def test_create_colorbar(size, mode, exp, helper):
+    """Test colorbar is created correctly given dimensions and the colorbar append direction."""
+    rc_params = dict(mpl.rcParams)
+    res = helper._create_colorbar(helper._colorbar_inputs(mode, 1, size))
+
+    assert_array_equal(res.get_size_inches(), exp)
+    assert res.dpi == 100
+    # the figure is set up without touching the global settings, colorbars are created in the writer thread
+    assert dict(mpl.rcParams) == rc_params
+    tick_labels = res.axes[0].get_yticklabels() if mode == "vertical" else res.axes[0].get_xticklabels()
+    assert {label.get_fontsize() for label in tick_labels} == {export_image.TICK_SIZE}
+
+
+@pytest.mark.parametrize(
+    "mode,cbar_size,exp",
+    [
+        (None, (0, 0), (100, 100)),
+        ("vertical", (10, 120), (108, 100)),
+        ("horizontal", (110, 10), (100, 109)),
+    ],
+)
+def test_append_colorbar(mode, cbar_size, exp, monkeypatch, helper):
+    """Test colorbar is appended to the appropriate location given the colorbar append direction."""
+    _count_created_colorbars(monkeypatch, helper, cbar_size)
+
+    assert _append_colorbar(helper, mode).size == exp
+
+
+def test_append_colorbar_cached(monkeypatch, helper):
+    """Test the colorbar is rendered once for frames sharing colormap, limits and size."""
+    created = _count_created_colorbars(monkeypatch, helper)
+
+    for u in range(3):
+        _append_colorbar(helper, "vertical", u)
+    assert len(created) == 1
+
+    helper.model.presentation.climits = (0, 2)
+    res = _append_colorbar(helper, "vertical")
+    assert len(created) == 2
+    assert res.size == (108, 100)
+
+
+def test_append_colorbar_after_colormap_edit(monkeypatch, helper, edited_colormap):
+    """A colormap saved again under its name gets a new colorbar, not the cached one."""
+    created = _count_created_colorbars(monkeypatch, helper)
+    helper.model.presentation.colormap = edited_colormap
+
+    _append_colorbar(helper, "vertical")
+    _append_colorbar(helper, "vertical")
+    assert len(created) == 1
+
+    COLORMAP_MANAGER[edited_colormap] = Colormap(["blue", "red"])
+    _append_colorbar(helper, "vertical")
+    assert len(created) == 2
+    assert_array_equal(created[-1].colors[-1], [1.0, 0.0, 0.0, 1.0])
+
+
+def _compose_image(decoration, frame):
+    return Image.fromarray(frame)
+
+
+def test_animation_writer_streams_frames(tmp_path):
+    """Frames put into the writer are composed in order and written to one animation file."""
+    filename = str(tmp_path / "animation.gif")
+    frames = [np.full((6, 8, 4), value, dtype=np.uint8) for value in (0, 100, 200, 250)]
+    decorations = []
+
+    def _compose(decoration, frame):
+        decorations.append(decoration)
+        return _compose_image(decoration, frame)
+
+    writer = AnimationWriter(filename, {"duration": [100.0] * len(frames), "loop": 0}, _compose)
+    writer.start()
+    for idx, frame in enumerate(frames):
+        writer.put(idx, frame)
+    writer.finish()
+
+    assert decorations == list(range(len(frames)))
+    written = imageio.imread(filename, plugin="pillow", mode="RGBA")
+    assert written.shape == (len(frames), 6, 8, 4)
+    np.testing.assert_array_equal(written[:, 0, 0, 0], [0, 100, 200, 250])
+
+
+def test_animation_writer_reraises_errors(tmp_path):
+    """An error while writing a frame is raised in the thread passing the frames."""
+
+    def _compose(decoration, frame):
+        raise ValueError("broken frame")
+
+    writer = AnimationWriter(str(tmp_path / "animation.gif"), {"loop": 0}, _compose)
+    writer.start()
+    writer.put(None, np.zeros((6, 8, 4), dtype=np.uint8))
+    with pytest.raises(ValueError, match="broken frame"):
+        writer.finish()
+
+
+def test_save_animation_resolves_frames_in_rendering_thread(tmp_path):
+    """The layer model is only used while rendering, the writer thread composes plain values."""
+    filename = str(tmp_path / "animation.gif")
+    helper = ExportImageHelper(None, _SceneGraph(3), _GUIThreadModel())
+    info = {
+        "fps": 2,
+        "loop": True,
+        "filename": filename,
+        "colorbar": "vertical",
+        "include_footer": True,
+        "font_size": 10,
+    }
+
+    helper._save_animation(info, [1, 2, 3], [0, 1, 2], filename)
+
+    written = imageio.imread(filename, plugin="pillow", mode="RGBA")
+    assert written.shape[0] == 3
+    # the colorbar is appended to the right and the footer below the rendered frame
+    assert written.shape[1] == 40 + 10
+    assert written.shape[2] > 60
+    assert len(helper._colorbar_cache) == 1
@@ -0,0 +1,32 @@
+import numpy as np
+from vispy.visuals.transforms import ChainTransform, STTransform
+
+from uwsift.view.visuals import ProjectedMeshCache, transform_state_key
+
+
+def test_transform_state_key_follows_transform_state():
+    """The key changes with the transform state and is equal for equal states."""
+    camera = STTransform(scale=(2.0, 2.0))
+    chain = ChainTransform([camera, STTransform(translate=(1.0, 0.0))])
+    key = transform_state_key(chain)
+    assert key == transform_state_key(
+        ChainTransform([STTransform(scale=(2.0, 2.0)), STTransform(translate=(1.0, 0.0))])
+    )
+
+    camera.scale = (4.0, 4.0)
+    assert transform_state_key(chain) != key
+
+
+def test_projected_mesh_cache_reuses_entries():
+    """The mesh is only transformed again for a new key."""
+    cache = ProjectedMeshCache(max_entries=1)
+    mesh = np.array([[0.0, 0.0], [1.0, 1.0], [1e6, 0.0]])
+    transform = STTransform(scale=(2.0, 2.0))
+
+    cmesh, mask = cache.get("a", mesh, transform)
+    np.testing.assert_array_equal(cmesh[:2, :2], [[0.0, 0.0], [2.0, 2.0]])
+    np.testing.assert_array_equal(mask, [True, True, False])
+    assert cache.get("a", mesh, transform)[0] is cmesh
+
+    cache.get("b", mesh, transform)
+    assert cache.get("a", mesh, transform)[0] is not cmesh
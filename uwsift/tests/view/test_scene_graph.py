@@ -0,0 +1,127 @@
+"""Tests for the retiling of datasets by the SceneGraphManager."""
+
+from uuid import uuid4
+
+from PyQt5.QtCore import QObject
+
+from uwsift.queue import TaskPriority
+from uwsift.view.scene_graph import RETILE_READAHEAD, SceneGraphManager
+
+
+class _DatasetNode:
+    def __init__(self):
+        self.visible = False
+        self.parent = None
+        self.retiled = False
+
+    def assess(self):
+        return not self.retiled, (1, 1), None
+
+
+class _AnimationController:
+    def __init__(self, dataset_nodes):
+        self.uuids = list(dataset_nodes)
+        self.dataset_nodes = dataset_nodes
+        self.current = 0
+
+    def get_current_frame_index(self):
+        return self.current
+
+    def get_current_frame_uuid(self):
+        return self.uuids[self.current]
+
+    def jump(self, index):
+        self.current = index
+        for idx, uuid in enumerate(self.uuids):
+            self.dataset_nodes[uuid].visible = idx == index
+
+
+class _Queue:
+    def __init__(self):
+        self.tasks = []
+        self.withdrawn = []
+
+    def add(self, key, task_iterable, description, priority=None):
+        self.tasks.append((key, priority))
+
+    def withdraw(self, key):
+        self.withdrawn.append(key)
+
+
+class _SceneGraph(QObject):
+    """The screenshot logic of the SceneGraphManager without a canvas or a task queue."""
+
+    iter_screenshot_arrays = SceneGraphManager.iter_screenshot_arrays
+    _tile_shown_datasets = SceneGraphManager._tile_shown_datasets
+    _is_dataset_node_shown = SceneGraphManager._is_dataset_node_shown
+    on_view_change = SceneGraphManager.on_view_change
+    change_dataset_visible = SceneGraphManager.change_dataset_visible
+    _assess = SceneGraphManager._assess
+    _assess_stale_datasets = SceneGraphManager._assess_stale_datasets
+    _start_retiling_task = SceneGraphManager._start_retiling_task
+
+    def __init__(self, num_frames):
+        super().__init__()
+        self.dataset_nodes = {uuid4(): _DatasetNode() for _ in range(num_frames)}
+        self._stale_dataset_uuids = set(self.dataset_nodes)
+        self._prefetching_uuids = set()
+        self.queue = _Queue()
+        self.animation_controller = _AnimationController(self.dataset_nodes)
+        self.animation_controller.jump(0)
+        self.dataset_nodes[self.animation_controller.uuids[0]].retiled = True
+        self.main_canvas = type("_Canvas", (), {"on_draw": lambda self, event: None})()
+
+    def _readahead_dataset_uuids(self, uuid):
+        uuids = self.animation_controller.uuids
+        return [uuids[(uuids.index(uuid) + 1) % len(uuids)]]
+
+    def _update(self):
+        pass
+
+    def _retile_child(self, uuid, preferred_stride, tile_box):
+        # a queued retile of the dataset must not run at the same time
+        assert f"{uuid}_retile" in self.queue.withdrawn  # nosec B101
+        yield {}
+        self.dataset_nodes[uuid].retiled = True
+
+    def _render_screenshot(self, offscreen):
+        node = self.dataset_nodes[self.animation_controller.get_current_frame_uuid()]
+        return node.retiled
+
+
+def test_screenshot_beyond_readahead_is_tiled():
+    """Frames which weren't assessed since the last view change are retiled before they are rendered."""
+    scene_graph = _SceneGraph(RETILE_READAHEAD + 3)
+    last_frame = RETILE_READAHEAD + 2
+
+    frames = list(scene_graph.iter_screenshot_arrays([0, last_frame], offscreen=True))
+
+    assert [uuid for uuid, _ in frames] == [scene_graph.animation_controller.uuids[idx] for idx in (0, last_frame)]
+    assert all(retiled for _, retiled in frames)
+    assert scene_graph.animation_controller.get_current_frame_index() == 0
+    assert scene_graph.animation_controller.uuids[last_frame] not in scene_graph._stale_dataset_uuids
+    assert scene_graph.queue.withdrawn == [
+        f"{scene_graph.animation_controller.uuids[idx]}_retile" for idx in (0, last_frame)
+    ]
+
+
+def test_readahead_retiles_are_prefetched():
+    """Hidden time steps following the shown one are retiled by prefetch tasks, promoted once they are shown."""
+    scene_graph = _SceneGraph(4)
+    uuids = scene_graph.animation_controller.uuids
+    scene_graph.dataset_nodes[uuids[0]].retiled = False
+
+    scene_graph.on_view_change(None)
+    assert scene_graph.queue.tasks == [
+        (f"{uuids[0]}_retile", TaskPriority.INTERACTIVE),
+        (f"{uuids[1]}_retile", TaskPriority.PREFETCH),
+    ]
+    assert scene_graph._stale_dataset_uuids == set(uuids[2:])
+
+    scene_graph.queue.tasks.clear()
+    scene_graph.animation_controller.jump(1)
+    scene_graph.change_dataset_visible(uuids[1], True)
+    assert scene_graph.queue.tasks == [
+        (f"{uuids[1]}_retile", TaskPriority.INTERACTIVE),
+        (f"{uuids[2]}_retile", TaskPriority.PREFETCH),
+    ]
@@ -0,0 +1,122 @@
+from collections import deque
+
+import numpy as np
+from vispy.visuals._scalable_textures import GPUScaledTexture2D
+
+from uwsift.common import IndexBox
+from uwsift.view import visuals
+from uwsift.view.texture_atlas import TextureAtlas2D
+from uwsift.view.visuals import SIFTTiledGeolocatedMixin, TextureTileState
+
+
+def _record_uploads(monkeypatch):
+    uploads = []
+
+    def _scale_and_set_data(self, data, offset=None, copy=False):
+        uploads.append((offset, np.array(data, copy=True)))
+
+    monkeypatch.setattr(GPUScaledTexture2D, "scale_and_set_data", _scale_and_set_data)
+    return uploads
+
+
+def test_set_tiles_data_coalesces_adjacent_tiles(monkeypatch):
+    """Tiles next to each other in one atlas row are uploaded together."""
+    atlas = TextureAtlas2D((2, 4), tile_shape=(4, 4), internalformat="R32F", format="LUMINANCE")
+    uploads = _record_uploads(monkeypatch)
+
+    tiles = [(idx, np.full((4, 4), idx, dtype=np.float32)) for idx in (1, 2, 3, 4, 6)]
+    atlas.set_tiles_data(tiles)
+
+    # 1-3 share the first row, 4 starts the second row, 6 is not adjacent to 4
+    assert [offset for offset, _ in uploads] == [(0, 4), (4, 0), (4, 8)]
+    assert uploads[0][1].shape == (4, 12)
+    np.testing.assert_array_equal(uploads[0][1][:, 4:8], 2)
+    assert uploads[1][1].shape == (4, 4)
+
+
+def test_set_tiles_data_hands_over_upload_buffers(monkeypatch):
+    """Every upload gets a buffer of its own, which vispy may keep until the next draw without copying it."""
+    atlas = TextureAtlas2D((2, 4), tile_shape=(4, 4), internalformat="R32F", format="LUMINANCE")
+    uploads = []
+    monkeypatch.setattr(
+        GPUScaledTexture2D,
+        "scale_and_set_data",
+        lambda self, data, offset=None, copy=False: uploads.append((data, copy)),
+    )
+
+    atlas.set_tiles_data([(idx, np.full((4, 4), idx, dtype=np.float32)) for idx in (0, 4)])
+    atlas.set_tiles_data([(2, np.full((4, 4), 2, dtype=np.float32))])
+
+    assert [copy for _, copy in uploads] == [False] * 3
+    assert not any(np.shares_memory(a, b) for (a, _), (b, _) in zip(uploads, uploads[1:]))
+    assert [data[0, 0] for data, _ in uploads] == [0, 4, 2]
+
+
+def test_set_tiles_data_fills_partial_tiles(monkeypatch):
+    """Edge tiles smaller than the tile shape are NaN filled."""
+    atlas = TextureAtlas2D((1, 4), tile_shape=(4, 4), internalformat="R32F", format="LUMINANCE")
+    uploads = _record_uploads(monkeypatch)
+
+    atlas.set_tiles_data([(0, np.ones((4, 4), dtype=np.float32)), (1, np.ones((2, 3), dtype=np.float32)), (2, None)])
+
+    assert len(uploads) == 1
+    data = uploads[0][1]
+    np.testing.assert_array_equal(data[:, :4], 1)
+    np.testing.assert_array_equal(data[:2, 4:7], 1)
+    assert np.isnan(data[2:, 4:8]).all()
+    assert np.isnan(data[:, 7]).all()
+    assert np.isnan(data[:, 8:]).all()
+
+
+class _FakeTexture:
+    def __init__(self):
+        self.batches = []
+
+    def set_tiles_data(self, tiles):
+        self.batches.append([tex_tile_idx for tex_tile_idx, _ in tiles])
+
+
+class _UploadingTiles(SIFTTiledGeolocatedMixin):
+    """Only the upload bookkeeping of a tiled visual, without any GL objects."""
+
+    def __init__(self, texture_state):
+        self.texture_state = texture_state
+        self._texture = _FakeTexture()
+        self._pending_tiles = deque()
+        self._pending_vertex_tiles = None
+        self._bound_tex_tiles = set()
+        self._pending_bound_tiles = deque()
+        self.applied_vertices = []
+
+    def _set_vertex_tiles(self, vertices, tex_coords):
+        self.applied_vertices.append((vertices, self._texture.batches[-1]))
+
+    def update(self):
+        pass
+
+
+def test_retile_keeps_shown_atlas_tiles_until_vertex_swap(monkeypatch):
+    """Tiles overwriting atlas tiles of the shown vertices are uploaded together with the new vertices."""
+    monkeypatch.setattr(visuals, "TEXTURE_UPLOAD_BUDGET", 1)
+    stride = (1, 1)
+    state = TextureTileState(4)
+    visual = _UploadingTiles(state)
+    tile = np.zeros((2, 2), dtype=np.float32)
+
+    # first retile shows the tiles 0 and 1 in the atlas tiles 0 and 1
+    tiles_info = [(stride, 0, tix, state.add_tile((stride, 0, tix)), tile) for tix in range(2)]
+    visual.set_retiled(stride, IndexBox(bottom=1, left=0, top=0, right=2), tiles_info, "first", None)
+    assert visual.applied_vertices == []
+    visual.flush_pending_tiles()
+    assert visual._texture.batches == [[0], [1]]
+    assert visual.applied_vertices == [("first", [1])]
+
+    # the second retile needs tiles 2 to 4, tile 4 evicts the shown tile 0
+    tiles_info = [(stride, 0, tix, state.add_tile((stride, 0, tix)), tile) for tix in (2, 3, 4)]
+    assert [info[3] for info in tiles_info] == [2, 3, 0]
+    visual.set_retiled(stride, IndexBox(bottom=1, left=2, top=0, right=5), tiles_info, "second", None)
+    # the free atlas tiles are filled first while the first vertices are still applied
+    assert visual._texture.batches[-1] == [2]
+    assert len(visual.applied_vertices) == 1
+    visual._upload_pending_tiles()
+    assert visual.applied_vertices[-1] == ("second", [3, 0])
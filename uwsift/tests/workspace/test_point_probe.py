@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for probing the contents of the workspace at a position."""
+
+from uuid import uuid1
+
+import numpy as np
+import pytest
+from pyproj import Proj
+
+from uwsift.common import Info
+from uwsift.workspace import SimpleWorkspace
+
+GEOS_PROJ = "+proj=geos +lon_0=0 +h=35786023 +a=6378137 +b=6356752.31414 +sweep=x +units=m +no_defs"
+LATLONG_PROJ = "+proj=latlong +datum=WGS84 +no_defs"
+
+
+def _info(uuid, proj, origin, cell_size, shape):
+    return {
+        Info.UUID: uuid,
+        Info.PROJ: proj,
+        Info.ORIGIN_X: origin[0],
+        Info.ORIGIN_Y: origin[1],
+        Info.CELL_WIDTH: cell_size[0],
+        Info.CELL_HEIGHT: cell_size[1],
+        Info.SHAPE: shape,
+        Info.GRID_ORIGIN: "NW",
+        Info.GRID_FIRST_INDEX_X: 1,
+        Info.GRID_FIRST_INDEX_Y: 1,
+    }
+
+
+@pytest.fixture
+def probed_workspace(tmp_path, monkeypatch):
+    """A workspace with a geostationary and a lon/lat dataset, counting the lookups of their info."""
+    workspace = SimpleWorkspace(str(tmp_path))
+    geos_uuid, latlong_uuid = uuid1(), uuid1()
+    infos = {
+        geos_uuid: _info(geos_uuid, GEOS_PROJ, (-5.0e5, 5.0e5), (1.0e4, -1.0e4), (100, 100)),
+        latlong_uuid: _info(latlong_uuid, LATLONG_PROJ, (-10.0, 10.0), (1.0, -1.0), (20, 20)),
+    }
+    contents = {uuid: np.arange(np.prod(info[Info.SHAPE])).reshape(info[Info.SHAPE]) for uuid, info in infos.items()}
+    lookups = []
+
+    def _get_info(info_or_uuid, lod=None):
+        lookups.append(info_or_uuid)
+        return infos.get(info_or_uuid)
+
+    monkeypatch.setattr(workspace, "get_info", _get_info)
+    monkeypatch.setattr(workspace, "get_content", lambda uuid, lod=None, kind=None: contents[uuid])
+    return workspace, geos_uuid, latlong_uuid, lookups
+
+
+def test_get_content_points(probed_workspace):
+    """All contents are probed at once, the geolocation of every dataset is only looked up once."""
+    workspace, geos_uuid, latlong_uuid, lookups = probed_workspace
+    xy_pos = (1.5, 2.5)
+
+    x, y = Proj(GEOS_PROJ)(*xy_pos)
+    geos_row, geos_col = int(np.floor((y - 5.0e5) / -1.0e4)), int(np.floor((x + 5.0e5) / 1.0e4))
+    expected = [geos_row * 100 + geos_col, (10 - 3) * 20 + 11, None]
+    for _ in range(2):
+        assert workspace.get_content_points([geos_uuid, latlong_uuid, None], xy_pos) == expected
+    assert workspace.get_content_point(geos_uuid, xy_pos) == expected[0]
+    assert workspace.position_to_grid_index(latlong_uuid, xy_pos) == (7 + 1, 11 + 1)
+    assert sorted(map(str, lookups)) == sorted(map(str, [geos_uuid, latlong_uuid]))
+
+    # outside of the contents
+    assert workspace.get_content_points([geos_uuid, latlong_uuid], (120.0, 60.0)) == [None, None]
+
+
+def test_get_content_time_series(probed_workspace):
+    """Time steps sharing a grid are probed with one index, neighbourhoods average their valid pixels."""
+    workspace, geos_uuid, latlong_uuid, lookups = probed_workspace
+    contents = {uuid: workspace.get_content(uuid).astype(np.float64) for uuid in (geos_uuid, latlong_uuid)}
+    contents[latlong_uuid][7, 10] = np.nan
+    workspace.get_content = lambda uuid, lod=None, kind=None: contents[uuid]
+    xy_pos = (1.5, 2.5)
+
+    values = workspace.get_content_time_series([latlong_uuid, None, latlong_uuid], xy_pos)
+    np.testing.assert_array_equal(values, [7 * 20 + 11, np.nan, 7 * 20 + 11])
+
+    # the 3x3 neighbourhood without the invalid pixel
+    window = contents[latlong_uuid][6:9, 10:13]
+    values = workspace.get_content_time_series([latlong_uuid, geos_uuid], xy_pos, radius=1)
+    assert values[0] == pytest.approx(np.nanmean(window))
+    assert np.isfinite(values[1])
+
+    # outside of the contents
+    values = workspace.get_content_time_series([geos_uuid, latlong_uuid], (120.0, 60.0), radius=2)
+    assert np.isnan(values).all()
+
+
+def test_get_region_statistics_time_series(probed_workspace):
+    """The polygon is rasterized on the grid of every dataset, the statistics of its pixels are computed."""
+    workspace, geos_uuid, latlong_uuid, lookups = probed_workspace
+    points = [(-2.0, -2.0), (3.0, -2.0), (3.0, 4.0), (-2.0, 4.0)]
+    series = workspace.get_region_statistics_time_series([latlong_uuid, None, latlong_uuid, geos_uuid], points)
+
+    # pixel centers within lon -2..3 and lat -2..4: rows 6..11, columns 8..12
+    values = workspace.get_content(latlong_uuid)[6:12, 8:13]
+    np.testing.assert_array_equal(series["count"][:3], [values.size, np.nan, values.size])
+    assert series["mean"][0] == pytest.approx(values.mean())
+    assert series["std"][2] == pytest.approx(values.std())
+    assert series["count"][3] > 0
+
+    series = workspace.get_region_statistics_time_series([latlong_uuid])
+    assert series["max"][0] == 20 * 20 - 1
+
+
+@pytest.mark.parametrize("cell_size", [1.0, 0.5, 2.0])
+def test_get_content_coordinate_mask_same_projection(probed_workspace, cell_size):
+    """Grids in the same projection are mapped by their pixel indexes like the projected coordinates are."""
+    workspace, geos_uuid, latlong_uuid, lookups = probed_workspace
+    other_uuid = uuid1()
+    shape = (int(20 / cell_size),) * 2
+    other_info = _info(other_uuid, LATLONG_PROJ, (-10.0, 10.0), (cell_size, -cell_size), shape)
+    other_content = np.arange(np.prod(shape)).reshape(shape)
+    get_info, get_content = workspace.get_info, workspace.get_content
+    workspace.get_info = lambda uuid, lod=None: other_info if uuid == other_uuid else get_info(uuid)
+    workspace.get_content = lambda uuid, lod=None, kind=None: other_content if uuid == other_uuid else get_content(uuid)
+
+    points = [(-2.0, -2.0), (3.0, -2.0), (3.0, 4.0), (-2.0, 4.0)]
+    coords_mask, _ = workspace.get_coordinate_mask_polygon(latlong_uuid, points)
+    fast = workspace.get_content_coordinate_mask(other_uuid, coords_mask)
+    projected = workspace.get_content_coordinate_mask(other_uuid, coords_mask.coords)
+    np.testing.assert_array_equal(fast, projected)
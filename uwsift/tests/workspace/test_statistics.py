@@ -11,9 +11,16 @@ TODO:
 
 import dask.array as da
 import numpy as np
+import pytest
 import xarray as xr
 
-from uwsift.workspace.statistics import dataset_statistical_analysis
+from uwsift.workspace.statistics import (
+    DensityHistogram,
+    content_histogram,
+    convert_histogram,
+    dataset_statistical_analysis,
+    region_statistics_series,
+)
 
 
 def test_categorial_data_statistics_dict():
@@ -122,3 +129,89 @@ def test_continuous_data_statistics_dict():
     stats_values_iter = iter(stats_dict["stats"].values())
     assert type(next(stats_values_iter)[0]) is int
     assert isinstance(next(stats_values_iter)[0], float)
+
+
+def test_content_histogram_matches_numpy():
+    """The chunked histogram counts like np.histogram and ignores NaNs"""
+    data = np.random.default_rng(0).normal(size=(300, 200))
+    data[::7, ::3] = np.nan
+
+    counts, edges = content_histogram(data, num_bins=50)
+    valid = data[~np.isnan(data)]
+    expected_counts, expected_edges = np.histogram(valid, bins=50, range=(valid.min(), valid.max()))
+    np.testing.assert_allclose(edges, expected_edges)
+    np.testing.assert_array_equal(counts, expected_counts)
+    assert counts.sum() == valid.size
+
+    assert content_histogram(np.full((3, 3), np.nan)) is None
+
+
+def test_convert_histogram():
+    """Bins stay in increasing order for decreasing conversions, non-monotonic ones can't be converted"""
+    counts, edges = content_histogram(np.arange(10.0), num_bins=5)
+
+    converted_counts, converted_edges = convert_histogram((counts, edges), lambda x: x - 273.15)
+    np.testing.assert_allclose(converted_edges, edges - 273.15)
+    np.testing.assert_array_equal(converted_counts, counts)
+
+    counts[0] += 1
+    converted_counts, converted_edges = convert_histogram((counts, edges), lambda x: -2.0 * x)
+    np.testing.assert_allclose(converted_edges, -2.0 * edges[::-1])
+    np.testing.assert_array_equal(converted_counts, counts[::-1])
+
+    assert convert_histogram((counts, edges), lambda x: (x - 4.0) ** 2) is None
+
+
+def test_density_histogram_matches_numpy():
+    """The block wise 2D binning counts like np.histogram2d after converting the units"""
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(200, 300))
+    y = x + rng.normal(scale=0.5, size=(200, 300))
+    x[::5, ::7] = np.nan
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x_range = (np.nanmin(x) - 273.15, np.nanmax(x) - 273.15)
+    y_range = (np.nanmin(y), np.nanmax(y))
+
+    density = DensityHistogram(x_range, y_range, num_bins=20)
+    density.update(x, y, x_conv=lambda data: data - 273.15, chunk_size=1000)
+    expected, _, _ = np.histogram2d(x[valid] - 273.15, y[valid], bins=20, range=[x_range, y_range])
+    assert density.counts.sum() == valid.sum()
+    # values on a bin edge may end up in the neighbouring bin after rounding differently
+    assert np.abs(density.counts - expected).sum() <= 2
+
+
+def test_density_histogram_maps_coarse_content():
+    """A content with a coarser resolution is paired with the pixels of the finer one covering the same area"""
+    fine = np.arange(16, dtype=np.float64).reshape((4, 4))
+    coarse = np.array([[0.0, 1.0], [2.0, 3.0]])
+    density = DensityHistogram((0.0, 3.0), (0.0, 15.0), num_bins=4).update(coarse, fine, chunk_size=5)
+    # every coarse pixel covers 2x2 fine pixels
+    expected, _, _ = np.histogram2d(
+        np.repeat(np.repeat(coarse, 2, axis=0), 2, axis=1).ravel(), fine.ravel(), bins=4, range=[(0, 3), (0, 15)]
+    )
+    np.testing.assert_array_equal(density.counts, expected)
+
+
+def test_region_statistics_series():
+    """The statistics of every region are streamed chunk by chunk like numpy computes them for the whole region"""
+    rng = np.random.default_rng(0)
+    contents = [rng.normal(loc=idx, size=(50, 60)) for idx in range(3)]
+    contents[1][10:20] = np.nan
+    index_mask = np.nonzero(rng.random((50, 60)) < 0.3)
+    series = region_statistics_series([(contents[0], index_mask), None, (contents[1], None), (contents[2], index_mask)])
+
+    for idx, values in [(0, contents[0][index_mask]), (2, contents[1]), (3, contents[2][index_mask])]:
+        assert series["count"][idx] == np.count_nonzero(~np.isnan(values))
+        for name, func in [("mean", np.nanmean), ("min", np.nanmin), ("max", np.nanmax), ("std", np.nanstd)]:
+            assert series[name][idx] == pytest.approx(func(values))
+    assert all(np.isnan(values[1]) for values in series.values())
+
+
+def test_region_statistics_series_categorical():
+    """For categorical data the fraction of every category is computed"""
+    content = np.array([[0, 1, 1], [2, 2, 2]])
+    categories = [(0, "clear"), (1, "cloudy"), (2, "n/a")]
+    series = region_statistics_series([(content, None), (content, (np.array([0, 0]), np.array([0, 1])))], categories)
+    np.testing.assert_allclose(series[0], [100.0 / 6, 50.0])
+    np.testing.assert_allclose(series[1], [200.0 / 6, 50.0])
+    np.testing.assert_allclose(series[2], [50.0, 0.0])
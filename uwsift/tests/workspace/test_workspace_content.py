@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the values the workspace derives from the contents it activates."""
+
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from uuid import uuid1
+
+import numpy as np
+import pytest
+
+from uwsift.common import Info, Kind
+from uwsift.workspace import CachingWorkspace, SimpleWorkspace
+from uwsift.workspace import workspace as workspace_module
+from uwsift.workspace.importer import aImporter, import_progress
+from uwsift.workspace.workspace import ACTUAL_RANGE_KEY, histogram_path
+
+LATLONG_PROJ = "+proj=latlong +datum=WGS84 +no_defs"
+
+
+def _info():
+    return {
+        Info.UUID: uuid1(),
+        Info.KIND: Kind.IMAGE,
+        Info.SHORT_NAME: "test",
+        Info.FAMILY: "image:test",
+        Info.CATEGORY: "test",
+        Info.SERIAL: "20240101T120000",
+        Info.OBS_TIME: datetime(2024, 1, 1, 12),
+        Info.OBS_DURATION: timedelta(minutes=10),
+        Info.PROJ: LATLONG_PROJ,
+        Info.ORIGIN_X: -10.0,
+        Info.ORIGIN_Y: 10.0,
+        Info.CELL_WIDTH: 1.0,
+        Info.CELL_HEIGHT: -1.0,
+        Info.SHAPE: (20, 20),
+        Info.GRID_ORIGIN: "NW",
+        Info.GRID_FIRST_INDEX_X: 1,
+        Info.GRID_FIRST_INDEX_Y: 1,
+    }
+
+
+@pytest.fixture
+def content_workspace(tmp_path):
+    """A caching workspace, which keeps the contents, with one activated 20x20 dataset counting from 0 to 399."""
+    workspace = CachingWorkspace(str(tmp_path))
+    uuid, _, _ = workspace._create_product_from_array(_info(), np.arange(400, dtype=np.float32).reshape(20, 20))
+    yield workspace, uuid
+    inventory = workspace.metadatabase
+    inventory.SessionRegistry.remove()
+    inventory.engine.dispose()
+
+
+def _reactivate(workspace, uuid):
+    with workspace.metadatabase as s:
+        workspace._deactivate_content_for_product(workspace._product_with_uuid(s, uuid))
+    workspace._overview_content_for_uuid(uuid)
+
+
+def test_histogram_computed_once(content_workspace, monkeypatch):
+    """The histogram is computed with the statistics, later activations read it from the file next to the data."""
+    workspace, uuid = content_workspace
+    counts, edges = workspace.get_histogram_for_dataset_by_uuid(uuid)
+    assert counts.sum() == 400
+    assert (edges[0], edges[-1]) == (0.0, 399.0)
+    assert workspace.get_histogram_for_dataset_by_uuid(uuid)[0] is counts
+    with workspace.metadatabase as s:
+        content = workspace._product_with_uuid(s, uuid).content[0]
+        assert "histogram" not in content.info
+        assert os.path.exists(os.path.join(workspace.cache_dir, histogram_path(content)))
+
+    computed = []
+    content_histogram = workspace_module.content_histogram
+    monkeypatch.setattr(
+        workspace_module, "content_histogram", lambda *args: computed.append(args) or content_histogram(*args)
+    )
+    _reactivate(workspace, uuid)
+    persisted_counts, persisted_edges = workspace.get_histogram_for_dataset_by_uuid(uuid)
+    assert computed == []
+    np.testing.assert_array_equal(persisted_counts, counts)
+    np.testing.assert_array_equal(persisted_edges, edges)
+
+
+def test_actual_range_read_without_activation(content_workspace):
+    """The persisted min/max values are used without activating the content again."""
+    workspace, uuid = content_workspace
+    assert workspace.get_min_max_value_for_dataset_by_uuid(uuid) == (0.0, 399.0)
+
+    with workspace.metadatabase as s:
+        workspace._deactivate_content_for_product(workspace._product_with_uuid(s, uuid))
+    # like after restarting with the same workspace
+    workspace._actual_ranges.clear()
+    assert workspace.get_min_max_value_for_dataset_by_uuid(uuid) == (0.0, 399.0)
+    assert workspace._get_active_content_by_uuid(uuid) is None
+
+
+class _SegmentImporter:
+    """Importer merging a late segment with larger values into the last rows of the existing content."""
+
+    def __init__(self, workspace, target_uuid):
+        self.workspace = workspace
+        self.target_uuid = target_uuid
+
+    def begin_import_products(self, prod):
+        content = self.workspace.contents[self.target_uuid]
+        data = self.workspace._get_active_content_by_uuid(self.target_uuid).data
+        data[-2:] = 1000.0
+        yield import_progress(
+            uuid=self.target_uuid,
+            stages=1,
+            current_stage=0,
+            completion=1.0,
+            stage_desc="merging",
+            dataset_info=None,
+            data=data,
+            content=content,
+        )
+
+
+def test_actual_range_updated_on_merge(tmp_path, monkeypatch):
+    """Merging a segment with a new maximum into active content updates the min/max values and the histogram."""
+    workspace = SimpleWorkspace(str(tmp_path))
+    uuid, _, _ = workspace._create_product_from_array(_info(), np.arange(400, dtype=np.float32).reshape(20, 20))
+    assert workspace.get_min_max_value_for_dataset_by_uuid(uuid) == (0.0, 399.0)
+
+    segment = SimpleNamespace(uuid=uuid1(), info={Info.KIND: Kind.IMAGE, Info.SHORT_NAME: "test"}, content=[])
+    monkeypatch.setattr(aImporter, "from_product", lambda *args, **kwargs: _SegmentImporter(workspace, uuid))
+    workspace.import_product_content(segment.uuid, prod=segment, merge_target_uuid=uuid)
+
+    assert workspace.get_min_max_value_for_dataset_by_uuid(uuid) == (0.0, 1000.0)
+    assert workspace.contents[uuid].info[ACTUAL_RANGE_KEY] == (0.0, 1000.0)
+    assert workspace.get_statistics_for_dataset_by_uuid(uuid)["stats"]["max"] == [1000.0]
+    counts, edges = workspace.get_histogram_for_dataset_by_uuid(uuid)
+    assert (edges[0], edges[-1]) == (0.0, 1000.0)
+    assert counts[-1] == 40
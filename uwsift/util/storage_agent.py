@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import heapq
 import logging
 import os
 import random
@@ -7,9 +8,8 @@ import string
 import subprocess  # nosec: B404
 import time
 from datetime import datetime, timedelta
-from itertools import chain
 from socket import gethostname
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 
 import appdirs
 from donfig import Config
@@ -18,6 +18,12 @@ from uwsift.util.default_paths import APPLICATION_AUTHOR, APPLICATION_NAME
 
 LOG = logging.getLogger(__name__)
 
+# Directories modified less than this many nanoseconds before they are scanned
+# may be modified again without a visible change of their mtime (its resolution
+# may be as coarse as seconds depending on the filesystem), thus they are
+# scanned again in the next cycle.
+RACY_MTIME_NS = 2_000_000_000
+
 
 class FileMetadata:
     """
@@ -64,6 +70,13 @@ class StorageAgent:
         self.hostname = gethostname()
         self.files_lifetime = timedelta(seconds=files_lifetime)
 
+        # deletion schedule ordered by deadline, entries are checked when their deadline has passed
+        self._deadlines: List[Tuple[datetime, str]] = []
+        # names of the entries of each scanned directory, mapped to whether they are directories
+        self._dir_entries: Dict[str, Dict[str, bool]] = {}
+        # mtime in nanoseconds of each directory at its last scan, None if it has to be scanned again
+        self._dir_mtimes: Dict[str, Optional[int]] = {}
+
         self.notification_cmd = None
         if notification_cmd:
             self.notification_cmd = shlex.quote(notification_cmd)
@@ -137,29 +150,140 @@ class StorageAgent:
             self._notify(logging.ERROR, f"directory does not exist or has read-only access: {dir_path}")
             return False
 
-    def _list_filesystem_entries(self, root_dir_path: str) -> List[FileMetadata]:
+    def _track_entry(self, entry: FileMetadata, reason: str) -> None:
+        """
+        Remember the metadata of the filesystem entry and schedule its deletion.
+
+        :param entry: current metadata of the entry
+        :param reason: FOUND or MODIFIED, used for the log message
+        """
+        deadline = entry.last_data_modification + self.files_lifetime
+        self._fs_entries[entry.path] = entry
+        heapq.heappush(self._deadlines, (deadline, entry.path))
+        self._notify(logging.DEBUG, f"[{reason}] {entry.path} -> will be deleted at {deadline}")
+
+    def _forget_entry(self, path: str) -> None:
+        """
+        Forget the filesystem entry and, if it is a directory, all entries below
+        it. Their scheduled deletions are skipped when their deadlines pass.
+
+        :param path: absolute path to the filesystem entry
+        """
+        self._fs_entries.pop(path, None)
+        self._dir_mtimes.pop(path, None)
+        for name in self._dir_entries.pop(path, {}):
+            self._forget_entry(os.path.join(path, name))
+
+    def _forget_removed_entry(self, path: str) -> None:
+        """
+        Forget a filesystem entry removed by this agent, so that it isn't
+        reported as deleted by the user when its directory is scanned again.
+
+        :param path: absolute path to the filesystem entry
+        """
+        dir_path, name = os.path.split(path)
+        self._dir_entries.get(dir_path, {}).pop(name, None)
+        self._forget_entry(path)
+
+    def _scan_directory(self, dir_path: str) -> None:
         """
-        Crawl the specified directory and retrieve the metadata for each
-        entry if it is not part of the list _ignored_entries.
+        List the directory and process the differences to the previous scan:
+        new entries are scheduled for deletion, vanished ones are forgotten.
+
+        :param dir_path: absolute path to a directory
+        """
+        old_entries = self._dir_entries.get(dir_path, {})
+        try:
+            with os.scandir(dir_path) as it:
+                entries = {entry.name: entry.is_dir(follow_symlinks=False) for entry in it}
+        except OSError as e:
+            # like os.walk() skip directories which can't be listed, try again in the next cycle
+            LOG.debug(f"Can't list directory {dir_path}: {e}")
+            self._dir_mtimes.pop(dir_path, None)
+            return
+
+        for name, is_dir in old_entries.items():
+            if entries.get(name) != is_dir:
+                self._notify(logging.DEBUG, f"[DELETED BY USER] {os.path.join(dir_path, name)}")
+                self._forget_entry(os.path.join(dir_path, name))
+
+        for name, is_dir in list(entries.items()):
+            entry_path = os.path.join(dir_path, name)
+            if old_entries.get(name) == is_dir or entry_path in self._ignored_entries:
+                continue
+            try:
+                stat = os.stat(entry_path, follow_symlinks=False)
+            except FileNotFoundError:
+                del entries[name]
+                continue
+            self._track_entry(FileMetadata(entry_path, stat.st_size, stat.st_mtime), "FOUND")
+
+        self._dir_entries[dir_path] = entries
+
+    def _update_directory_tree(self, root_dir_path: str) -> None:
+        """
+        Stat all directories below the specified directory and scan only those
+        again which have been modified since their previous scan, i.e. where
+        entries have been created, deleted or renamed. Don't follow symlinks
+        because files outside of the root_dir_path should not be analyzed.
 
         :param root_dir_path: absolute path to a directory
-        :return: a list of FileMetadata objects
         """
-        entries = []
-
-        # Files need to be removed before directories so we visit them from
-        # bottom to top. Don't follow symlinks because files outside of the
-        # root_dir_path should not be analyzed. The files will be deleted after
-        # a certain time and files outside of the temporary directory should
-        # not be affected by this tool.
-        for root, dirs, files in os.walk(root_dir_path, topdown=False, followlinks=False):
-            # return files before dirs in order to prevent a call to rmdir with a non empty directory
-            for entry in chain(files, dirs):
-                entry_path = os.path.join(root, entry)
-                if entry_path not in self._ignored_entries:
-                    stat = os.stat(entry_path, follow_symlinks=False)
-                    entries.append(FileMetadata(entry_path, stat.st_size, stat.st_mtime))
-        return entries
+        dir_paths = [root_dir_path]
+        while dir_paths:
+            dir_path = dir_paths.pop()
+            try:
+                stat = os.stat(dir_path, follow_symlinks=False)
+            except OSError:
+                # the scan of its parent directory will report it as deleted
+                continue
+
+            if dir_path not in self._dir_entries or self._dir_mtimes.get(dir_path) != stat.st_mtime_ns:
+                entry = self._fs_entries.get(dir_path)
+                if entry is not None and entry.last_data_modification != datetime.fromtimestamp(stat.st_mtime):
+                    self._track_entry(FileMetadata(dir_path, stat.st_size, stat.st_mtime), "MODIFIED")
+                self._scan_directory(dir_path)
+                racy = time.time_ns() - stat.st_mtime_ns < RACY_MTIME_NS
+                self._dir_mtimes[dir_path] = None if racy else stat.st_mtime_ns
+
+            entries = self._dir_entries.get(dir_path, {})
+            dir_paths.extend(os.path.join(dir_path, name) for name, is_dir in entries.items() if is_dir)
+
+    def _pop_deletable_entries(self, now: datetime) -> List[FileMetadata]:
+        """
+        Take all entries from the deletion schedule whose deadline has passed.
+        Since modifications of files don't change the mtime of their directory,
+        each entry is checked once more before it is returned: if it has been
+        modified, its deletion is rescheduled.
+
+        :param now: current time
+        :return: list of deletable filesystem entries
+        """
+        deletable_entries = []
+        while self._deadlines and now > self._deadlines[0][0]:
+            deadline, path = heapq.heappop(self._deadlines)
+            entry = self._fs_entries.get(path)
+            if entry is None or entry.last_data_modification + self.files_lifetime != deadline:
+                # forgotten or rescheduled in the meantime
+                continue
+
+            try:
+                stat = os.stat(path, follow_symlinks=False)
+            except FileNotFoundError:
+                # the scan of its directory will report it as deleted
+                continue
+            current_entry = FileMetadata(path, stat.st_size, stat.st_mtime)
+            # don't check the size because last_data_modification changes too
+            if current_entry.last_data_modification != entry.last_data_modification:
+                self._track_entry(current_entry, "MODIFIED")
+                continue
+
+            del self._fs_entries[path]
+            deletable_entries.append(current_entry)
+
+        # the entries of a directory have to be removed before the directory itself
+        deletable_entries.sort(key=lambda deletable_entry: deletable_entry.path, reverse=True)
+        return deletable_entries
 
     def _check_for_deletable_entries(self) -> List[FileMetadata]:
         """
@@ -169,40 +293,41 @@ class StorageAgent:
         the files_lifetime of an entry reaches zero, then it will be included in
         the returned list.
 
-        :return: list of deletable filesystem entries
+        Only directories whose mtime changed since the previous check are
+        listed again, the other entries are only looked at again when their
+        deletion deadline has passed.
+
+        :return: list of deletable filesystem entries, entries of a directory
+                 before the directory
         """
-        deletable_entries = []
         now = datetime.now()
-
-        checked_paths = set()
         for dir_path in self.dir_paths:
-            for entry in self._list_filesystem_entries(dir_path):
-                checked_paths.add(entry.path)
-                deadline = entry.last_data_modification + self.files_lifetime
-
-                old_entry = self._fs_entries.get(entry.path)
-                if old_entry is None:
-                    self._fs_entries[entry.path] = entry
-                    self._notify(logging.DEBUG, f"[FOUND] {entry.path} -> will be deleted at {deadline}")
-                # don't check the size because last_data_modification changes too
-                elif old_entry.last_data_modification != entry.last_data_modification:
-                    self._fs_entries[entry.path] = entry
-                    self._notify(logging.DEBUG, f"[MODIFIED] {entry.path} -> will be deleted at {deadline}")
-
-                if now > deadline:
-                    del self._fs_entries[entry.path]
-                    deletable_entries.append(entry)
-
-        deleted_entries = []
-        for path in self._fs_entries.keys():
-            if path not in checked_paths:
-                deleted_entries.append(path)
-                self._notify(logging.DEBUG, f"[DELETED BY USER] {path}")
-
-        for deleted_entry in deleted_entries:
-            del self._fs_entries[deleted_entry]
+            self._update_directory_tree(dir_path)
+        return self._pop_deletable_entries(now)
 
-        return deletable_entries
+    def _remove_entries(self, deletable_entries: List[FileMetadata]) -> None:
+        """
+        Remove the given filesystem entries. Entries which can't be removed
+        are ignored from now on.
+
+        :param deletable_entries: entries as returned by _check_for_deletable_entries
+        """
+        for deletable_entry in deletable_entries:
+            try:
+                if os.path.isdir(deletable_entry.path) and not os.path.islink(deletable_entry.path):
+                    os.rmdir(deletable_entry.path)
+                else:
+                    os.remove(deletable_entry.path)
+
+                self._notify(logging.INFO, f"[REMOVED] {deletable_entry.path} (Size: {deletable_entry.size} bytes)")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self._notify(logging.WARNING, f"entry could not be removed: {e}")
+                # don't try again if the entry can't be removed
+                self._ignored_entries.add(deletable_entry.path)
+                continue
+            self._forget_removed_entry(deletable_entry.path)
 
     def run(self, interval: Optional[int]) -> None:
         """
@@ -225,21 +350,7 @@ class StorageAgent:
             raise ValueError("interval must not be negative or zero" " but is {interval}.")
 
         while True:
-            for deletable_entry in self._check_for_deletable_entries():
-                try:
-                    if os.path.isdir(deletable_entry.path):
-                        os.rmdir(deletable_entry.path)
-                    else:
-                        os.remove(deletable_entry.path)
-
-                    self._notify(logging.INFO, f"[REMOVED] {deletable_entry.path} (Size: {deletable_entry.size} bytes)")
-                except FileNotFoundError:
-                    pass
-                except OSError as e:
-                    self._notify(logging.WARNING, f"entry could not be removed: {e}")
-                    # don't try again if the entry can't be removed
-                    self._ignored_entries.add(deletable_entry.path)
-
+            self._remove_entries(self._check_for_deletable_entries())
             time.sleep(float(interval))
 
 
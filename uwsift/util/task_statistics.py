@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Timing and failure bookkeeping for the background task queue.
+
+Tasks are grouped into *categories* by replacing the UUIDs in their keys, so
+e.g. all ``<uuid>_retile`` tasks end up in one latency distribution.
+"""
+import json
+import logging
+import re
+import threading
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from time import monotonic, time
+from typing import Dict, List, Optional
+
+LOG = logging.getLogger(__name__)
+
+UUID_PATTERN = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+
+# number of finished tasks and queue depth samples kept for the statistics
+MAX_RECORDS = 5000
+
+
+def task_category(key: str) -> str:
+    """Get the category of a task key, i.e. the key with any UUID replaced by ``<uuid>``."""
+    return UUID_PATTERN.sub("<uuid>", str(key))
+
+
+@dataclass
+class TaskRecord:
+    """Timing of one task, all times are seconds of the monotonic clock."""
+
+    key: str
+    priority: int
+    enqueued: float
+    started: Optional[float] = None
+    ended: Optional[float] = None
+    stages: Dict[str, float] = field(default_factory=dict)  # {activity: total duration}, summed over the yields
+    ok: Optional[bool] = None
+    cancelled: bool = False
+    _last_yield: Optional[float] = field(default=None, repr=False)
+
+    @property
+    def category(self) -> str:
+        return task_category(self.key)
+
+    @property
+    def wait_time(self) -> Optional[float]:
+        return None if self.started is None else self.started - self.enqueued
+
+    @property
+    def run_time(self) -> Optional[float]:
+        return None if self.started is None or self.ended is None else self.ended - self.started
+
+
+def _distribution(values: List[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def _percentile(fraction):
+        return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": _percentile(0.5),
+        "p95": _percentile(0.95),
+        "max": values[-1],
+    }
+
+
+class TaskStatistics:
+    """Collect per task timing, queue depth over time and failure counts.
+
+    The ``task_*`` methods are called by the TaskQueue and its workers from
+    different threads.
+    """
+
+    def __init__(self, max_records: int = MAX_RECORDS):
+        self._lock = threading.Lock()
+        self._waiting: Dict[str, TaskRecord] = {}
+        self.finished: deque = deque(maxlen=max_records)
+        self.depth_samples: deque = deque(maxlen=max_records)  # (unix time, number of waiting + running tasks)
+        self.failures: Counter = Counter()  # {key: number of failed runs}
+        self._running = 0
+
+    def _sample_depth(self):
+        self.depth_samples.append((time(), len(self._waiting) + self._running))
+
+    def task_enqueued(self, key: str, priority: int):
+        with self._lock:
+            self._waiting[key] = TaskRecord(key, int(priority), monotonic())
+            self._sample_depth()
+
+    def task_started(self, key: str) -> TaskRecord:
+        with self._lock:
+            record = self._waiting.pop(key, None) or TaskRecord(key, -1, monotonic())
+            record.started = record._last_yield = monotonic()
+            self._running += 1
+            self._sample_depth()
+        return record
+
+    def task_progressed(self, record: TaskRecord, activity: str):
+        """Add the time since the previous yield of the task to the total of the stage it just reported."""
+        now = monotonic()
+        record.stages[activity] = record.stages.get(activity, 0.0) + now - (record._last_yield or now)
+        record._last_yield = now
+
+    def task_finished(self, record: TaskRecord, ok: bool, cancelled: bool = False):
+        record.ended = monotonic()
+        record.ok = ok
+        record.cancelled = cancelled
+        with self._lock:
+            self._running -= 1
+            if not ok:
+                self.failures[record.key] += 1
+            self.finished.append(record)
+            self._sample_depth()
+
+    def summary(self) -> dict:
+        """Get latency distributions (in seconds) and failure counts per task category."""
+        with self._lock:
+            records = list(self.finished)
+            failures = dict(self.failures)
+            waiting = len(self._waiting)
+            running = self._running
+        categories: dict = {}
+        for record in records:
+            cat = categories.setdefault(
+                record.category, {"wait": [], "run": [], "stages": {}, "failed": 0, "cancelled": 0}
+            )
+            cat["wait"].append(record.wait_time)
+            cat["run"].append(record.run_time)
+            cat["failed"] += not record.ok
+            cat["cancelled"] += record.cancelled
+            for activity, duration in record.stages.items():
+                cat["stages"].setdefault(activity, []).append(duration)
+        for cat in categories.values():
+            cat["wait"] = _distribution(cat["wait"])
+            cat["run"] = _distribution(cat["run"])
+            cat["stages"] = {activity: _distribution(durations) for activity, durations in cat["stages"].items()}
+        return {
+            "waiting": waiting,
+            "running": running,
+            "categories": categories,
+            "failures_per_key": failures,
+        }
+
+    def to_json(self, include_records: bool = False) -> str:
+        """Serialize the summary and queue depth samples, optionally with every finished task."""
+        data = self.summary()
+        with self._lock:
+            data["depth_samples"] = list(self.depth_samples)
+            if include_records:
+                data["records"] = [
+                    {k: v for k, v in asdict(record).items() if not k.startswith("_")} for record in self.finished
+                ]
+        return json.dumps(data, indent=1, default=str)
+
+    def dump(self, path: str, include_records: bool = False):
+        with open(path, "w") as json_file:
+            json_file.write(self.to_json(include_records=include_records))
+
+    def log_summary(self, level: int = logging.INFO):
+        summary = self.summary()
+        LOG.log(level, "Task queue: %d waiting, %d running", summary["waiting"], summary["running"])
+        for category, cat in sorted(summary["categories"].items()):
+            wait, run = cat["wait"], cat["run"]
+            if not run["count"]:
+                continue
+            LOG.log(
+                level,
+                "  %s: %d runs (%d failed, %d cancelled), wait p50 %.3fs p95 %.3fs, run p50 %.3fs p95 %.3fs",
+                category,
+                run["count"],
+                cat["failed"],
+                cat["cancelled"],
+                wait["p50"],
+                wait["p95"],
+                run["p50"],
+                run["p95"],
+            )
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Lightweight tracing of SIFT's hot paths.
+
+Spans are recorded as Chrome trace "complete" events with the id of the thread
+they ran in and written as JSON, which can be loaded into ``chrome://tracing``
+or https://ui.perfetto.dev to see where import, retiling, statistics, algebra
+and plotting overlap on the timeline.
+
+Tracing is disabled unless :func:`start_tracing` is called (``--trace`` on the
+command line). While disabled :func:`trace_span` returns a shared no-op
+context manager and :func:`traced` generators are returned unwrapped, so the
+instrumented code pays a single global lookup per call.
+"""
+import atexit
+import inspect
+import json
+import logging
+import os
+import threading
+from functools import wraps
+from time import perf_counter_ns
+from typing import Optional
+
+LOG = logging.getLogger(__name__)
+
+
+class Tracer:
+    """Collect trace events of all threads and write them as Chrome trace JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pid = os.getpid()
+        self._start_ns = perf_counter_ns()
+        self._lock = threading.Lock()
+        self._events: list = []
+        self._thread_names: dict = {}
+
+    def timestamp(self) -> int:
+        return perf_counter_ns()
+
+    def add_span(self, name: str, start_ns: int, end_ns: int, args: Optional[dict] = None):
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": (start_ns - self._start_ns) / 1000.0,
+            "dur": (end_ns - start_ns) / 1000.0,
+            "pid": self.pid,
+            "tid": thread.ident,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+            self._thread_names.setdefault(thread.ident, thread.name)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in thread_names.items()
+        ]
+        return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+    def write(self, path: Optional[str] = None):
+        path = path or self.path
+        with open(path, "w") as trace_file:
+            json.dump(self.to_dict(), trace_file, default=str)
+        LOG.info(f"Wrote {len(self._events)} trace events to '{path}'")
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start_ns")
+
+    def __init__(self, tracer: Tracer, name: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start_ns = self.tracer.timestamp()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.args["exception"] = exc_type.__name__
+        self.tracer.add_span(self.name, self.start_ns, self.tracer.timestamp(), self.args)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+_TRACER: Optional[Tracer] = None
+
+
+def start_tracing(path: str) -> Tracer:
+    """Enable tracing, the collected spans are written to `path` when SIFT exits."""
+    global _TRACER
+    if _TRACER is None:
+        _TRACER = Tracer(path)
+        atexit.register(stop_tracing)
+        LOG.info(f"Tracing enabled, spans will be written to '{path}'")
+    return _TRACER
+
+
+def stop_tracing():
+    """Disable tracing and write the spans collected so far."""
+    global _TRACER
+    tracer, _TRACER = _TRACER, None
+    if tracer is not None:
+        tracer.write()
+
+
+def is_tracing() -> bool:
+    return _TRACER is not None
+
+
+def trace_span(name: str, **args):
+    """Context manager recording the time spent in its block as span `name`.
+
+    Keyword arguments are attached to the span and shown in the trace viewer.
+    """
+    tracer = _TRACER
+    if tracer is None:
+        return _NULL_SPAN
+    return _Span(tracer, name, args)
+
+
+def _traced_generator(name: str, gen):
+    with trace_span(name):
+        return (yield from gen)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator recording every call of the function as a span.
+
+    For generator functions (e.g. tasks of the TaskQueue) the span covers the
+    whole iteration of the generator, including a cancellation by ``close()``.
+    The span name defaults to the qualified name of the function.
+    """
+
+    def _decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.isgeneratorfunction(func):
+
+            @wraps(func)
+            def _generator_wrapper(*args, **kwargs):
+                gen = func(*args, **kwargs)
+                if _TRACER is None:
+                    return gen
+                return _traced_generator(span_name, gen)
+
+            return _generator_wrapper
+
+        @wraps(func)
+        def _wrapper(*args, **kwargs):
+            if _TRACER is None:
+                return func(*args, **kwargs)
+            with trace_span(span_name):
+                return func(*args, **kwargs)
+
+        return _wrapper
+
+    return _decorator
@@ -3,13 +3,16 @@ from __future__ import annotations
 import io
 import logging
 import os
-from fractions import Fraction
+import queue
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
 
 import imageio.v3 as imageio
 import matplotlib as mpl
 import numpy as np
 import numpy.typing as npt
-from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
 from PIL import Image, ImageDraw, ImageFont
 from PyQt5 import QtCore, QtGui, QtWidgets
 
@@ -30,6 +33,29 @@ PYAV_ANIMATION_PARAMS = {
     "plugin": "pyav",
     "in_pixel_format": "rgba",
 }
+# frames rendered but not yet encoded, bounds the memory needed by the export
+MAX_PENDING_FRAMES = 2
+# rendered colorbars kept for reuse by later frames and exports
+MAX_CACHED_COLORBARS = 32
+
+
+class ColorbarInputs(NamedTuple):
+    """Everything a colorbar image is rendered from, resolved from the layer model."""
+
+    mode: str
+    colors: np.ndarray
+    climits: tuple[float, float]
+    tick_labels: tuple[str, ...]
+    size: tuple[int, int]
+    dpi: float
+
+
+class FrameDecoration(NamedTuple):
+    """The colorbar and footer added to a rendered frame."""
+
+    colorbar: None | ColorbarInputs
+    banner_text: None | str
+    font_size: int
 
 
 def is_gif_filename(fn):
@@ -211,6 +237,9 @@ class ExportImageHelper(QtCore.QObject):
         self.sgm = sgm
         self.model = model
         self._screenshot_dialog = None
+        # used by the GUI thread and the AnimationWriter
+        self._colorbar_cache: OrderedDict = OrderedDict()
+        self._colorbar_cache_lock = threading.Lock()
 
     def take_screenshot(self):
         if not self._screenshot_dialog:
@@ -235,66 +264,100 @@ class ExportImageHelper(QtCore.QObject):
         new_im.paste(im, (0, 0, orig_w, orig_h))
         return new_im
 
-    def _create_colorbar(self, mode, u, size):
-        mpl.rcParams["font.sans-serif"] = FONT
-        mpl.rcParams.update({"font.size": TICK_SIZE})
-
-        colormap = self.model.get_dataset_presentation_by_uuid(u).colormap
-        colors = COLORMAP_MANAGER[colormap]
+    def _colorbar_inputs(self, mode, u, size) -> None | ColorbarInputs:
+        """Resolve the colorbar of the layer `u` for a frame of `size` from the layer model.
 
-        if colormap == "Square Root (Vis Default)":
+        None is returned when no colorbar is to be drawn for the layer.
+        """
+        if mode is None:
+            return None
+        presentation = self.model.get_dataset_presentation_by_uuid(u)
+        if not presentation or COLORMAP_MANAGER.get(presentation.colormap) is None:
+            return None
+        colors = COLORMAP_MANAGER[presentation.colormap]
+        if presentation.colormap == "Square Root (Vis Default)":
             colors = colors.map(np.linspace((0, 0, 0, 1), (1, 1, 1, 1), 256))
         else:
             colors = colors.colors.rgba
 
-        dpi = self.sgm.main_canvas.dpi
-        if mode == "vertical":
-            fig = plt.figure(figsize=(size[0] / dpi * 0.1, size[1] / dpi * 1.2), dpi=dpi)
+        vmin, vmax = presentation.climits
+        unit_conversion = self.model.get_dataset_by_uuid(u).info.get(Info.UNIT_CONVERSION)
+        tick_labels = tuple(str(unit_conversion[2](unit_conversion[1](t))) for t in np.linspace(vmin, vmax, NUM_TICKS))
+        return ColorbarInputs(
+            mode, np.asarray(colors), (vmin, vmax), tick_labels, tuple(size), self.sgm.main_canvas.dpi
+        )
+
+    def _create_colorbar(self, colorbar: ColorbarInputs):
+        # no pyplot figures, which are bound to the GUI backend, and no changes of the global rcParams: colorbars are
+        # created in the export thread
+        size, dpi = colorbar.size, colorbar.dpi
+        if colorbar.mode == "vertical":
+            fig = Figure(figsize=(size[0] / dpi * 0.1, size[1] / dpi * 1.2), dpi=dpi)
             ax = fig.add_axes([0.3, 0.05, 0.2, 0.9])
         else:
-            fig = plt.figure(figsize=(size[0] / dpi * 1.2, size[1] / dpi * 0.1), dpi=dpi)
+            fig = Figure(figsize=(size[0] / dpi * 1.2, size[1] / dpi * 0.1), dpi=dpi)
             ax = fig.add_axes([0.05, 0.4, 0.9, 0.2])
 
-        cmap = mpl.colors.ListedColormap(colors)
-        vmin, vmax = self.model.get_dataset_presentation_by_uuid(u).climits
+        cmap = mpl.colors.ListedColormap(colorbar.colors)
+        vmin, vmax = colorbar.climits
         norm = mpl.colors.Normalize(vmin=vmin, vmax=vmax)
-        cbar = mpl.colorbar.ColorbarBase(ax, cmap=cmap, norm=norm, orientation=mode)
-
-        ticks = [
-            str(
-                self.model.get_dataset_by_uuid(u).info.get(Info.UNIT_CONVERSION)[2](
-                    self.model.get_dataset_by_uuid(u).info.get(Info.UNIT_CONVERSION)[1](t)
-                )
-            )
-            for t in np.linspace(vmin, vmax, NUM_TICKS)
-        ]
+        cbar = mpl.colorbar.ColorbarBase(ax, cmap=cmap, norm=norm, orientation=colorbar.mode)
         cbar.set_ticks(np.linspace(vmin, vmax, NUM_TICKS))
-        cbar.set_ticklabels(ticks)
+        cbar.set_ticklabels(colorbar.tick_labels, fontsize=TICK_SIZE, fontfamily=[FONT, "sans-serif"])
 
         return fig
 
-    def _append_colorbar(self, mode, im, u):
-        if (
-            mode is None
-            or not self.model.get_dataset_presentation_by_uuid(u)
-            or COLORMAP_MANAGER.get(self.model.get_dataset_presentation_by_uuid(u).colormap) is None
-        ):
-            return im
-
-        fig = self._create_colorbar(mode, u, im.size)
-
+    @staticmethod
+    def _colorbar_cache_key(colorbar: ColorbarInputs):
+        # the colors and not the colormap name: a colormap may be edited and saved under its name
+        colors = np.ascontiguousarray(colorbar.colors)
+        return (
+            colors.tobytes(),
+            colors.shape,
+            colorbar.climits,
+            colorbar.tick_labels,
+            colorbar.mode,
+            colorbar.size,
+            colorbar.dpi,
+        )
+
+    def _get_colorbar_image(self, colorbar: ColorbarInputs):
+        """Get the image of `colorbar`.
+
+        Rendering the matplotlib figure takes much longer than the rest of the
+        composition of a frame, so the images are cached: all frames of an
+        animation usually share the colormap colors, color limits and size.
+        """
+        key = self._colorbar_cache_key(colorbar)
+        with self._colorbar_cache_lock:
+            fig_im = self._colorbar_cache.get(key)
+            if fig_im is not None:
+                self._colorbar_cache.move_to_end(key)
+                return fig_im
+
+        fig = self._create_colorbar(colorbar)
         buf = io.BytesIO()
-        fig.savefig(buf, format="png", bbox_inches="tight", dpi=self.sgm.main_canvas.dpi)
-        plt.close(fig)
+        fig.savefig(buf, format="png", bbox_inches="tight", dpi=colorbar.dpi)
         buf.seek(0)
         fig_im = Image.open(buf)
+        fig_im.thumbnail(colorbar.size)
 
-        fig_im.thumbnail(im.size)
+        with self._colorbar_cache_lock:
+            self._colorbar_cache[key] = fig_im
+            if len(self._colorbar_cache) > MAX_CACHED_COLORBARS:
+                self._colorbar_cache.popitem(last=False)
+        return fig_im
+
+    def _append_colorbar(self, im, colorbar: None | ColorbarInputs):
+        if colorbar is None:
+            return im
+
+        fig_im = self._get_colorbar_image(colorbar)
         orig_w, orig_h = im.size
         fig_w, fig_h = fig_im.size
 
         offset = 0
-        if mode == "vertical":
+        if colorbar.mode == "vertical":
             new_im = Image.new(im.mode, (orig_w + fig_w, orig_h))
             for i in [im, fig_im]:
                 new_im.paste(i, (offset, 0))
@@ -344,10 +407,10 @@ class ExportImageHelper(QtCore.QObject):
             return False
         return True
 
-    def _get_animation_parameters(self, info, images):
+    def _get_animation_parameters(self, info, uuids):
         params = {}
         if info["fps"] is None:
-            params["duration"] = self._get_time_lapse_duration(images, info["loop"])
+            params["duration"] = self._get_time_lapse_duration(uuids, info["loop"])
         else:
             params["fps"] = info["fps"]
 
@@ -356,19 +419,20 @@ class ExportImageHelper(QtCore.QObject):
             params["loop"] = 0  # infinite number of loops
             if "fps" in params:
                 # PIL duration in milliseconds
-                params["duration"] = [1.0 / params.pop("fps") * 1000.0] * len(images)
+                params["duration"] = [1.0 / params.pop("fps") * 1000.0] * len(uuids)
         else:
             if "duration" in params:
                 # not gif but were given "Time Lapse", can only have one FPS
                 params["fps"] = 1.0 / params.pop("duration")[0]
             params.update(PYAV_ANIMATION_PARAMS)
-            params["fps"] = Fraction(float(params["fps"])).limit_denominator(65535)
+            # imageio limits the denominator of the frame rate itself and only accepts floats for it
+            params["fps"] = float(params["fps"])
         return params
 
-    def _get_time_lapse_duration(self, images, is_loop):
-        if len(images) <= 1:
+    def _get_time_lapse_duration(self, uuids, is_loop):
+        if len(uuids) <= 1:
             return [1.0]  # arbitrary single frame duration
-        t = [self.model.get_dataset_by_uuid(u).info.get(Info.SCHED_TIME) for u, im in images]
+        t = [self.model.get_dataset_by_uuid(u).info.get(Info.SCHED_TIME) for u in uuids]
         t_diff = [max(1, (t[i] - t[i - 1]).total_seconds()) for i in range(1, len(t))]
         min_diff = float(min(t_diff))
         # imageio seems to be using duration in seconds
@@ -408,64 +472,140 @@ class ExportImageHelper(QtCore.QObject):
         if any(os.path.isfile(fn) for fn in filenames) and not self._overwrite_dialog():
             return
 
-        # get canvas screenshot arrays (numpy arrays of canvas pixels)
-        img_arrays = self.sgm.get_screenshot_array(info["frame_range"])
-        if not img_arrays or len(uuids) != len(img_arrays):
-            LOG.error(
-                f"Number of frames: {0 if not img_arrays else len(img_arrays)}"
-                f" does not equal "
-                f"number of UUIDs: {len(uuids)}"
-            )
+        frame_indexes = None if info["frame_range"] is None else list(range(s, e + 1))
+        num_frames = 1 if frame_indexes is None else len(frame_indexes)
+        if len(uuids) != num_frames:
+            LOG.error(f"Number of frames: {num_frames} does not equal number of UUIDs: {len(uuids)}")
             return
 
-        images = [(u, Image.fromarray(x)) for u, x in img_arrays]
-
-        if info["colorbar"] is not None:
-            images = [(u, self._append_colorbar(info["colorbar"], im, u)) for (u, im) in images]
-
-        if info["include_footer"]:
-            banner_text = [
-                self.model.get_dataset_by_uuid(u).info.get(Info.DISPLAY_NAME) if u else "" for u, im in images
-            ]
-            images = [
-                (u, self._add_screenshot_footer(im, bt, font_size=info["font_size"]))
-                for (u, im), bt in zip(images, banner_text)
-            ]
-
         if is_video_filename(filenames[0]):
-            params = self._get_animation_parameters(info, images)
-            if not info["loop"] and is_gif_filename(filenames[0]):
-                # rocking animation
-                # we want frames 0, 1, 2, 3, 2, 1
-                # NOTE: this must be done *after* we get animation properties
-                images = images + images[-2:0:-1]
-
-            filenames = [(filenames[0], images)]
+            self._save_animation(info, uuids, frame_indexes, filenames[0])
         else:
-            params = {}
-            filenames = list(zip(filenames, [[x] for x in images]))
+            self._save_images(info, uuids, frame_indexes, filenames)
 
-        self._write_images(filenames, params)
+    def frame_decoration(self, info, u, img_array) -> FrameDecoration:
+        """Resolve the colorbar and footer selected in the export dialog for the frame of the layer `u`.
 
-    def _write_images(self, filenames, params):
-        for filename, file_images in filenames:
-            images_arrays = _image_to_frame_array(file_images, filename)
+        The layer model must only be used in the GUI thread, the decoration
+        holds plain values and can be passed to the :class:`AnimationWriter`.
+        """
+        size = (img_array.shape[1], img_array.shape[0])
+        banner_text = None
+        if info["include_footer"]:
+            banner_text = self.model.get_dataset_by_uuid(u).info.get(Info.DISPLAY_NAME) if u else ""
+        return FrameDecoration(self._colorbar_inputs(info["colorbar"], u, size), banner_text, info["font_size"])
+
+    def decorate_frame(self, decoration: FrameDecoration, img_array):
+        """Add the colorbar and footer of `decoration` to a rendered frame."""
+        image = self._append_colorbar(Image.fromarray(img_array), decoration.colorbar)
+        if decoration.banner_text is not None:
+            image = self._add_screenshot_footer(image, decoration.banner_text, font_size=decoration.font_size)
+        return image
+
+    def compose_frame(self, info, u, img_array):
+        """Add the colorbar and footer selected in the export dialog to a rendered frame."""
+        return self.decorate_frame(self.frame_decoration(info, u, img_array), img_array)
+
+    def _save_images(self, info, uuids, frame_indexes, filenames):
+        """Write every frame to its own image file as soon as it is rendered."""
+        frames = self.sgm.iter_screenshot_arrays(frame_indexes)
+        for filename, (u, img_array) in zip(filenames, frames):
+            frame = _image_to_frame(self.compose_frame(info, u, img_array), filename)
             try:
-                imageio.imwrite(filename, images_arrays, **params)
+                imageio.imwrite(filename, frame)
             except IOError:
-                msg = "Failed to write to file: {}".format(filename)
-                LOG.error(msg)
+                LOG.error("Failed to write to file: {}".format(filename))
                 raise
 
+    def _save_animation(self, info, uuids, frame_indexes, filename):
+        """Stream the frames into one animation file.
 
-def _image_to_frame_array(file_images: list[Image], filename: str) -> list[npt.NDArray[np.uint8]]:
-    images_arrays = [np.array(image) for _, image in file_images]
+        Frames are rendered one at a time in this (the GUI) thread, composed
+        and encoded by a :class:`AnimationWriter` thread meanwhile. The inputs
+        of the composition are resolved here, so the writer doesn't access
+        the layer model. At most ``MAX_PENDING_FRAMES`` rendered frames wait
+        for the writer.
+        """
+        params = self._get_animation_parameters(info, uuids)
+        if frame_indexes is not None and not info["loop"] and is_gif_filename(filename):
+            # rocking animation
+            # we want frames 0, 1, 2, 3, 2, 1
+            # NOTE: this must be done *after* we get animation properties
+            frame_indexes = frame_indexes + frame_indexes[-2:0:-1]
+            if info["fps"] is not None:
+                # the time lapse durations already cover the rocking frames, constant ones don't
+                params["duration"] = params["duration"][:1] * len(frame_indexes)
+
+        writer = AnimationWriter(filename, params, self.decorate_frame)
+        writer.start()
+        try:
+            for u, img_array in self.sgm.iter_screenshot_arrays(frame_indexes):
+                writer.put(self.frame_decoration(info, u, img_array), img_array)
+        finally:
+            writer.finish()
+
+
+class AnimationWriter(threading.Thread):
+    """Compose and encode frames with an incremental imageio writer.
+
+    Frames are passed with :meth:`put`, which blocks while the writer is
+    ``MAX_PENDING_FRAMES`` frames behind, so rendering the next frame overlaps
+    with encoding the previous one but frames don't pile up in memory. An
+    exception raised while writing is re-raised by :meth:`put` or
+    :meth:`finish`.
+
+    ``compose(decoration, frame)`` is called in the writer thread with the
+    arguments passed to :meth:`put` and returns the image to write, so
+    `decoration` should not refer to objects owned by the GUI thread.
+    """
+
+    _DONE = object()
+
+    def __init__(self, filename, params, compose):
+        super().__init__(name="export-animation-writer", daemon=True)
+        self.filename = filename
+        self._params = dict(params)
+        self._plugin = self._params.pop("plugin", None)
+        self._compose = compose
+        self._frames: queue.Queue = queue.Queue(maxsize=MAX_PENDING_FRAMES)
+        self._error: None | BaseException = None
+
+    def put(self, decoration, frame):
+        self._raise_error()
+        self._frames.put((decoration, frame))
+
+    def finish(self):
+        """Wait until all frames are written and the file is closed."""
+        self._frames.put(self._DONE)
+        self.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            LOG.error("Failed to write to file: {}".format(self.filename))
+            raise self._error
+
+    def run(self):
+        try:
+            with imageio.imopen(self.filename, "w", plugin=self._plugin) as animation_file:
+                for decoration, frame in iter(self._frames.get, self._DONE):
+                    image_arr = _image_to_frame(self._compose(decoration, frame), self.filename)
+                    animation_file.write(image_arr, is_batch=False, **self._params)
+        except Exception as err:  # re-raised in the GUI thread
+            self._error = err
+            # keep consuming so that the rendering loop doesn't block
+            for _ in iter(self._frames.get, self._DONE):
+                pass
+
+
+def _image_to_frame(image: Image, filename: str) -> npt.NDArray[np.uint8]:
+    image_arr = np.array(image)
     if not _supports_rgba(filename):
-        images_arrays = [image_arr[:, :, :3] for image_arr in images_arrays]
+        image_arr = image_arr[:, :, :3]
     # make sure frames are divisible by 2 to make ffmpeg happy
     if is_video_filename(filename) and not is_gif_filename(filename):
-        images_arrays = [_array_divisible_by_2(img_array) for img_array in images_arrays]
-    return images_arrays
+        image_arr = _array_divisible_by_2(image_arr)
+    return image_arr
 
 
 def _array_divisible_by_2(img_array: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
@@ -29,6 +29,13 @@ from PyQt5.QtCore import QObject, Qt, pyqtSignal
 from uwsift.common import Info
 from uwsift.model.layer_model import LayerModel
 from uwsift.queue import TASK_DOING, TASK_PROGRESS
+from uwsift.util.tracing import traced
+from uwsift.workspace.statistics import (
+    DensityHistogram,
+    content_histogram,
+    convert_histogram,
+    streaming_min_max,
+)
 
 # Stuff for custom toolbars
 try:
@@ -341,6 +348,9 @@ class ProbeGraphDisplay(object):
     # the default number of bins for the histogram and density scatter plot
     DEFAULT_NUM_BINS = 100
 
+    # the largest neighbourhood of the point probe averaged for a time series plot
+    MAX_TIME_SERIES_RADIUS = 10
+
     def __init__(self, manager, qt_parent, workspace, layer_model: LayerModel, queue, name_str):
         """build the graph tab controls
         :param layer_model:
@@ -355,6 +365,9 @@ class ProbeGraphDisplay(object):
         self.yCheckBox = None
         self.xDropDown = None
         self.yDropDown = None
+        self.timeSeriesCheckBox = None
+        self.timeSeriesRadius = None
+        self.regionSeriesCheckBox = None
 
         # internal objects to reference for info and data
         self.polygon = None
@@ -410,6 +423,27 @@ class ProbeGraphDisplay(object):
         self.yDropDown.setToolTip("The Y layer data to use for plotting.")
         self.yDropDown.activated.connect(self.ySelected)
 
+        # the check box that switches to plotting the X layer over its time steps at the point probe
+        self.timeSeriesCheckBox = QtWidgets.QCheckBox("Time series at point")
+        self.timeSeriesCheckBox.setToolTip("Plot the X layer data at the point probe for all of its time steps.")
+        self.timeSeriesCheckBox.stateChanged.connect(self.timeSeriesChecked)
+
+        # the neighbourhood of the point probe averaged for the time series
+        self.timeSeriesRadius = QtWidgets.QSpinBox(qt_parent)
+        self.timeSeriesRadius.setRange(0, self.MAX_TIME_SERIES_RADIUS)
+        self.timeSeriesRadius.setSuffix(" px")
+        self.timeSeriesRadius.setPrefix("Radius: ")
+        self.timeSeriesRadius.setDisabled(True)
+        self.timeSeriesRadius.setToolTip("Average the valid pixels within this distance of the probed pixel.")
+        self.timeSeriesRadius.valueChanged.connect(self.timeSeriesRadiusChanged)
+
+        # the check box that switches to plotting the statistics of the region over the X layer's time steps
+        self.regionSeriesCheckBox = QtWidgets.QCheckBox("Region statistics over time")
+        self.regionSeriesCheckBox.setToolTip(
+            "Plot the statistics of the X layer data in the region for all time steps."
+        )
+        self.regionSeriesCheckBox.stateChanged.connect(self.regionSeriesChecked)
+
         # set the layout
         # Note: add in a grid is (widget, row#, col#) or (widget, row#, col#, row_span, col_span)
         layout = QtWidgets.QGridLayout()
@@ -419,6 +453,9 @@ class ProbeGraphDisplay(object):
         layout.addWidget(self.xDropDown, 3, 2, 1, 2)
         layout.addWidget(self.yCheckBox, 4, 1)
         layout.addWidget(self.yDropDown, 4, 2, 1, 2)
+        layout.addWidget(self.timeSeriesCheckBox, 5, 1)
+        layout.addWidget(self.timeSeriesRadius, 5, 2, 1, 2)
+        layout.addWidget(self.regionSeriesCheckBox, 6, 1, 1, 3)
         qt_parent.setLayout(layout)
 
     def set_possible_layers(self, do_rebuild_plot=False):
@@ -562,6 +599,37 @@ class ProbeGraphDisplay(object):
         self._stale = True
         self.rebuildPlot()
 
+    def timeSeriesChecked(self):
+        """The time series check box was checked!"""
+        self._timeModeChecked(self.timeSeriesCheckBox, self.regionSeriesCheckBox)
+
+    def regionSeriesChecked(self):
+        """The region statistics over time check box was checked!"""
+        self._timeModeChecked(self.regionSeriesCheckBox, self.timeSeriesCheckBox)
+
+    def _timeModeChecked(self, checkBox, otherCheckBox):
+        # only one of the plots over time can be shown
+        if checkBox.isChecked() and otherCheckBox.isChecked():
+            otherCheckBox.blockSignals(True)
+            otherCheckBox.setChecked(False)
+            otherCheckBox.blockSignals(False)
+
+        # the Y layer isn't used while plotting over time
+        doPlotOverTime = self.timeSeriesCheckBox.isChecked() or self.regionSeriesCheckBox.isChecked()
+        self.timeSeriesRadius.setDisabled(not self.timeSeriesCheckBox.isChecked())
+        self.yCheckBox.setDisabled(doPlotOverTime)
+        self.yDropDown.setDisabled(doPlotOverTime or not self.yCheckBox.isChecked())
+
+        # regenerate the plot
+        self._stale = True
+        self.rebuildPlot()
+
+    def timeSeriesRadiusChanged(self):
+        """The user changed the neighbourhood averaged for the time series."""
+        if self.timeSeriesCheckBox.isChecked():
+            self._stale = True
+            self.rebuildPlot()
+
     def setRegion(self, polygon_points=None, select_full_data=False):
         """Set the region for this graph as polygon selection or full data."""
 
@@ -604,6 +672,25 @@ class ProbeGraphDisplay(object):
             LOG.debug("Plot doesn't need to be rebuilt")
             return
 
+        if self.timeSeriesCheckBox.isChecked():
+            self.queue.add(
+                "%s_time_series_plotting" % (self.xSelectedUUID,),
+                self._time_series_task(self.xSelectedUUID, self.point, self.timeSeriesRadius.value()),
+                "Creating time series plot for point probe",
+                interactive=True,
+            )
+            self._stale = False
+            return
+        if self.regionSeriesCheckBox.isChecked():
+            self.queue.add(
+                "%s_region_series_plotting" % (self.xSelectedUUID,),
+                self._region_series_task(self.xSelectedUUID, self.polygon, self.full_data_selection),
+                "Creating region statistics plot over time",
+                interactive=True,
+            )
+            self._stale = False
+            return
+
         # should be plotting vs Y?
         doPlotVS = self.yCheckBox.isChecked()
         task_name = "%s_%s_region_plotting" % (self.xSelectedUUID, self.ySelectedUUID)
@@ -626,6 +713,7 @@ class ProbeGraphDisplay(object):
         # Assume that the task gets resolved otherwise we might try to draw multiple times
         self._stale = False
 
+    @traced()
     def _rebuild_plot_task(  # noqa: C901
         self, x_layer_uuid, y_layer_uuid, polygon, point_xy, plot_versus=False, plot_full_data=True
     ):
@@ -646,17 +734,33 @@ class ProbeGraphDisplay(object):
         if not plot_versus and have_x_layer and should_plot:
             yield {TASK_DOING: f"Probe Plot: Collecting {data_source_description}...", TASK_PROGRESS: 0.0}
 
-            # get the data and info we need for this plot
+            # get the histogram we need for this plot, in display units
+            x_conv_func = x_layer.info[Info.UNIT_CONVERSION][1]
+            histogram = None
             if x_active_product_dataset:
+                data_polygon = None
                 if plot_full_data:
-                    data_polygon = self.workspace.get_content(x_active_product_dataset.uuid)
+                    # computed when the content was loaded
+                    histogram = self.workspace.get_histogram_for_dataset_by_uuid(x_active_product_dataset.uuid)
+                    if histogram is None:
+                        data_polygon = self.workspace.get_content(x_active_product_dataset.uuid)
                 else:
                     data_polygon = self.workspace.get_content_polygon(x_active_product_dataset.uuid, polygon)
+                if histogram is None:
+                    histogram = content_histogram(data_polygon, num_bins=self.DEFAULT_NUM_BINS)
+                if histogram is not None:
+                    histogram = convert_histogram(histogram, x_conv_func)
+                    if histogram is None:
+                        # the conversion isn't monotonic, bin the data in display units
+                        if data_polygon is None:
+                            data_polygon = self.workspace.get_content(x_active_product_dataset.uuid)
+                        histogram = content_histogram(x_conv_func(data_polygon), num_bins=self.DEFAULT_NUM_BINS)
+            if histogram is None:
+                counts = np.zeros(self.DEFAULT_NUM_BINS, dtype=np.int64)
+                bin_edges = np.linspace(0.0, 1.0, self.DEFAULT_NUM_BINS + 1)
             else:
-                data_polygon = np.array([])
+                counts, bin_edges = histogram
 
-            x_conv_func = x_layer.info[Info.UNIT_CONVERSION][1]
-            data_polygon = x_conv_func(data_polygon)
             time = x_active_product_dataset.info[Info.DISPLAY_TIME]
             title = f"{time}"
             x_axis_label = x_layer.descriptor
@@ -671,7 +775,7 @@ class ProbeGraphDisplay(object):
 
             # plot a histogram
             yield {TASK_DOING: "Probe Plot: Creating histogram plot", TASK_PROGRESS: 0.25}
-            self.plotHistogram(data_polygon, title, x_point, x_axis_label, y_axis_label)
+            self.plotHistogram(counts, bin_edges, title, x_point, x_axis_label, y_axis_label)
 
         # if we are plotting x vs y and have x, y, and a polygon
         elif plot_versus and have_x_layer and have_y_layer and should_plot:
@@ -684,47 +788,29 @@ class ProbeGraphDisplay(object):
                 y_point = None
                 time1 = None
                 time2 = None
-                data1 = np.array([0])
-                data2 = np.array([0])
+                density = DensityHistogram((0.0, 0.0), (0.0, 0.0), self.DEFAULT_NUM_BINS)
             else:
                 # get the data and info we need for this plot
                 x_info = x_active_product_dataset.info
                 y_info = y_active_product_dataset.info
                 time1 = x_info[Info.DISPLAY_TIME]
                 time2 = y_info[Info.DISPLAY_TIME]
-                hires_uuid = self.workspace.lowest_resolution_uuid(x_uuid, y_uuid)
-                # hires_coord_mask are the lat/lon coordinates of each of the
-                # pixels in hires_data. The coordinates are (lat, lon) to resemble
-                # the (Y, X) indexing of numpy arrays
-                if plot_full_data:
-                    hires_coord_mask = None
-                    hires_data = self.workspace.get_content(hires_uuid)
-                else:
-                    hires_coord_mask, hires_data = self.workspace.get_coordinate_mask_polygon(hires_uuid, polygon)
-
                 x_conv_func = x_layer.info[Info.UNIT_CONVERSION][1]
                 y_conv_func = y_layer.info[Info.UNIT_CONVERSION][1]
-                yield {
-                    TASK_DOING: f"Probe Plot: Collecting {data_source_description} (layer 2)...",
-                    TASK_PROGRESS: 0.15,
-                }
-                if hires_uuid == x_uuid:
-                    # the hires data was from the X UUID
-                    data1 = x_conv_func(hires_data)
-                    if plot_full_data:
-                        data2 = self.workspace.get_content(y_uuid)
-                    else:
-                        data2 = self.workspace.get_content_coordinate_mask(y_uuid, hires_coord_mask)
-                    data2 = y_conv_func(data2)
+                if plot_full_data and not self._cover_same_area(x_info, y_info):
+                    LOG.warning(f"Can't plot the full data of {name1} vs {name2}: they don't cover the same area")
+                    data1 = data2 = x_range = y_range = None
+                elif plot_full_data:
+                    # the contents are binned block by block, only their value ranges are needed up front
+                    data1 = self.workspace.get_content(x_uuid)
+                    data2 = self.workspace.get_content(y_uuid)
+                    x_range = self.workspace.get_min_max_value_for_dataset_by_uuid(x_uuid)
+                    y_range = self.workspace.get_min_max_value_for_dataset_by_uuid(y_uuid)
                 else:
-                    # the hires data was from the Y UUID
-                    data2 = y_conv_func(hires_data)
-                    if plot_full_data:
-                        data1 = self.workspace.get_content(x_uuid)
-                    else:
-                        data1 = self.workspace.get_content_coordinate_mask(x_uuid, hires_coord_mask)
-                    data1 = x_conv_func(data1)
-                yield {TASK_DOING: "Probe Plot: Creating scatter plot...", TASK_PROGRESS: 0.25}
+                    data1, data2 = self._get_polygon_data_pair(x_uuid, y_uuid, polygon)
+                    x_range = streaming_min_max(data1)
+                    y_range = streaming_min_max(data2)
+                yield {TASK_DOING: "Probe Plot: Binning scatter plot data...", TASK_PROGRESS: 0.25}
 
                 if point_xy:
                     x_point = self.workspace.get_content_point(x_uuid, point_xy)
@@ -735,12 +821,18 @@ class ProbeGraphDisplay(object):
                     x_point = None
                     y_point = None
 
-                # plot a scatter plot
-                good_mask = ~(np.isnan(data1) | np.isnan(data2))
-                data1 = data1[good_mask]
-                data2 = data2[good_mask]
+                if None in (x_range, y_range) or None in (*x_range, *y_range):
+                    density = DensityHistogram((0.0, 0.0), (0.0, 0.0), self.DEFAULT_NUM_BINS)
+                else:
+                    # the unit conversions are linear, the converted ranges include all converted values
+                    density = DensityHistogram(
+                        x_conv_func(np.asarray(x_range, dtype=np.float64)),
+                        y_conv_func(np.asarray(y_range, dtype=np.float64)),
+                        self.DEFAULT_NUM_BINS,
+                    )
+                    density.update(data1, data2, x_conv_func, y_conv_func)
 
-            self.plotDensityScatterplot(data1, name1, time1, data2, name2, time2, x_point, y_point)
+            self.plotDensityScatterplot(density, name1, time1, name2, time2, x_point, y_point)
 
         # if we have some combination of selections we don't understand, clear the figure
         else:
@@ -751,14 +843,126 @@ class ProbeGraphDisplay(object):
         self.manager.drawChildGraph.emit(self.myName)
         yield {TASK_DOING: "Probe Plot: Done", TASK_PROGRESS: 1.0}
 
+    @traced()
+    def _time_series_task(self, x_layer_uuid, point_xy, radius=0):
+        x_layer = self.layer_model.get_layer_by_uuid(x_layer_uuid)
+        if x_layer is None or point_xy is None or not x_layer.timeline:
+            yield {TASK_DOING: "Probe Plot: Clearing plot figure...", TASK_PROGRESS: 0.0}
+            self.clearPlot()
+        else:
+            yield {TASK_DOING: "Probe Plot: Collecting time series at point...", TASK_PROGRESS: 0.0}
+            # all time steps are probed in one go, those sharing a grid compute the index once
+            times = list(x_layer.timeline.keys())
+            product_datasets = list(x_layer.timeline.values())
+            values = self.workspace.get_content_time_series(
+                [product_dataset.uuid for product_dataset in product_datasets], point_xy, radius
+            )
+            values = x_layer.info[Info.UNIT_CONVERSION][1](values)
+            active_product_dataset = x_layer.get_first_active_product_dataset()
+            current_time = next(
+                (time for time, pds in zip(times, product_datasets) if pds is active_product_dataset), None
+            )
+
+            yield {TASK_DOING: "Probe Plot: Creating time series plot", TASK_PROGRESS: 0.5}
+            title = f"{point_xy[0]:.3f}, {point_xy[1]:.3f}" + (f" (radius {radius} px)" if radius else "")
+            self.plotTimeSeries(times, values, title, current_time, x_layer.descriptor)
+
+        yield {TASK_DOING: "Probe Plot: Drawing plot...", TASK_PROGRESS: 0.95}
+        self.manager.drawChildGraph.emit(self.myName)
+        yield {TASK_DOING: "Probe Plot: Done", TASK_PROGRESS: 1.0}
+
+    @traced()
+    def _region_series_task(self, x_layer_uuid, polygon, plot_full_data=True):
+        x_layer = self.layer_model.get_layer_by_uuid(x_layer_uuid)
+        if x_layer is None or (polygon is None and not plot_full_data) or not x_layer.timeline:
+            yield {TASK_DOING: "Probe Plot: Clearing plot figure...", TASK_PROGRESS: 0.0}
+            self.clearPlot()
+        else:
+            data_source_description = "full data" if plot_full_data else "polygon data"
+            yield {TASK_DOING: f"Probe Plot: Computing {data_source_description} statistics...", TASK_PROGRESS: 0.0}
+            times = list(x_layer.timeline.keys())
+            product_datasets = list(x_layer.timeline.values())
+            categories = self._categories_of(x_layer)
+            # the polygon is rasterized once per grid, the time steps are computed in parallel
+            series = self.workspace.get_region_statistics_time_series(
+                [product_dataset.uuid for product_dataset in product_datasets],
+                None if plot_full_data else polygon,
+                categories,
+            )
+            if categories is None:
+                # the unit conversions are linear, the spread scales like the values
+                conv_func = x_layer.info[Info.UNIT_CONVERSION][1]
+                offset = conv_func(np.float64(0.0))
+                series = {
+                    name: values if name == "count" else conv_func(values) - (offset if name == "std" else 0.0)
+                    for name, values in series.items()
+                }
+
+            yield {TASK_DOING: "Probe Plot: Creating region statistics plot", TASK_PROGRESS: 0.75}
+            active_product_dataset = x_layer.get_first_active_product_dataset()
+            current_time = next(
+                (time for time, pds in zip(times, product_datasets) if pds is active_product_dataset), None
+            )
+            title = "Full data" if plot_full_data else f"Region {self.myName}"
+            self.plotRegionSeries(times, series, categories, title, current_time, x_layer.descriptor)
+
+        yield {TASK_DOING: "Probe Plot: Drawing plot...", TASK_PROGRESS: 0.95}
+        self.manager.drawChildGraph.emit(self.myName)
+        yield {TASK_DOING: "Probe Plot: Done", TASK_PROGRESS: 1.0}
+
+    def _categories_of(self, layer):
+        """Get the (value, meaning) pairs of categorical layer data from the statistics of a loaded time step."""
+        for product_dataset in layer.timeline.values():
+            stats = self.workspace.get_statistics_for_dataset_by_uuid(product_dataset.uuid)
+            if stats:
+                if "header" not in stats:
+                    return None
+                return [(row[0], row[1]) for row in stats["stats"]]
+        return None
+
+    def _get_polygon_data_pair(self, x_uuid, y_uuid, polygon):
+        """Get the values of both datasets for the pixels of the finer one within the polygon."""
+        hires_uuid = self.workspace.lowest_resolution_uuid(x_uuid, y_uuid)
+        # hires_coord_mask are the lat/lon coordinates of each of the
+        # pixels in hires_data. The coordinates are (lat, lon) to resemble
+        # the (Y, X) indexing of numpy arrays
+        hires_coord_mask, hires_data = self.workspace.get_coordinate_mask_polygon(hires_uuid, polygon)
+        if hires_uuid == x_uuid:
+            # the hires data was from the X UUID
+            return hires_data, self.workspace.get_content_coordinate_mask(y_uuid, hires_coord_mask)
+        # the hires data was from the Y UUID
+        return self.workspace.get_content_coordinate_mask(x_uuid, hires_coord_mask), hires_data
+
+    @staticmethod
+    def _cover_same_area(x_info, y_info) -> bool:
+        """Check whether the contents of both datasets can be paired pixel by pixel (maybe after scaling)."""
+        if x_info[Info.PROJ] != y_info[Info.PROJ]:
+            return False
+        x_rows, x_cols = x_info[Info.SHAPE][:2]
+        y_rows, y_cols = y_info[Info.SHAPE][:2]
+        x_extent = (
+            x_info[Info.ORIGIN_X],
+            x_info[Info.ORIGIN_Y],
+            x_info[Info.CELL_WIDTH] * x_cols,
+            x_info[Info.CELL_HEIGHT] * x_rows,
+        )
+        y_extent = (
+            y_info[Info.ORIGIN_X],
+            y_info[Info.ORIGIN_Y],
+            y_info[Info.CELL_WIDTH] * y_cols,
+            y_info[Info.CELL_HEIGHT] * y_rows,
+        )
+        return bool(np.allclose(x_extent, y_extent, rtol=1e-6))
+
     def _draw(self):
         self.canvas.draw()
 
-    def plotHistogram(self, data, title, x_point, x_label, y_label, numBins=100):
-        """Make a histogram using the given data and label it with the given title"""
+    def plotHistogram(self, counts, bin_edges, title, x_point, x_label, y_label):
+        """Make a histogram of the already counted data and label it with the given title"""
         self.figure.clf()
         axes = self.figure.add_subplot(111)
-        bars = axes.hist(data[~np.isnan(data)], bins=self.DEFAULT_NUM_BINS)
+        # one weighted value per bin, matplotlib doesn't need to see the data itself
+        bars = axes.hist(bin_edges[:-1], bins=bin_edges, weights=counts)
         if x_point is not None:
             # go through each rectangle object and make the one that contains x_point 'red'
             # default color is blue so red should stand out
@@ -770,8 +974,44 @@ class ProbeGraphDisplay(object):
         axes.set_xlabel(x_label)
         axes.set_ylabel(y_label)
 
-    def plotDensityScatterplot(self, dataX, nameX, timeX, dataY, nameY, timeY, pointX, pointY):
-        """Make a density scatter plot for the given data
+    def plotTimeSeries(self, times, values, title, current_time, y_label):
+        """Plot the values probed for every time step, marking the currently displayed time step"""
+        self.figure.clf()
+        axes = self.figure.add_subplot(111)
+        # gaps where the point is outside of the data or the data is invalid
+        axes.plot(times, values, marker="o", markersize=4)
+        if current_time is not None:
+            axes.axvline(current_time, color="red", linestyle="--")
+        axes.set_title(title)
+        axes.set_xlabel("Time")
+        axes.set_ylabel(y_label)
+        self.figure.autofmt_xdate()
+
+    def plotRegionSeries(self, times, series, categories, title, current_time, y_label):
+        """Plot the statistics of a region for every time step, marking the currently displayed time step"""
+        self.figure.clf()
+        axes = self.figure.add_subplot(111)
+        if categories is None:
+            mean, std = series["mean"], series["std"]
+            axes.fill_between(times, series["min"], series["max"], alpha=0.15, label="min - max")
+            axes.fill_between(times, mean - std, mean + std, alpha=0.3, label="mean \u00b1 std")
+            axes.plot(times, mean, marker="o", markersize=4, label="mean")
+            axes.set_ylabel(y_label)
+        else:
+            for value, meaning in categories:
+                label = f"{value}" if meaning == "n/a" else f"{value}: {meaning}"
+                axes.plot(times, series[value], marker="o", markersize=4, label=label)
+            axes.set_ylabel(f"{y_label} fraction / %")
+        if current_time is not None:
+            axes.axvline(current_time, color="red", linestyle="--")
+        axes.legend(fontsize="small")
+        axes.set_title(title)
+        axes.set_xlabel("Time")
+        self.figure.autofmt_xdate()
+
+    def plotDensityScatterplot(self, density, nameX, timeX, nameY, timeY, pointX, pointY):
+        """Make a density scatter plot of the already binned data
+        :param density: DensityHistogram of the X and Y data
         :param timeX:
         :param timeY:
         """
@@ -780,18 +1020,12 @@ class ProbeGraphDisplay(object):
         self.figure.clf()
         axes = self.figure.add_subplot(111)
 
-        # figure out the range of the data
-        # you might not be comparing the same units
-        xmin_value = np.min(dataX)
-        xmax_value = np.max(dataX)
-        ymin_value = np.min(dataY)
-        ymax_value = np.max(dataY)
-        # bounds should be defined in the form [[xmin, xmax], [ymin, ymax]]
-        bounds = [[xmin_value, xmax_value], [ymin_value, ymax_value]]
-
-        # make the binned density map for this data set
-        density_map, _, _ = np.histogram2d(dataX, dataY, bins=self.DEFAULT_NUM_BINS, range=bounds)
+        # the range of the data, you might not be comparing the same units
+        xmin_value, xmax_value = density.x_range
+        ymin_value, ymax_value = density.y_range
+
         # mask out zero counts; flip because y goes the opposite direction in an imshow graph
+        density_map = density.counts
         density_map = np.flipud(np.transpose(np.ma.masked_array(density_map, mask=density_map == 0)))
 
         # display the density map data
@@ -800,7 +1034,8 @@ class ProbeGraphDisplay(object):
             extent=[xmin_value, xmax_value, ymin_value, ymax_value],
             aspect="auto",
             interpolation="nearest",
-            norm=LogNorm(),
+            # a log scale needs at least one count
+            norm=LogNorm() if density_map.count() else None,
         )
         if pointX is not None:
             axes.set_autoscale_on(False)
@@ -22,11 +22,11 @@ import logging
 import os
 from enum import Enum
 from numbers import Number
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Generator, Iterable, Optional
 from uuid import UUID
 
 import numpy as np
-from PyQt5.QtCore import QObject, Qt, pyqtSignal
+from PyQt5.QtCore import QCoreApplication, QObject, Qt, pyqtSignal
 from PyQt5.QtGui import QCursor
 from pyresample import AreaDefinition
 from vispy import app, scene
@@ -57,8 +57,9 @@ from uwsift.model.layer_item import LayerItem
 from uwsift.model.layer_model import LayerModel
 from uwsift.model.product_dataset import ProductDataset
 from uwsift.model.time_manager import TimeManager
-from uwsift.queue import TASK_DOING, TASK_PROGRESS
+from uwsift.queue import TASK_DOING, TASK_PROGRESS, TaskPriority
 from uwsift.util import get_package_data_dir
+from uwsift.util.tracing import traced
 from uwsift.view.cameras import PanZoomProbeCamera
 from uwsift.view.probes import DEFAULT_POINT_PROBE
 from uwsift.view.transform import PROJ4Transform
@@ -85,6 +86,9 @@ DEFAULT_STATES_SHAPE_FILE = os.path.join(
     DATA_DIR, "ne_50m_admin_1_states_provinces_lakes", "ne_50m_admin_1_states_provinces_lakes.shp"
 )
 DEFAULT_TEXTURE_SHAPE = (4, 16)
+# number of datasets following a visible one in its layer's timeline which are assessed (and possibly retiled)
+# on view changes in addition to the visible ones, hidden datasets are only assessed once they become visible
+RETILE_READAHEAD = int(config.get("display.retile_readahead", 2))
 
 
 class CustomImage(Image):
@@ -269,6 +273,7 @@ class SceneGraphManager(QObject):
     # FIXME: many more undocumented member variables
 
     didRetilingCalcs = pyqtSignal(object, object, object, object, object, object)
+    didRetilingCancel = pyqtSignal(object, object)
     newPointProbe = pyqtSignal(str, tuple)
     # REMARK: PyQT tends to fail if a signal with an argument of type 'list' is
     # passed an empty list or the 'None' object. By declaring the signal as
@@ -288,6 +293,7 @@ class SceneGraphManager(QObject):
     ):
         super(SceneGraphManager, self).__init__(parent)
         self.didRetilingCalcs.connect(self._set_retiled)
+        self.didRetilingCancel.connect(self._set_retiling_cancelled)
 
         # Parent should be the Qt widget that this GLCanvas belongs to
         self.document = doc  # Document object we work with
@@ -300,6 +306,9 @@ class SceneGraphManager(QObject):
 
         self.layer_nodes: dict = {}  # {layer_uuid: layer_node}
         self.dataset_nodes: dict = {}  # {dataset_uuid: dataset_node}
+        self.dataset_layers: dict = {}  # {dataset_uuid: layer}
+        self._stale_dataset_uuids: set = set()  # datasets not assessed since the last view change
+        self._prefetching_uuids: set = set()  # datasets with a retile queued as prefetch task
         self.latlon_grid_node: Optional[Line] = None
         self.borders_nodes: list = []
 
@@ -324,6 +333,33 @@ class SceneGraphManager(QObject):
         self._setup_initial_canvas(center)
         self.pending_polygon = PendingPolygon(self.main_map)
 
+    def connect_to_model(self, layer_model):
+        """Keep the scene graph in sync with the layers and datasets of `layer_model`."""
+        layer_model.didCreateLayer.connect(self.add_node_for_layer)
+        layer_model.didAddImageDataset.connect(self.add_node_for_image_dataset)
+        layer_model.didAddLinesDataset.connect(self.add_node_for_lines_dataset)
+        layer_model.didAddMCImageDataset.connect(self.add_node_for_mc_image_dataset)
+        layer_model.didAddPointsDataset.connect(self.add_node_for_points_dataset)
+
+        layer_model.didAddSystemLayer.connect(self.add_node_for_system_generated_data)
+
+        layer_model.didReorderLayers.connect(self.update_layers_z)
+
+        layer_model.didChangeLayerVisible.connect(self.change_layer_visible)
+        layer_model.didChangeLayerOpacity.connect(self.change_layer_opacity)
+
+        layer_model.didChangeColormap.connect(self.change_dataset_nodes_colormap)
+        layer_model.didChangeGamma.connect(self.change_dataset_nodes_gamma)
+        layer_model.didChangeColorLimits.connect(self.change_dataset_nodes_color_limits)
+
+        self.animation_controller.connect_to_model(layer_model)
+        layer_model.didActivateProductDataset.connect(self.change_dataset_visible)
+        layer_model.didAddCompositeDataset.connect(self.add_node_for_composite_dataset)
+        layer_model.didChangeCompositeProductDataset.connect(self.change_node_for_composite_dataset)
+        layer_model.willDeleteProductDataset.connect(self.purge_dataset)
+
+        layer_model.willRemoveLayer.connect(self.remove_layer_node)
+
     def get_screenshot_array(
         self, frame_range: None | tuple[int, int] = None
     ) -> list[tuple[str | UUID, npt.NDArray[np.uint8]]]:
@@ -337,6 +373,27 @@ class SceneGraphManager(QObject):
                 If not specified or ``None`` the current frame's data is
                 returned.
 
+        """
+        frame_indexes = None if frame_range is None else range(frame_range[0], frame_range[1] + 1)
+        return list(self.iter_screenshot_arrays(frame_indexes))
+
+    def iter_screenshot_arrays(
+        self, frame_indexes: None | Iterable[int] = None, offscreen: bool = False
+    ) -> Generator[tuple[str | UUID, npt.NDArray[np.uint8]], None, None]:
+        """Render the frames one after the other and yield their canvas pixels.
+
+        Only the frame currently rendered is held, so exporting long animations
+        doesn't need memory for all of them. A frame index may occur multiple
+        times (e.g. for a rocking animation). The frame shown before is
+        restored when the generator is exhausted or closed.
+
+        Args:
+            frame_indexes: 0-based indexes of the frames in the order to
+                render them. If ``None`` the current frame is rendered.
+            offscreen: Render into a framebuffer object instead of reading
+                the canvas' window, needed for canvases without a window
+                (e.g. of the EGL backend).
+
         """
         # Store current index to reset the view once we are done
         # Or use it as the frame to screenshot if no frame range is specified
@@ -344,26 +401,59 @@ class SceneGraphManager(QObject):
         current_uuid = self.animation_controller.get_current_frame_uuid()
         if not current_frame and not current_uuid:
             # no data loaded
-            self.main_canvas.on_draw(None)
-            return [("", _screenshot())]
-        if frame_range is None:
+            yield "", self._render_screenshot(offscreen)
+            return
+        if frame_indexes is None:
             # screenshot the current view
-            s = e = current_frame
-        else:
-            s, e = frame_range
+            frame_indexes = [current_frame]
 
-        images = []
-        for i in range(s, e + 1):
-            self.animation_controller.jump(i)
+        try:
+            for i in frame_indexes:
+                self.animation_controller.jump(i)
+                self._update()
+                self._tile_shown_datasets()
+                u = self.animation_controller.get_current_frame_uuid()
+                yield u, self._render_screenshot(offscreen)
+        finally:
+            self.animation_controller.jump(current_frame)
             self._update()
             self.main_canvas.on_draw(None)
-            u = self.animation_controller.get_current_frame_uuid()
-            images.append((u, _screenshot()))
 
-        self.animation_controller.jump(current_frame)
-        self._update()
+    def _tile_shown_datasets(self):
+        """Retile the shown datasets in this thread, so that a screenshot shows all of their tiles.
+
+        The retile of a dataset outside of the readahead is only queued when
+        it becomes visible, it wouldn't be done yet when the frame is rendered
+        right after jumping to it. A queued or running retile of a shown
+        dataset is withdrawn first, it would race with this one on the tiles
+        and the texture atlas.
+        """
+        shown_nodes = {
+            uuid: dataset_node
+            for uuid, dataset_node in self.dataset_nodes.items()
+            if hasattr(dataset_node, "assess") and self._is_dataset_node_shown(dataset_node)
+        }
+        for uuid in shown_nodes:
+            self.queue.withdraw(str(uuid) + "_retile")
+        # apply the results of the withdrawn retiles before assessing what is still missing
+        QCoreApplication.sendPostedEvents(self)
+        for uuid, dataset_node in shown_nodes.items():
+            self._stale_dataset_uuids.discard(uuid)
+            need_retile, preferred_stride, tile_box = dataset_node.assess()
+            if need_retile:
+                # the signals of the retile are delivered directly in this thread
+                for _ in self._retile_child(uuid, preferred_stride, tile_box):
+                    pass
+
+    def _render_screenshot(self, offscreen: bool) -> npt.NDArray[np.uint8]:
+        # a single draw would upload only one budget of pending texture tiles
+        for dataset_node in self.dataset_nodes.values():
+            if hasattr(dataset_node, "flush_pending_tiles"):
+                dataset_node.flush_pending_tiles()
+        if offscreen:
+            return self.main_canvas.render()
         self.main_canvas.on_draw(None)
-        return images
+        return _screenshot()
 
     def _setup_initial_canvas(self, center=None):
         self.main_canvas = SIFTMainMapCanvas(parent=self.parent())
@@ -646,8 +736,10 @@ class SceneGraphManager(QObject):
 
         self._current_tool = name
 
-        # Set the cursor
-        if name == Tool.PAN_ZOOM:
+        # Set the cursor, offscreen canvases (e.g. for batch rendering) don't have one
+        if not hasattr(self.main_canvas.native, "setCursor"):
+            pass
+        elif name == Tool.PAN_ZOOM:
             self.main_canvas.native.setCursor(QCursor(Qt.OpenHandCursor))
         elif name == Tool.POINT_PROBE:
             self.main_canvas.native.setCursor(QCursor(Qt.PointingHandCursor))
@@ -731,7 +823,12 @@ class SceneGraphManager(QObject):
             self._set_gamma(gamma, uuid)
 
     def change_layer_visible(self, layer_uuid: UUID, visible: bool):
-        self.layer_nodes[layer_uuid].visible = visible
+        layer_node = self.layer_nodes[layer_uuid]
+        layer_node.visible = visible
+        if visible:
+            self._assess_stale_datasets(
+                uuid for uuid, node in self.dataset_nodes.items() if node.parent is layer_node and node.visible
+            )
 
     def change_layer_opacity(self, layer_uuid: UUID, opacity: float):
         # According to
@@ -748,6 +845,8 @@ class SceneGraphManager(QObject):
 
     def change_dataset_visible(self, dataset_uuid: UUID, visible: bool):
         self.dataset_nodes[dataset_uuid].visible = visible
+        if visible:
+            self._assess_stale_datasets([dataset_uuid])
 
     @staticmethod
     def _overwrite_with_test_pattern(data):
@@ -988,6 +1087,7 @@ class SceneGraphManager(QObject):
                 translate=(product_dataset.info[Info.ORIGIN_X], product_dataset.info[Info.ORIGIN_Y], 0),
             )
         self.dataset_nodes[product_dataset.uuid] = image
+        self.dataset_layers[product_dataset.uuid] = layer
         # Make sure *all* applicable properties of the owning layer's current
         # presentation are applied to the new image node
         self.apply_presentation_to_image_node(image, layer.presentation)
@@ -1059,6 +1159,7 @@ class SceneGraphManager(QObject):
                 translate=(product_dataset.info[Info.ORIGIN_X], product_dataset.info[Info.ORIGIN_Y], 0),
             )
         self.dataset_nodes[product_dataset.uuid] = image
+        self.dataset_layers[product_dataset.uuid] = layer
         self.on_view_change(None)
         LOG.debug("Scene Graph after MC IMAGE dataset insertion:")
         LOG.debug(self.main_view.describe_tree(with_transform=True))
@@ -1127,6 +1228,7 @@ class SceneGraphManager(QObject):
             )
         self.composite_element_dependencies[product_dataset.uuid] = product_dataset.input_datasets_uuids
         self.dataset_nodes[product_dataset.uuid] = composite
+        self.dataset_layers[product_dataset.uuid] = layer
         self.on_view_change(None)
         LOG.debug("Scene Graph after COMPOSITE dataset insertion:")
         LOG.debug(self.main_view.describe_tree(with_transform=True))
@@ -1145,6 +1247,8 @@ class SceneGraphManager(QObject):
         lines.name = str(product_dataset.uuid)
 
         self.dataset_nodes[product_dataset.uuid] = lines
+
+        self.dataset_layers[product_dataset.uuid] = layer
         self.on_view_change(None)
         LOG.debug("Scene Graph after LINES dataset insertion:")
         LOG.debug(self.main_view.describe_tree(with_transform=True))
@@ -1171,6 +1275,8 @@ class SceneGraphManager(QObject):
         points.name = str(product_dataset.uuid)
 
         self.dataset_nodes[product_dataset.uuid] = points
+
+        self.dataset_layers[product_dataset.uuid] = layer
         self.on_view_change(None)
         LOG.debug("Scene Graph after POINTS dataset insertion:")
         LOG.debug(self.main_view.describe_tree(with_transform=True))
@@ -1301,6 +1407,9 @@ class SceneGraphManager(QObject):
             dataset = self.dataset_nodes[uuid_removed]
             dataset.parent = None
             del self.dataset_nodes[uuid_removed]
+            self.dataset_layers.pop(uuid_removed, None)
+            self._stale_dataset_uuids.discard(uuid_removed)
+            self._prefetching_uuids.discard(uuid_removed)
             LOG.info(f"dataset {uuid_removed} purge from Scene Graph")
         else:
             LOG.debug(f"dataset {uuid_removed} already purged from Scene Graph")
@@ -1331,52 +1440,83 @@ class SceneGraphManager(QObject):
             return
         dataset_node.visible = not dataset_node.visible if visible is None else visible
 
+    def _is_dataset_node_shown(self, dataset_node) -> bool:
+        return dataset_node.visible and (dataset_node.parent is None or dataset_node.parent.visible)
+
+    def _readahead_dataset_uuids(self, uuid: UUID) -> list:
+        """Get the datasets following the given one in its layer's timeline, wrapping around like the animation."""
+        layer = self.dataset_layers.get(uuid)
+        if layer is None or RETILE_READAHEAD <= 0:
+            return []
+        timeline_uuids = layer.get_datasets_uuids()
+        if uuid not in timeline_uuids:
+            return []
+        idx = timeline_uuids.index(uuid)
+        count = min(RETILE_READAHEAD, len(timeline_uuids) - 1)
+        return [timeline_uuids[(idx + offset) % len(timeline_uuids)] for offset in range(1, count + 1)]
+
+    def _assess(self, uuid: UUID, prefetch: bool = False):
+        self._stale_dataset_uuids.discard(uuid)
+        need_retile, preferred_stride, tile_box = self.dataset_nodes[uuid].assess()
+        if need_retile:
+            self._start_retiling_task(uuid, preferred_stride, tile_box, prefetch=prefetch)
+
+    def _assess_stale_datasets(self, uuids):
+        """Assess the given datasets and their readahead if they missed a view change while hidden."""
+        for uuid in uuids:
+            if uuid in self._prefetching_uuids and uuid in self.dataset_nodes:
+                # shown now, the user is waiting for the prefetched retile
+                self._assess(uuid)
+            for candidate in [uuid] + self._readahead_dataset_uuids(uuid):
+                if candidate in self._stale_dataset_uuids and candidate in self.dataset_nodes:
+                    self._assess(candidate, prefetch=candidate != uuid)
+
     def on_view_change(self, scheduler):
-        """Simple event handler for when we need to reassess image datasets."""
+        """Simple event handler for when we need to reassess image datasets.
+
+        Only shown datasets and their readahead are assessed, all others are
+        marked stale and assessed when they become visible.
+        """
         # Stop the timer so it doesn't continuously call this slot
         if scheduler:
             scheduler.stop()
 
-        def _assess(uuid, child):
-            need_retile, preferred_stride, tile_box = child.assess()
-            if need_retile:
-                self._start_retiling_task(uuid, preferred_stride, tile_box)
-
-        current_datasets_uuids = self.dataset_nodes.keys()
+        assessable = {uuid: node for uuid, node in self.dataset_nodes.items() if hasattr(node, "assess")}
+        shown = {uuid for uuid, dataset_node in assessable.items() if self._is_dataset_node_shown(dataset_node)}
+        readahead = {ahead for uuid in shown for ahead in self._readahead_dataset_uuids(uuid)} - shown
 
-        def _assess_if_active(uuid):
-            dataset_node = self.dataset_nodes.get(uuid, None)
-            if dataset_node is not None and hasattr(dataset_node, "assess"):
-                _assess(uuid, dataset_node)
-
-        # update all available datasets nodes
-        for uuid in current_datasets_uuids:
-            _assess_if_active(uuid)
+        for uuid in assessable:
+            if uuid in shown or uuid in readahead:
+                self._assess(uuid, prefetch=uuid in readahead)
+            else:
+                self._stale_dataset_uuids.add(uuid)
 
-    def _start_retiling_task(self, uuid, preferred_stride, tile_box):
+    def _start_retiling_task(self, uuid, preferred_stride, tile_box, prefetch=False):
+        """Queue the retile of the dataset, as a prefetch task if it isn't shown yet (readahead)."""
         LOG.debug("Scheduling retile for child with UUID: %s", uuid)
+        if prefetch:
+            self._prefetching_uuids.add(uuid)
+        else:
+            self._prefetching_uuids.discard(uuid)
         self.queue.add(
             str(uuid) + "_retile",
             self._retile_child(uuid, preferred_stride, tile_box),
             "Retile calculations for image dataset" + str(uuid),
-            interactive=True,
+            priority=TaskPriority.PREFETCH if prefetch else TaskPriority.INTERACTIVE,
         )
 
+    @traced()
     def _retile_child(self, uuid, preferred_stride, tile_box):
         LOG.debug("Retiling child with UUID: '%s'", uuid)
         yield {TASK_DOING: "Re-tiling", TASK_PROGRESS: 0.0}
+        child = self.dataset_nodes[uuid]
         if uuid not in self.composite_element_dependencies:
             kind = self.document[uuid].get(Info.KIND)
-            child = self.dataset_nodes[uuid]
             data = self.workspace.get_content(uuid, lod=preferred_stride, kind=kind)
             yield {TASK_DOING: "Re-tiling", TASK_PROGRESS: 0.5}
             # FIXME: Use LOD instead of stride and provide the lod to the workspace
             data = data[:: preferred_stride[0], :: preferred_stride[1]]
-            tiles_info, vertices, tex_coords = child.retile(data, preferred_stride, tile_box)
-            yield {TASK_DOING: "Re-tiling", TASK_PROGRESS: 1.0}
-            self.didRetilingCalcs.emit(uuid, preferred_stride, tile_box, tiles_info, vertices, tex_coords)
         else:
-            child = self.dataset_nodes[uuid]
             data = [
                 self.workspace.get_content(d_uuid, lod=preferred_stride)
                 for d_uuid in self.composite_element_dependencies[uuid]
@@ -1387,13 +1527,27 @@ class SceneGraphManager(QObject):
                 d[:: int(preferred_stride[0] / factor), :: int(preferred_stride[1] / factor)] if d is not None else None
                 for factor, d in zip(child._channel_factors, data)
             ]
-            tiles_info, vertices, tex_coords = child.retile(data, preferred_stride, tile_box)
-            yield {TASK_DOING: "Re-tiling", TASK_PROGRESS: 1.0}
-            self.didRetilingCalcs.emit(uuid, preferred_stride, tile_box, tiles_info, vertices, tex_coords)
+
+        # Yield after every tile so the task queue can cancel this retile when a newer one for
+        # the same dataset comes in. The tiles prepared so far are still valid and are kept.
+        num_tiles = max(1, (tile_box.bottom - tile_box.top) * (tile_box.right - tile_box.left))
+        tiles_info: list = []
+        try:
+            for tile_info in child.iter_texture_tiles(data, preferred_stride, tile_box):
+                tiles_info.append(tile_info)
+                yield {TASK_DOING: "Re-tiling", TASK_PROGRESS: 0.5 + 0.5 * len(tiles_info) / num_tiles}
+        except GeneratorExit:
+            LOG.debug("Retiling of child with UUID '%s' superseded, keeping %d tiles", uuid, len(tiles_info))
+            self.didRetilingCancel.emit(uuid, tiles_info)
+            raise
+        vertices, tex_coords = child._build_vertex_tiles(preferred_stride, tile_box)
+        yield {TASK_DOING: "Re-tiling", TASK_PROGRESS: 1.0}
+        self.didRetilingCalcs.emit(uuid, preferred_stride, tile_box, tiles_info, vertices, tex_coords)
         self.workspace.bgnd_task_complete()  # FUTURE: consider a threading context manager for this??
 
     def _set_retiled(self, uuid, preferred_stride, tile_box, tiles_info, vertices, tex_coords):
         """Slot to take data from background thread and apply it to the dataset living in the image dataset."""
+        self._prefetching_uuids.discard(uuid)
         child = self.dataset_nodes.get(uuid, None)
         if child is None:
             LOG.warning("unable to find uuid %s in dataset_nodes" % uuid)
@@ -1401,6 +1555,13 @@ class SceneGraphManager(QObject):
         child.set_retiled(preferred_stride, tile_box, tiles_info, vertices, tex_coords)
         child.update()
 
+    def _set_retiling_cancelled(self, uuid, tiles_info):
+        """Slot to upload the texture tiles an aborted retile already registered in the dataset's texture."""
+        child = self.dataset_nodes.get(uuid, None)
+        if child is None:
+            return
+        child.set_retile_aborted(tiles_info)
+
 
 # TODO move these defaults to common config defaults location
 LATLON_GRID_RESOLUTION_MIN: float = 0.1
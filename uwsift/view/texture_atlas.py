@@ -103,6 +103,56 @@ class TextureAtlas2D(GPUScaledTexture2D):
             data[:, -5:] = 1000.0
         super(TextureAtlas2D, self).scale_and_set_data(data, offset=offset, copy=copy)
 
+    def _tile_runs(self, tile_indexes):
+        """Split sorted tile indexes in to runs of neighbouring tiles in the same atlas row."""
+        run = []
+        for tile_idx in tile_indexes:
+            if run and (tile_idx != run[-1] + 1 or tile_idx % self.texture_shape[1] == 0):
+                yield run
+                run = []
+            run.append(tile_idx)
+        if run:
+            yield run
+
+    def _stage_tile(self, staging, col, data):
+        """Copy one tile of data in to the upload buffer of its run, NaN filling anything the data does not cover."""
+        tile_h, tile_w = self.tile_shape[:2]
+        dst = staging[:, col * tile_w : (col + 1) * tile_w]
+        if data is None:
+            dst[:] = np.nan
+            return
+        rows, cols = min(tile_h, data.shape[0]), min(tile_w, data.shape[1])
+        if rows < tile_h or cols < tile_w:
+            dst[:] = np.nan
+        dst[:rows, :cols] = data[:rows, :cols]
+        if DEBUG_IMAGE_TILE:
+            dst[:5, :] = 1000.0
+            dst[-5:, :] = 1000.0
+            dst[:, :5] = 1000.0
+            dst[:, -5:] = 1000.0
+
+    def set_tiles_data(self, tiles):
+        """Write multiple tiles of data into the texture.
+
+        Tiles that land next to each other in the same row of the atlas are
+        copied in to one buffer and sent to the GPU with a single upload
+        instead of one upload per tile. vispy keeps the buffer until the next
+        draw, so every run gets its own and it is passed without copying.
+
+        Args:
+            tiles: sequence of ``(tile_idx, data)`` pairs, ``data`` may be
+                ``None`` to fill the tile with NaNs. Later entries for the same
+                tile index win.
+        """
+        tiles_by_idx = dict(tiles)
+        tile_h, tile_w = self.tile_shape[:2]
+        for run in self._tile_runs(sorted(tiles_by_idx)):
+            run_shape = (tile_h, tile_w * len(run)) + tuple(self.tile_shape[2:])
+            staging = np.empty(run_shape, dtype=np.float32)
+            for col, tile_idx in enumerate(run):
+                self._stage_tile(staging, col, tiles_by_idx[tile_idx])
+            super(TextureAtlas2D, self).scale_and_set_data(staging, offset=self._tex_offset(run[0]), copy=False)
+
 
 class MultiChannelGPUScaledTexture2D:
     """Wrapper class around individual textures.
@@ -241,3 +291,9 @@ class MultiChannelTextureAtlas2D(MultiChannelGPUScaledTexture2D):
     def set_tile_data(self, tile_idx, data_arrays, copy=False):
         for idx, data in enumerate(data_arrays):
             self._textures[idx].set_tile_data(tile_idx, data, copy=copy)
+
+    def set_tiles_data(self, tiles):
+        """Write multiple tiles into every channel, see :meth:`TextureAtlas2D.set_tiles_data`."""
+        tiles = list(tiles)
+        for idx, texture in enumerate(self._textures):
+            texture.set_tiles_data((tile_idx, data_arrays[idx]) for tile_idx, data_arrays in tiles)
@@ -20,6 +20,7 @@ REQUIRES
 """
 
 import logging
+from collections import OrderedDict, deque
 from datetime import datetime
 from typing import Optional
 
@@ -35,8 +36,15 @@ from vispy.visuals import ImageVisual, IsocurveVisual, LineVisual
 from vispy.visuals.line.arrow import ArrowVisual, _ArrowHeadVisual
 from vispy.visuals.line.line import _AggLineVisual, _GLLineVisual
 from vispy.visuals.shaders import Function, FunctionChain
-from vispy.visuals.transforms import as_vec4
+from vispy.visuals.transforms import (
+    ChainTransform,
+    MatrixTransform,
+    NullTransform,
+    STTransform,
+    as_vec4,
+)
 
+from uwsift import config
 from uwsift.common import (
     DEFAULT_PROJECTION,
     DEFAULT_TEXTURE_HEIGHT,
@@ -50,6 +58,7 @@ from uwsift.common import (
     Resolution,
     ViewBox,
 )
+from uwsift.util.tracing import traced
 from uwsift.view.texture_atlas import (
     MultiChannelGPUScaledTexture2D,
     MultiChannelTextureAtlas2D,
@@ -60,6 +69,7 @@ from uwsift.view.tile_calculator import (
     calc_pixel_size,
     get_reference_points,
 )
+from uwsift.view.transform import PROJ4Transform
 
 __author__ = "rayg"
 __docformat__ = "reStructuredText"
@@ -69,11 +79,71 @@ LOG = logging.getLogger(__name__)
 # then we consider it invalid
 # these values can get large when zoomed way in
 CANVAS_EPSILON = 1e5
+# maximum amount of texture tile data (in bytes) sent to the GPU while preparing one frame,
+# the remaining tiles of a retile are uploaded during the following frames (<= 0: no limit)
+TEXTURE_UPLOAD_BUDGET = int(config.get("display.texture_upload_budget_mb", 32)) * 1024 * 1024
 
 
 # CANVAS_EPSILON = 1e30
 
 
+def transform_state_key(transform):
+    """Get a hashable description of the current state of a (chained) transform.
+
+    Returns ``None`` if the transform contains a type whose state is unknown.
+    """
+    if isinstance(transform, ChainTransform):
+        keys = tuple(transform_state_key(tr) for tr in transform.transforms)
+        return None if None in keys else keys
+    if isinstance(transform, PROJ4Transform):
+        return "proj4", transform.proj4_str, transform._proj4_inverse
+    if isinstance(transform, STTransform):
+        return "st", transform.scale.tobytes(), transform.translate.tobytes()
+    if isinstance(transform, MatrixTransform):
+        return "matrix", transform.matrix.tobytes()
+    if isinstance(transform, NullTransform):
+        return ("null",)
+    return None
+
+
+class ProjectedMeshCache:
+    """LRU cache of image meshes transformed to canvas coordinates.
+
+    Entries are keyed by the image grid and the state of all transforms from
+    the image to the canvas. Datasets on the same grid (e.g. all timesteps of
+    a layer) share one entry, a changed camera or projection results in a new
+    key and old entries expire.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key, image_mesh, transform):
+        """Get the transformed mesh and the mask of its valid points, computing them if needed."""
+        if key is not None and key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        img_cmesh = transform.map(image_mesh)
+        # Mask any points that are really far off screen (can't be transformed)
+        valid_mask = (np.abs(img_cmesh[:, 0]) < CANVAS_EPSILON) & (np.abs(img_cmesh[:, 1]) < CANVAS_EPSILON)
+        # shared between datasets, nobody may modify them
+        img_cmesh.flags.writeable = False
+        valid_mask.flags.writeable = False
+        if key is not None:
+            self._entries[key] = img_cmesh, valid_mask
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return img_cmesh, valid_mask
+
+    def clear(self):
+        self._entries.clear()
+
+
+PROJECTED_MESH_CACHE = ProjectedMeshCache()
+
+
 class ArrayProxy(object):
     def __init__(self, ndim, shape):
         self.ndim = ndim
@@ -218,6 +288,12 @@ class SIFTTiledGeolocatedMixin:
         self._latest_tile_box = None
         self.wrap_lon = wrap_lon
         self._tiles = {}
+        # texture tiles waiting to be uploaded and the vertex data to apply once they are all on the GPU
+        self._pending_tiles: deque = deque()
+        self._pending_vertex_tiles = None
+        # atlas tiles the applied vertex data points to, tiles overwriting them wait for the next vertex data
+        self._bound_tex_tiles: set = set()
+        self._pending_bound_tiles: deque = deque()
         assert shape or data is not None, "`data` or `shape` must be provided"  # nosec B101
         self.shape = shape or data.shape
         self.ndim = len(self.shape) or data.ndim
@@ -243,6 +319,16 @@ class SIFTTiledGeolocatedMixin:
 
     def _build_texture_tiles(self, data, stride, tile_box: IndexBox):
         """Prepare and organize strided data in to individual tiles with associated information."""
+        return list(self.iter_texture_tiles(data, stride, tile_box))
+
+    @traced()
+    def iter_texture_tiles(self, data, stride, tile_box: IndexBox):
+        """Prepare strided data tile by tile, yielding the information of every tile not in the texture yet.
+
+        Every yielded tile is already registered in the texture state, so its
+        information has to reach :meth:`_set_texture_tiles` even if the caller
+        stops iterating early.
+        """
         data = self._normalize_data(data)
 
         LOG.debug(
@@ -251,7 +337,6 @@ class SIFTTiledGeolocatedMixin:
             tile_box,
         )
         # Tiles start at upper-left so go from top to bottom
-        tiles_info = []
         for tiy in range(tile_box.top, tile_box.bottom):
             for tix in range(tile_box.left, tile_box.right):
                 already_in = (stride, tiy, tix) in self.texture_state
@@ -265,9 +350,7 @@ class SIFTTiledGeolocatedMixin:
                 # Assume we were given a total image worth of this stride
                 y_slice, x_slice = self.calc.calc_tile_slice(tiy, tix, stride)
                 tile_data = self._slice_texture_tile(data, y_slice, x_slice)
-                tiles_info.append((stride, tiy, tix, tex_tile_idx, tile_data))
-
-        return tiles_info
+                yield stride, tiy, tix, tex_tile_idx, tile_data
 
     def _slice_texture_tile(self, data, y_slice, x_slice):
         # force a copy of the data from the content array (provided by the workspace)
@@ -280,7 +363,58 @@ class SIFTTiledGeolocatedMixin:
     def _set_texture_tiles(self, tiles_info):
         for tile_info in tiles_info:
             stride, tiy, tix, tex_tile_idx, data = tile_info
-            self._texture.set_tile_data(tex_tile_idx, data)
+            if tex_tile_idx in self._bound_tex_tiles:
+                self._pending_bound_tiles.append((tex_tile_idx, data))
+            else:
+                self._pending_tiles.append((tex_tile_idx, data))
+        self._upload_pending_tiles()
+
+    @staticmethod
+    def _tile_nbytes(data):
+        return data.nbytes if data is not None else 0
+
+    def _upload_pending_tiles(self, flush=False):
+        """Upload queued texture tiles, at most ``TEXTURE_UPLOAD_BUDGET`` bytes per call unless `flush` is set.
+
+        Tiles going to atlas tiles the applied vertex data doesn't point to
+        are uploaded first, spread over several frames. Tiles overwriting atlas
+        tiles which are still drawn are held back and uploaded in the same
+        frame the vertex data of the latest retile is applied, so that the
+        shown vertices never sample the data of other tiles.
+        """
+        batch = []
+        batch_bytes = 0
+        while self._pending_tiles and (
+            flush or not batch or TEXTURE_UPLOAD_BUDGET <= 0 or batch_bytes < TEXTURE_UPLOAD_BUDGET
+        ):
+            tex_tile_idx, data = self._pending_tiles.popleft()
+            batch.append((tex_tile_idx, data))
+            batch_bytes += self._tile_nbytes(data)
+
+        apply_vertices = not self._pending_tiles and self._pending_vertex_tiles is not None
+        if apply_vertices:
+            batch.extend(self._pending_bound_tiles)
+            self._pending_bound_tiles.clear()
+        if batch:
+            self._texture.set_tiles_data(batch)
+
+        if self._pending_tiles:
+            # make sure there is a next frame to continue uploading
+            self.update()
+        elif apply_vertices:
+            vertices, tex_coords, self._bound_tex_tiles = self._pending_vertex_tiles
+            self._set_vertex_tiles(vertices, tex_coords)
+            self._pending_vertex_tiles = None
+
+    def flush_pending_tiles(self):
+        """Upload all queued texture tiles and apply the latest vertex data, e.g. before taking a screenshot."""
+        if self._pending_tiles or self._pending_vertex_tiles is not None:
+            self._upload_pending_tiles(flush=True)
+
+    def _prepare_draw(self, view):
+        if self._pending_tiles or self._pending_vertex_tiles is not None:
+            self._upload_pending_tiles()
+        return super()._prepare_draw(view)
 
     def _build_vertex_tiles(self, preferred_stride, tile_box: IndexBox):
         """Rebuild the vertex buffers used for rendering the image when using
@@ -345,11 +479,19 @@ class SIFTTiledGeolocatedMixin:
         self._subdiv_position.set_data(vertices.astype("float32"))
         self._subdiv_texcoord.set_data(tex_coords.astype("float32"))
 
+    def _get_projected_mesh(self):
+        """Get the image mesh transformed to canvas coordinates and the mask of its valid points."""
+        transform = self.transforms.get_transform()
+        transform_key = transform_state_key(transform)
+        key = None
+        if transform_key is not None:
+            grid_key = (tuple(self.shape), self.origin_x, self.origin_y, self.cell_width, self.cell_height)
+            key = (grid_key, transform_key)
+        return PROJECTED_MESH_CACHE.get(key, self.calc.image_mesh, transform)
+
     def determine_reference_points(self):
         # Image points transformed to canvas coordinates
-        img_cmesh = self.transforms.get_transform().map(self.calc.image_mesh)
-        # Mask any points that are really far off screen (can't be transformed)
-        valid_mask = (np.abs(img_cmesh[:, 0]) < CANVAS_EPSILON) & (np.abs(img_cmesh[:, 1]) < CANVAS_EPSILON)
+        img_cmesh, valid_mask = self._get_projected_mesh()
         # The image mesh projected to canvas coordinates (valid only)
         img_cmesh = img_cmesh[valid_mask]
         # The image mesh of only valid "viewable" projected coordinates
@@ -386,7 +528,7 @@ class SIFTTiledGeolocatedMixin:
             raise ValueError("Image '%s' is not viewable in this projection" % (self.name,))
 
         # Image points transformed to canvas coordinates
-        img_cmesh = self.transforms.get_transform().map(self.calc.image_mesh)
+        img_cmesh, _ = self._get_projected_mesh()
         # The image mesh projected to canvas coordinates (valid only)
         img_cmesh = img_cmesh[self._viewable_mesh_mask]
         # The image mesh of only valid "viewable" projected coordinates
@@ -437,14 +579,24 @@ class SIFTTiledGeolocatedMixin:
         return tiles_info, vertices, tex_coords
 
     def set_retiled(self, preferred_stride, tile_box, tiles_info, vertices, tex_coords):
+        tex_tiles = {
+            self.texture_state[(preferred_stride, tiy, tix)]
+            for tiy in range(tile_box.top, tile_box.bottom)
+            for tix in range(tile_box.left, tile_box.right)
+            if (preferred_stride, tiy, tix) in self.texture_state
+        }
+        self._pending_vertex_tiles = (vertices, tex_coords, tex_tiles)
         self._set_texture_tiles(tiles_info)
-        self._set_vertex_tiles(vertices, tex_coords)
 
         # don't update here, the caller will do that
         # Store the most recent level of detail that we've done
         self._stride = preferred_stride
         self._latest_tile_box = tile_box
 
+    def set_retile_aborted(self, tiles_info):
+        """Upload the texture tiles of a retile that was stopped before its vertex data was built."""
+        self._set_texture_tiles(tiles_info)
+
 
 class TiledGeolocatedImageVisual(SIFTTiledGeolocatedMixin, ImageVisual):
     def __init__(self, data, origin_x, origin_y, cell_width, cell_height, **image_kwargs):
@@ -628,6 +780,10 @@ class SIFTMultiChannelTiledGeolocatedMixin(SIFTTiledGeolocatedMixin):
         # Reset texture state, if we change things to know which texture
         # don't need to be updated then this can be removed/changed
         self.texture_state.reset()
+        self._pending_tiles.clear()
+        self._pending_vertex_tiles = None
+        self._bound_tex_tiles = set()
+        self._pending_bound_tiles.clear()
         self._need_texture_upload = True
         self._need_vertex_update = True
         # Reset the tiling logic to force a retile
@@ -642,6 +798,10 @@ class SIFTMultiChannelTiledGeolocatedMixin(SIFTTiledGeolocatedMixin):
         s = self.calc.calc_stride(view_box, texture=self._lowest_rez)
         return Point(np.int64(s[0] * self._lowest_factor), np.int64(s[1] * self._lowest_factor))
 
+    @staticmethod
+    def _tile_nbytes(data_arrays):
+        return sum(data.nbytes for data in data_arrays if data is not None)
+
     def _slice_texture_tile(self, data_arrays, y_slice, x_slice):
         new_data = []
         for data in data_arrays:
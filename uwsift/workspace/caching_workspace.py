@@ -14,7 +14,7 @@ from uwsift.queue import TASK_DOING, TASK_PROGRESS
 
 from .importer import SatpyImporter, aImporter
 from .metadatabase import Content, ContentImage, Metadatabase, Product, Resource
-from .workspace import ActiveContent, BaseWorkspace, frozendict
+from .workspace import ActiveContent, BaseWorkspace, frozendict, histogram_path
 
 LOG = logging.getLogger(__name__)
 
@@ -219,7 +219,7 @@ class CachingWorkspace(BaseWorkspace):
 
     def _remove_content_files_from_workspace(self, c: Content):
         total = 0
-        for filename in [c.path, c.coverage_path, c.sparsity_path]:
+        for filename in [c.path, c.coverage_path, c.sparsity_path, histogram_path(c) if c.path else None]:
             if not filename:
                 continue
             pn = os.path.join(self.cache_dir, filename)
@@ -235,6 +235,7 @@ class CachingWorkspace(BaseWorkspace):
 
     def _activate_content(self, c: Content) -> ActiveContent:
         self._available[c.id] = zult = ActiveContent(self.cache_dir, c, self.get_info(c.uuid))
+        self._remember_actual_range(c, zult)
         c.touch()
         c.product.touch()
         return zult
@@ -728,14 +729,28 @@ class CachingWorkspace(BaseWorkspace):
     def _deactivate_content_for_product(self, p: Optional[Product]):
         if p is None:
             return
+        self._forget_probe_grid(p.uuid)
         for c in p.content:
             self._available.pop(c.id, None)
 
+    def _content_with_uuid(self, session, uuid: UUID) -> Optional[Content]:
+        prod = self._product_with_uuid(session, uuid)
+        if prod is None:
+            return None
+        return session.query(Content).filter(Content.product_id == prod.id).one()
+
     def _get_active_content_by_uuid(self, uuid: UUID) -> Optional[ActiveContent]:
         with self._inventory as s:
-            prod = self._product_with_uuid(s, uuid)
-            if prod is None:
-                return None
-            content = s.query(Content).filter(Content.product_id == prod.id).one()
+            content = self._content_with_uuid(s, uuid)
+            return None if content is None else self._available.get(content.id)
 
-            return self._available.get(content.id)
+    def _get_content_key_value(self, uuid: UUID, key: str):
+        with self._inventory as s:
+            content = self._content_with_uuid(s, uuid)
+            return None if content is None else content.info.get(key)
+
+    def _update_content_key_values(self, uuid: UUID, key_values: dict):
+        with self._inventory as s:
+            content = self._content_with_uuid(s, uuid)
+            if content is not None:
+                content.update(key_values, only_keyvalues=True)
@@ -46,6 +46,7 @@ from uwsift.model.area_definitions_manager import AreaDefinitionsManager
 from uwsift.satpy_compat import DataID, get_id_items, get_id_value, id_from_attrs
 from uwsift.util import USER_CACHE_DIR
 from uwsift.util.common import get_reader_kwargs_dict
+from uwsift.util.tracing import trace_span, traced
 from uwsift.workspace.guidebook import ABI_AHI_Guidebook
 
 from .metadatabase import (
@@ -1060,6 +1061,7 @@ class SatpyImporter(aImporter):
             Info.GRID_FIRST_INDEX_Y: grid_first_index_y,
         }
 
+    @traced()
     def begin_import_products(self, *product_ids) -> Generator[import_progress, None, None]:  # noqa: C901
         if self.use_inventory_db:
             products = self._get_products_from_inventory_db(product_ids)
@@ -1417,6 +1419,7 @@ class SatpyImporter(aImporter):
             return data_filename, None
 
         data_memmap = np.memmap(data_path, dtype=dtype, shape=data.shape, mode="w+")
-        da.store(data, data_memmap)
+        with trace_span("da.store", product=str(prod.uuid), nbytes=int(data.nbytes)):
+            da.store(data, data_memmap)
 
         return data_filename, data_memmap
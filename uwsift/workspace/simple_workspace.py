@@ -56,6 +56,7 @@ class SimpleWorkspace(BaseWorkspace):
 
     def _activate_content(self, c: Content) -> ActiveContent:
         self._available[c.uuid] = zult = ActiveContent(self.cache_dir, c, self.get_info(c.uuid))
+        self._remember_actual_range(c, zult)
         c.touch()
         c.product.touch()
         self.remove_content_data_from_cache_dir_checked(c.uuid)
@@ -290,6 +291,8 @@ class SimpleWorkspace(BaseWorkspace):
                 self.contents[update.uuid] = update.content
         LOG.debug("received {} updates during import".format(nupd))
         self._clear_product_state_flag(prod.uuid, State.ARRIVING)
+        if merge_target_uuid and merge_target_uuid in self.contents:
+            self._refresh_merged_content(self.contents[merge_target_uuid])
 
         # make an ActiveContent object from the Content, now that we've imported it
         ac = self._overview_content_for_uuid(
@@ -466,8 +469,18 @@ class SimpleWorkspace(BaseWorkspace):
     def _deactivate_content_for_product(self, p: Optional[Product]):
         if p is None:
             return
+        self._forget_probe_grid(p.uuid)
         for c in p.content:
             self._available.pop(c.uuid, None)
 
     def _get_active_content_by_uuid(self, uuid: UUID) -> Optional[ActiveContent]:
         return self._available.get(uuid)
+
+    def _get_content_key_value(self, uuid: UUID, key: str):
+        content = self.contents.get(uuid)
+        return None if content is None else content.info.get(key)
+
+    def _update_content_key_values(self, uuid: UUID, key_values: dict):
+        content = self.contents.get(uuid)
+        if content is not None:
+            content.update(key_values, only_keyvalues=True)
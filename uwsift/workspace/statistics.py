@@ -1,10 +1,24 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import numpy as np
 
+from uwsift.util.tracing import traced
+
 LOG = logging.getLogger(__name__)
 
+# bins of the histogram computed for every content, as shown by the probe histogram plot
+HISTOGRAM_NUM_BINS = 100
+# values counted at once by the streaming histogram, bounds its temporary memory
+HISTOGRAM_CHUNK_SIZE = 1 << 22
+# value pairs counted per task of the 2D density histogram
+DENSITY_CHUNK_SIZE = 1 << 20
+# statistics computed for the region of every time step by the region statistics time series
+REGION_STATISTICS = ("count", "mean", "min", "max", "std")
+
 
+@traced()
 def dataset_statistical_analysis(xarr):
     """Compute and return a dictionary with statistical information about the input dataset.
 
@@ -159,3 +173,278 @@ class CategoricalBasicStats:
         }
 
         return stats_dict
+
+
+class StreamingHistogram:
+    """Count values into fixed, equally wide bins chunk by chunk.
+
+    Unlike ``np.histogram`` (or matplotlib's ``hist``) on a whole array
+    this never needs more temporary memory than for one chunk, so it can
+    count memory mapped content of any size. NaN values are ignored, values
+    are counted like by ``np.histogram``: the last bin includes the upper
+    edge, values outside the range are not counted.
+    """
+
+    def __init__(self, value_range, num_bins=HISTOGRAM_NUM_BINS):
+        low, high = float(value_range[0]), float(value_range[1])
+        if low == high:
+            # like np.histogram
+            low, high = low - 0.5, high + 0.5
+        self.num_bins = num_bins
+        self.edges = np.linspace(low, high, num_bins + 1)
+        self.counts = np.zeros(num_bins, dtype=np.int64)
+
+    def update(self, data, chunk_size=HISTOGRAM_CHUNK_SIZE):
+        flat = np.asarray(data).reshape(-1)
+        for start in range(0, flat.size, chunk_size):
+            self._count(flat[start : start + chunk_size])
+        return self
+
+    def _count(self, values):
+        # with a range np.histogram skips the NaNs and bins uniformly without searching the edges
+        self.counts += np.histogram(values, bins=self.num_bins, range=(self.edges[0], self.edges[-1]))[0]
+
+
+@traced()
+def content_histogram(data, value_range=None, num_bins=HISTOGRAM_NUM_BINS):
+    """Compute the histogram of `data` in `num_bins` bins over `value_range` (default: min/max of the data).
+
+    Returns:
+        counts and bin edges like ``np.histogram`` or None if there are no valid values
+    """
+    if value_range is None:
+        value_range = streaming_min_max(data)
+    if value_range is None or not np.all(np.isfinite(value_range)):
+        return None
+    histogram = StreamingHistogram(value_range, num_bins).update(data)
+    return histogram.counts, histogram.edges
+
+
+def convert_histogram(histogram, conv_func):
+    """Convert the bin edges of a histogram computed by `content_histogram` with a unit conversion.
+
+    A decreasing conversion reverses the order of the bins. Returns None if
+    the conversion isn't monotonic over the bins, the data has to be binned
+    in the converted units then.
+    """
+    counts, edges = histogram
+    edges = np.asarray(conv_func(edges), dtype=np.float64)
+    steps = np.diff(edges)
+    if np.all(steps > 0):
+        return counts, edges
+    if np.all(steps < 0):
+        return counts[::-1], edges[::-1]
+    return None
+
+
+def streaming_min_max(data, chunk_size=HISTOGRAM_CHUNK_SIZE):
+    """Get the minimum and maximum of the valid values of `data` chunk by chunk, None if there are none."""
+    flat = np.asarray(data).reshape(-1)
+    low, high = np.inf, -np.inf
+    for start in range(0, flat.size, chunk_size):
+        chunk = flat[start : start + chunk_size]
+        chunk = chunk[np.isfinite(chunk)]
+        if chunk.size:
+            low, high = min(low, chunk.min()), max(high, chunk.max())
+    return None if low > high else (low, high)
+
+
+_WORKER_POOL = None
+
+
+def _worker_pool() -> ThreadPoolExecutor:
+    global _WORKER_POOL
+    if _WORKER_POOL is None:
+        _WORKER_POOL = ThreadPoolExecutor(thread_name_prefix="statistics")
+    return _WORKER_POOL
+
+
+def _identity(x):
+    return x
+
+
+def _bin_range(value_range):
+    low, high = float(value_range[0]), float(value_range[1])
+    if low == high:
+        # like np.histogram2d
+        low, high = low - 0.5, high + 0.5
+    return low, high
+
+
+class DensityHistogram:
+    """Count pairs of values of two contents into a 2D grid of equally wide bins.
+
+    Both contents are read block by block, converted to the units to plot
+    and counted on a thread pool (numpy releases the GIL for the array
+    operations), so the memory needed doesn't depend on the size of the
+    contents. Pairs with a NaN are ignored, values are binned like by
+    ``np.histogram2d``: the last bin includes the upper edge, values outside
+    of the ranges are not counted.
+
+    The contents are either 1D arrays of the same length (e.g. the pixels
+    within a probed polygon) or 2D arrays covering the same area. If the
+    resolutions differ the coarser content is mapped onto the rows and
+    columns of the finer one by nearest neighbour.
+    """
+
+    def __init__(self, x_range, y_range, num_bins=HISTOGRAM_NUM_BINS):
+        self.num_bins = num_bins
+        self.x_range = _bin_range(x_range)
+        self.y_range = _bin_range(y_range)
+        self.counts = np.zeros((num_bins, num_bins), dtype=np.int64)
+
+    @property
+    def x_edges(self):
+        return np.linspace(*self.x_range, self.num_bins + 1)
+
+    @property
+    def y_edges(self):
+        return np.linspace(*self.y_range, self.num_bins + 1)
+
+    def update(self, x_data, y_data, x_conv=_identity, y_conv=_identity, chunk_size=DENSITY_CHUNK_SIZE):
+        blocks = list(_paired_blocks(x_data, y_data, chunk_size))
+        for counts in _worker_pool().map(lambda block: self._count(*block, x_conv, y_conv), blocks):
+            self.counts += counts
+        return self
+
+    def _count(self, read_x_block, read_y_block, x_conv, y_conv):
+        x = np.asarray(x_conv(read_x_block()), dtype=np.float64).reshape(-1)
+        y = np.asarray(y_conv(read_y_block()), dtype=np.float64).reshape(-1)
+        (x_low, x_high), (y_low, y_high) = self.x_range, self.y_range
+        valid = (x >= x_low) & (x <= x_high) & (y >= y_low) & (y <= y_high)  # also drops NaN
+        x_index = self._bin_index(x[valid], x_low, x_high)
+        y_index = self._bin_index(y[valid], y_low, y_high)
+        counts = np.bincount(x_index * self.num_bins + y_index, minlength=self.num_bins * self.num_bins)
+        return counts.reshape((self.num_bins, self.num_bins))
+
+    def _bin_index(self, values, low, high):
+        index = ((values - low) * (self.num_bins / (high - low))).astype(np.intp)
+        return np.minimum(index, self.num_bins - 1, out=index)
+
+
+def _paired_blocks(x_data, y_data, chunk_size):
+    """Split both contents into corresponding blocks of about `chunk_size` values.
+
+    The blocks are returned as functions reading them, so only the blocks
+    being counted are in memory.
+    """
+    if x_data.ndim == 1:
+        if x_data.shape != y_data.shape:
+            raise ValueError(f"Can't pair the values of contents with the shapes {x_data.shape} and {y_data.shape}")
+        for start in range(0, x_data.size, chunk_size):
+            block = slice(start, start + chunk_size)
+            yield partial(x_data.__getitem__, block), partial(y_data.__getitem__, block)
+        return
+
+    # iterate over the rows of the content with the finer resolution
+    swap = y_data.size > x_data.size
+    fine, coarse = (y_data, x_data) if swap else (x_data, y_data)
+    rows, cols = fine.shape[:2]
+    block_rows = max(1, chunk_size // cols)
+    same_shape = coarse.shape == fine.shape
+    coarse_cols = np.arange(cols) * coarse.shape[1] // cols
+    for start in range(0, rows, block_rows):
+        block = slice(start, min(start + block_rows, rows))
+        fine_block = partial(fine.__getitem__, block)
+        if same_shape:
+            coarse_block = partial(coarse.__getitem__, block)
+        else:
+            coarse_rows = np.arange(block.start, block.stop) * coarse.shape[0] // rows
+            coarse_block = partial(coarse.__getitem__, np.ix_(coarse_rows, coarse_cols))
+        yield (coarse_block, fine_block) if swap else (fine_block, coarse_block)
+
+
+class StreamingStats:
+    """Accumulate the statistics of values chunk by chunk.
+
+    For continuous data these are the count, mean, min, max and standard
+    deviation of the valid (not NaN) values, the chunks are merged with the
+    parallel algorithm of Chan et al. so the standard deviation stays
+    accurate. For categorical data, given as (value, meaning) pairs, the
+    fraction in percent of every category is computed like by
+    :class:`CategoricalBasicStats`.
+    """
+
+    def __init__(self, categories=None):
+        self.categories = None if categories is None else [value for value, _ in categories]
+        self.category_counts = np.zeros(len(self.categories or ()), dtype=np.int64)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, data, chunk_size=HISTOGRAM_CHUNK_SIZE):
+        flat = np.asarray(data).reshape(-1)
+        for start in range(0, flat.size, chunk_size):
+            chunk = flat[start : start + chunk_size]
+            if self.categories is not None:
+                self.category_counts += [np.count_nonzero(chunk == value) for value in self.categories]
+            else:
+                self._add(chunk[np.isfinite(chunk)].astype(np.float64))
+        return self
+
+    def _add(self, values):
+        if not values.size:
+            return
+        count = values.size
+        mean = values.mean()
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += np.square(values - mean).sum() + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+    def get_stats(self) -> dict:
+        """Get the statistics by name (or by category value for categorical data), NaN if there were no values."""
+        if self.categories is not None:
+            total = self.category_counts.sum()
+            fractions = self.category_counts * 100.0 / total if total else np.zeros(len(self.categories))
+            return dict(zip(self.categories, fractions))
+        if not self.count:
+            return {"count": 0, **dict.fromkeys(REGION_STATISTICS[1:], np.nan)}
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "std": np.sqrt(self.m2 / self.count),
+        }
+
+
+def region_statistics(content, index_mask=None, categories=None) -> dict:
+    """Compute the statistics of the pixels of `content` selected by `index_mask` (default: all).
+
+    See :class:`StreamingStats` for the statistics computed.
+    """
+    values = content if index_mask is None else content[index_mask]
+    return StreamingStats(categories).update(values).get_stats()
+
+
+@traced()
+def region_statistics_series(regions, categories=None) -> dict:
+    """Compute the statistics of many regions, e.g. of the same polygon in all time steps of a layer.
+
+    The regions are (content, index_mask) pairs as taken by
+    :func:`region_statistics` or None where there is nothing to compute.
+    Every region is read and computed by a task of a thread pool, numpy
+    releases the GIL while doing so.
+
+    Returns:
+        every statistic (or category value) with an array of its value for every region, NaN where there was None
+    """
+    regions = list(regions)
+    futures = [
+        None if region is None else _worker_pool().submit(region_statistics, *region, categories=categories)
+        for region in regions
+    ]
+    names = REGION_STATISTICS if categories is None else [value for value, _ in categories]
+    series = {name: np.full(len(regions), np.nan) for name in names}
+    for idx, future in enumerate(futures):
+        if future is None:
+            continue
+        for name, value in future.result().items():
+            series[name][idx] = value
+    return series
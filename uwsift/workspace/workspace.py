@@ -43,7 +43,8 @@ from abc import abstractmethod
 from collections import defaultdict
 from collections.abc import Mapping as ReadOnlyMapping
 from datetime import timedelta
-from typing import Dict, Generator, Mapping, Optional, Tuple
+from functools import lru_cache, partial
+from typing import Dict, Generator, List, Mapping, NamedTuple, Optional, Tuple
 from uuid import UUID
 from uuid import uuid1 as uuidgen
 
@@ -55,9 +56,10 @@ from rasterio import Affine
 from shapely.geometry.polygon import LinearRing
 
 from uwsift.common import FALLBACK_RANGE, Flags, Info, Instrument, Kind, Platform
-from uwsift.model.shapes import content_within_shape
+from uwsift.model.shapes import MaskCache, content_within_shape, polygon_index_mask
 
 from ..util.common import is_same_proj
+from ..util.tracing import traced
 from .importer import SatpyImporter, generate_guidebook_metadata
 from .metadatabase import (
     Content,
@@ -66,7 +68,12 @@ from .metadatabase import (
     ContentUnstructuredPoints,
     Product,
 )
-from .statistics import dataset_statistical_analysis
+from .statistics import (
+    content_histogram,
+    dataset_statistical_analysis,
+    region_statistics_series,
+    streaming_min_max,
+)
 
 LOG = logging.getLogger(__name__)
 
@@ -78,6 +85,137 @@ IMPORT_CLASSES = [SatpyImporter]
 # first instance is main singleton instance; don't preclude the possibility of importing from another workspace later on
 TheWorkspace = None
 
+# content key-value holding the min/max values of the content
+ACTUAL_RANGE_KEY = "actual_range"
+# suffix of the file next to the data of a content holding the counts and bin edges of its full data histogram
+HISTOGRAM_SUFFIX = ".histogram.npz"
+
+
+def histogram_path(c: Content) -> str:
+    """Path of the histogram file of the content, relative to the workspace like the path of its data."""
+    return c.path + HISTOGRAM_SUFFIX
+
+
+@lru_cache(maxsize=64)
+def _proj_for(proj_str: str) -> Proj:
+    """Get the projection object for a PROJ string, shared by all datasets using it."""
+    return Proj(proj_str)
+
+
+class ProbeGrid(NamedTuple):
+    """The geolocation of a dataset's content needed to probe it at a position."""
+
+    proj_str: str
+    origin_x: float
+    origin_y: float
+    cell_width: float
+    cell_height: float
+    rows: int
+    columns: int
+    grid_origin: Optional[str]
+    grid_first_index_x: Optional[int]
+    grid_first_index_y: Optional[int]
+
+    @classmethod
+    def from_info(cls, info) -> "ProbeGrid":
+        rows, columns = info[Info.SHAPE][:2]
+        return cls(
+            info[Info.PROJ],
+            info[Info.ORIGIN_X],
+            info[Info.ORIGIN_Y],
+            info[Info.CELL_WIDTH],
+            info[Info.CELL_HEIGHT],
+            rows,
+            columns,
+            info.get(Info.GRID_ORIGIN),
+            info.get(Info.GRID_FIRST_INDEX_X),
+            info.get(Info.GRID_FIRST_INDEX_Y),
+        )
+
+    @property
+    def proj(self) -> Proj:
+        return _proj_for(self.proj_str)
+
+    @property
+    def is_lonlat(self) -> bool:
+        return "+proj=latlong" in self.proj_str
+
+    @property
+    def affine(self) -> Affine:
+        return Affine(self.cell_width, 0.0, self.origin_x, 0.0, self.cell_height, self.origin_y)
+
+
+def _integer_axis_mapping(source_origin, source_cell, target_origin, target_cell) -> Optional[Tuple[int, int, int]]:
+    """Express one axis of both grids in units of the finer cell size, None if they aren't integer multiples."""
+    if np.sign(source_cell) != np.sign(target_cell):
+        return None
+    unit = source_cell if abs(source_cell) <= abs(target_cell) else target_cell
+    ratios = np.array([source_cell / unit, target_cell / unit, (source_origin - target_origin) / unit])
+    integers = np.round(ratios)
+    if not np.allclose(ratios, integers, rtol=0.0, atol=1e-6):
+        return None
+    source_cells, target_cells, offset = (int(value) for value in integers)
+    return source_cells, target_cells, offset
+
+
+def map_grid_indexes(source: ProbeGrid, target: ProbeGrid, index_mask) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Map the (rows, columns) of pixels of the source grid to the pixels of the target grid containing their centers.
+
+    This only takes integer arithmetic if both grids are in the same
+    projection and their cell sizes and the offset between their origins
+    are integer multiples of the finer cell size, e.g. for the bands of an
+    instrument with different resolutions.
+
+    :return: the (rows, columns) in the target grid, None if the grids
+        can't be mapped like this or a pixel is outside of the target grid
+    """
+    if not is_same_proj(source.proj_str, target.proj_str):
+        return None
+    mappings = (
+        _integer_axis_mapping(source.origin_y, source.cell_height, target.origin_y, target.cell_height),
+        _integer_axis_mapping(source.origin_x, source.cell_width, target.origin_x, target.cell_width),
+    )
+    target_index = []
+    for mapping, index, size in zip(mappings, index_mask, (target.rows, target.columns)):
+        if mapping is None:
+            return None
+        source_cells, target_cells, offset = mapping
+        # the target pixel containing the center (index + 1/2) of the source pixel, in doubled finer cells
+        mapped = (2 * offset + source_cells * (2 * np.asarray(index, dtype=np.int64) + 1)) // (2 * target_cells)
+        if mapped.size and (mapped.min() < 0 or mapped.max() >= size):
+            return None
+        target_index.append(mapped)
+    return target_index[0], target_index[1]
+
+
+class CoordinateMask:
+    """The lon/lat coordinates of pixels of a grid selected by an index mask.
+
+    The coordinates are only computed when they are needed, indexing gives
+    the (lat, lon) arrays corresponding to the (rows, cols) of the index
+    mask. While the grid and the index mask are known, other datasets on a
+    compatible grid can be indexed without projecting the coordinates, see
+    :func:`map_grid_indexes`.
+    """
+
+    def __init__(self, grid: ProbeGrid, index_mask, compute_coords):
+        self.grid = grid
+        self.index_mask = index_mask
+        self._compute_coords = compute_coords
+
+    @property
+    def coords(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self._compute_coords()
+
+    def __getitem__(self, idx):
+        return self.coords[idx]
+
+    def __iter__(self):
+        return iter(self.coords)
+
+    def __len__(self):
+        return 2
+
 
 class frozendict(ReadOnlyMapping):
     def __init__(self, source=None):
@@ -114,6 +252,15 @@ class ActiveContent(QObject):
         else:
             self._attach(C)  # initializes self._data
 
+        # the full data histogram of the probe plots is kept in a file next to the data
+        self._histogram_path = os.path.join(workspace_cwd, histogram_path(C)) if C is not None and C.path else None
+        self.update_statistics(info, reuse_histogram=True)
+
+    def update_statistics(self, info, reuse_histogram=False):
+        """Compute the statistics and the histogram of the data, again when new segments were merged into it.
+
+        With `reuse_histogram` the histogram written by an earlier activation of the content is read instead.
+        """
         # Needed for the calculation of the correct statistics
         # we need a dict not a frozendict so convert it everytime to a dict
         attrs = dict(info)
@@ -125,6 +272,44 @@ class ActiveContent(QObject):
         else:
             self.statistics = {}
 
+        self.histogram = self._read_histogram() if reuse_histogram else None
+        if self.histogram is None:
+            self.histogram = self.compute_histogram()
+            self._write_histogram()
+
+    def _read_histogram(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        if self._histogram_path is None or not os.path.exists(self._histogram_path):
+            return None
+        with np.load(self._histogram_path, allow_pickle=False) as histogram:
+            return histogram["counts"], histogram["edges"]
+
+    def _write_histogram(self):
+        if self._histogram_path is None or self.histogram is None:
+            return
+        counts, edges = self.histogram
+        try:
+            np.savez(self._histogram_path, counts=counts, edges=edges)
+        except OSError as e:
+            LOG.warning(f"Can't write the histogram to {self._histogram_path}: {e}")
+
+    @property
+    def actual_range(self) -> Optional[Tuple]:
+        """The min/max values of continuous data from its statistics, None if there are none (e.g. categorical data)."""
+        stats = self.statistics.get("stats")
+        if not isinstance(stats, dict) or not stats.get("min") or not stats.get("max"):
+            return None
+        return stats["min"][0], stats["max"][0]
+
+    def compute_histogram(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Count the content into bins spanning the min/max values of its statistics.
+
+        None for content without continuous statistics (categorical, multichannel or empty content).
+        """
+        stats = self.statistics.get("stats")
+        if not isinstance(stats, dict) or not stats.get("count") or not stats["count"][0]:
+            return None
+        return content_histogram(self._data, (stats["min"][0], stats["max"][0]))
+
     def _test_init(self):
         data = np.ones((4, 12), dtype=np.float32)
         data = np.cumsum(data, axis=0)
@@ -285,6 +470,13 @@ class BaseWorkspace(QObject):
         self._available: Dict[int, ActiveContent] = {}  # dictionary of {Content.id : ActiveContent object}
         self._importers = IMPORT_CLASSES.copy()
         self._state: defaultdict = defaultdict(Flags)
+        # geolocation and content of the datasets probed by the point probes, see get_content_points
+        self._probe_grids: Dict[UUID, ProbeGrid] = {}
+        self._probe_contents: Dict[UUID, np.ndarray] = {}
+        # min/max values of the datasets, also persisted with their content
+        self._actual_ranges: Dict[UUID, Tuple] = {}
+        # lon/lat coordinates of the pixels of probed regions per (region, grid)
+        self._coordinate_masks = MaskCache()
         global TheWorkspace  # singleton
         if TheWorkspace is None:
             TheWorkspace = self
@@ -516,6 +708,7 @@ class BaseWorkspace(QObject):
 
         return info
 
+    @traced()
     def create_algebraic_composite(self, operations, namespace, info=None):
         if not info:
             info = {}
@@ -585,7 +778,7 @@ class BaseWorkspace(QObject):
 
         actual_range = self.get_min_max_value_for_dataset_by_uuid(info[Info.UUID])
 
-        if actual_range:
+        if actual_range and None not in actual_range:
             return actual_range
 
         return FALLBACK_RANGE
@@ -609,6 +802,7 @@ class BaseWorkspace(QObject):
         :return: True if successfully deleted, False if not found
         """
         uuid = info_or_uuid if isinstance(info_or_uuid, UUID) else info_or_uuid[Info.UUID]
+        self._actual_ranges.pop(uuid, None)
 
         if self._queue is not None:
             self._queue.add(str(uuid), self._bgnd_remove(uuid), "Purge dataset")
@@ -633,49 +827,132 @@ class BaseWorkspace(QObject):
         )
         return affine
 
+    def _remember_actual_range(self, c: Content, active_content: ActiveContent):
+        """Keep the min/max values of a content being activated.
+
+        They are persisted with the key-values of the content, so they are
+        known without computing them again as long as the content stays in the
+        workspace.
+        """
+        actual_range = c.info.get(ACTUAL_RANGE_KEY)
+        if actual_range is None:
+            actual_range = active_content.actual_range
+            if actual_range is None:
+                # computed when needed, see get_min_max_value_for_dataset_by_uuid()
+                return
+            c.update({ACTUAL_RANGE_KEY: actual_range}, only_keyvalues=True)
+        self._actual_ranges[c.uuid] = tuple(actual_range)
+
+    def _refresh_merged_content(self, c: Content):
+        """Determine the statistics and min/max values of content again after new segments were merged into it.
+
+        The data of active content is updated in place by the merge, so it
+        stays active.
+        """
+        self._actual_ranges.pop(c.uuid, None)
+        c.update({ACTUAL_RANGE_KEY: None}, only_keyvalues=True)
+        if c.path and os.path.exists(os.path.join(self.cache_dir, histogram_path(c))):
+            os.remove(os.path.join(self.cache_dir, histogram_path(c)))
+        active_content = self._get_active_content_by_uuid(c.uuid)
+        if active_content is not None:
+            active_content.update_statistics(self.get_info(c.uuid))
+            self._remember_actual_range(c, active_content)
+
+    @staticmethod
+    def _uuid_of(info_or_uuid) -> UUID:
+        if isinstance(info_or_uuid, UUID):
+            return info_or_uuid
+        if isinstance(info_or_uuid, str):
+            return UUID(info_or_uuid)
+        return info_or_uuid[Info.UUID]
+
+    def _probe_grid(self, info_or_uuid) -> Optional[ProbeGrid]:
+        """Get the geolocation of the dataset's content, looked up only once per dataset."""
+        uuid = self._uuid_of(info_or_uuid)
+        grid = self._probe_grids.get(uuid)
+        if grid is None:
+            info = self.get_info(info_or_uuid)
+            if info is None:
+                return None
+            grid = self._probe_grids[uuid] = ProbeGrid.from_info(info)
+        return grid
+
+    def _probe_content(self, uuid: UUID):
+        content = self._probe_contents.get(uuid)
+        if content is None:
+            content = self._probe_contents[uuid] = self.get_content(uuid)
+        return content
+
+    def _forget_probe_grid(self, uuid: UUID):
+        """Drop what is cached to probe the dataset, e.g. when its content is deactivated."""
+        self._probe_grids.pop(uuid, None)
+        self._probe_contents.pop(uuid, None)
+
+    def _group_by_probe_grid(self, uuids) -> Dict[ProbeGrid, List[Tuple[int, UUID]]]:
+        """Group the (index, uuid) of the known datasets by their grid, so per grid work is only done once."""
+        by_grid: Dict[ProbeGrid, List[Tuple[int, UUID]]] = {}
+        for idx, uuid in enumerate(uuids):
+            grid = self._probe_grid(uuid) if uuid is not None else None
+            if grid is not None:
+                by_grid.setdefault(grid, []).append((idx, uuid))
+        return by_grid
+
+    def _positions_to_data_indexes(self, grids: List[ProbeGrid], xy_pos) -> Tuple[np.ndarray, np.ndarray]:
+        """Calculate the sift-internal data indexes of the lon/lat position for many grids at once.
+
+        The position is projected once per projection, the indexes are then computed for all grids together.
+        """
+        projected: Dict[str, Tuple[float, float]] = {}
+        for grid in grids:
+            if grid.proj_str not in projected:
+                projected[grid.proj_str] = tuple(xy_pos[:2]) if grid.is_lonlat else grid.proj(*xy_pos[:2])
+        x, y = np.array([projected[grid.proj_str] for grid in grids], dtype=np.float64).reshape((-1, 2)).T
+        origin_x, origin_y, cell_width, cell_height = (
+            np.array(
+                [(grid.origin_x, grid.origin_y, grid.cell_width, grid.cell_height) for grid in grids], dtype=np.float64
+            )
+            .reshape((-1, 4))
+            .T
+        )
+        with np.errstate(invalid="ignore"):
+            # positions outside of the projection's domain are infinite
+            column = np.floor((x - origin_x) / cell_width)
+            row = np.floor((y - origin_y) / cell_height)
+        return row, column
+
     def _position_to_data_index(self, info_or_uuid, xy_pos) -> Tuple[Optional[int], Optional[int]]:
         """Calculate the sift-internal data index from lon/lat values"""
-        info = self.get_info(info_or_uuid)
-        if info is None:
+        grid = self._probe_grid(info_or_uuid)
+        if grid is None:
             return None, None
-        # Assume `xy_pos` is lon/lat value
-        if "+proj=latlong" in info[Info.PROJ]:
-            x, y = xy_pos[:2]
-        else:
-            x, y = Proj(info[Info.PROJ])(*xy_pos)
-
-        column = np.int64(np.floor((x - info[Info.ORIGIN_X]) / info[Info.CELL_WIDTH]))
-        row = np.int64(np.floor((y - info[Info.ORIGIN_Y]) / info[Info.CELL_HEIGHT]))
-        return row, column
+        row, column = self._positions_to_data_indexes([grid], xy_pos)
+        if not (np.isfinite(row[0]) and np.isfinite(column[0])):
+            return None, None
+        return np.int64(row[0]), np.int64(column[0])
 
     def position_to_grid_index(self, info_or_uuid, xy_pos) -> Tuple[Optional[int], Optional[int]]:
         """Calculate the satellite grid index from lon/lat values"""
-        info = self.get_info(info_or_uuid)
-        if info is None:
+        grid = self._probe_grid(info_or_uuid)
+        if grid is None:
             return None, None
 
         row, column = self._position_to_data_index(info_or_uuid, xy_pos)
+        if row is None or column is None:
+            return None, None
 
-        grid_origin = info[Info.GRID_ORIGIN]
-        grid_first_index_of_rows = info[Info.GRID_FIRST_INDEX_Y]
-        grid_first_index_of_columns = info[Info.GRID_FIRST_INDEX_X]
-
-        rows, columns = info[Info.SHAPE]
-
-        if grid_origin[0].upper() == "S":
-            row = rows - 1 - row
-        row += grid_first_index_of_rows
+        if grid.grid_origin[0].upper() == "S":
+            row = grid.rows - 1 - row
+        row += grid.grid_first_index_y
 
-        if grid_origin[1].upper() == "E":
-            column = columns - 1 - column
-        column += grid_first_index_of_columns
+        if grid.grid_origin[1].upper() == "E":
+            column = grid.columns - 1 - column
+        column += grid.grid_first_index_x
 
         return row, column
 
     def dataset_proj(self, info_or_uuid):
         """Project lon/lat probe points to image X/Y"""
-        info = self.get_info(info_or_uuid)
-        return Proj(info[Info.PROJ])
+        return self._probe_grid(info_or_uuid).proj
 
     def _project_points(self, p, points):
         points = np.array(points)
@@ -686,11 +963,92 @@ class BaseWorkspace(QObject):
         row, col = self._position_to_data_index(info_or_uuid, xy_pos)
         if row is None or col is None:
             return None
-        data = self.get_content(info_or_uuid)
+        data = self._probe_content(self._uuid_of(info_or_uuid))
         if not ((0 <= col < data.shape[1]) and (0 <= row < data.shape[0])):
             raise ValueError("X/Y position is outside of image with UUID: %s", info_or_uuid)
         return data[row, col]
 
+    def get_content_points(self, uuids, xy_pos) -> list:
+        """Probe the contents of many datasets at the same lon/lat position.
+
+        The geolocation of every dataset is looked up once and cached, the
+        position is projected once per projection and converted to the
+        indexes of all contents in one go, so probing all layers whenever the
+        point probe moves stays cheap.
+
+        :return: the value of every content at the position, None where the
+            position is outside of the content or the dataset is unknown
+        """
+        values: list = [None] * len(uuids)
+        probed = [(idx, uuid, self._probe_grid(uuid)) for idx, uuid in enumerate(uuids) if uuid is not None]
+        probed = [(idx, uuid, grid) for idx, uuid, grid in probed if grid is not None]
+        if not probed:
+            return values
+        grids = [grid for _, _, grid in probed]
+        rows, columns = self._positions_to_data_indexes(grids, xy_pos)
+        shapes = np.array([(grid.rows, grid.columns) for grid in grids]).reshape((-1, 2))
+        with np.errstate(invalid="ignore"):
+            inside = (rows >= 0) & (rows < shapes[:, 0]) & (columns >= 0) & (columns < shapes[:, 1])
+        for (idx, uuid, _), row, column, is_inside in zip(probed, rows, columns, inside):
+            if is_inside:
+                values[idx] = self._probe_content(uuid)[int(row), int(column)]
+        return values
+
+    def get_content_time_series(self, uuids, xy_pos, radius: int = 0) -> np.ndarray:
+        """Probe the contents of all time steps of a layer at the same lon/lat position.
+
+        Time steps sharing a grid have their index computed once, only the
+        pixel (or the small neighbourhood within `radius` pixels) around the
+        position is then read from every content, so at most a page or two
+        of each memory mapped content is touched.
+
+        :param uuids: the datasets of the time steps
+        :param xy_pos: lon/lat position to probe
+        :param radius: average the valid pixels within this many rows/columns of the probed pixel
+        :return: float64 array with one value per dataset, NaN where the position is outside
+            of the content, the dataset is unknown or no valid pixel was found
+        """
+        values = np.full(len(uuids), np.nan, dtype=np.float64)
+        by_grid = self._group_by_probe_grid(uuids)
+        if not by_grid:
+            return values
+        grids = list(by_grid)
+        rows, columns = self._positions_to_data_indexes(grids, xy_pos)
+        for grid, row, column in zip(grids, rows, columns):
+            if not (0 <= row < grid.rows and 0 <= column < grid.columns):
+                continue
+            row_slice = slice(max(int(row) - radius, 0), int(row) + radius + 1)
+            column_slice = slice(max(int(column) - radius, 0), int(column) + radius + 1)
+            for idx, uuid in by_grid[grid]:
+                window = np.asarray(self._probe_content(uuid)[row_slice, column_slice], dtype=np.float64)
+                valid = window[np.isfinite(window)]
+                if valid.size:
+                    values[idx] = valid.mean()
+        return values
+
+    def get_region_statistics_time_series(self, uuids, points=None, categories=None) -> Dict:
+        """Compute the statistics within a lon/lat polygon for all time steps of a layer.
+
+        The polygon is rasterized once per grid shared by the time steps,
+        then the statistics of every time step are computed in parallel,
+        streaming the pixels of its content.
+
+        :param uuids: the datasets of the time steps
+        :param points: lon/lat vertices of the polygon, None for the full data
+        :param categories: (value, meaning) pairs of categorical data, see
+            :class:`~uwsift.workspace.statistics.StreamingStats`
+        :return: every statistic (or category value) with an array of its value for every dataset
+        """
+        regions: list = [None] * len(uuids)
+        for grid, members in self._group_by_probe_grid(uuids).items():
+            index_mask = None
+            if points is not None:
+                ring = LinearRing(self._project_points(grid.proj, points))
+                index_mask = polygon_index_mask(grid.affine, ring, (grid.rows, grid.columns))
+            for idx, uuid in members:
+                regions[idx] = (self._probe_content(uuid), index_mask)
+        return region_statistics_series(regions, categories)
+
     def get_content_polygon(self, info_or_uuid, points):
         data = self.get_content(info_or_uuid)
         trans = self._create_dataset_affine(info_or_uuid)
@@ -703,26 +1061,48 @@ class BaseWorkspace(QObject):
         return max([self.get_info(uuid) for uuid in uuids], key=lambda i: i[Info.CELL_WIDTH])[Info.UUID]
 
     def get_coordinate_mask_polygon(self, info_or_uuid, points):
+        """Get the lon/lat coordinates and the content of the pixels of a dataset within a lon/lat polygon.
+
+        :return: the :class:`CoordinateMask` of the pixels and their content
+        """
         data = self.get_content(info_or_uuid)
-        trans = self._create_dataset_affine(info_or_uuid)
-        p = self.dataset_proj(info_or_uuid)
-        points = self._project_points(p, points)
-        index_mask, data = content_within_shape(data, trans, LinearRing(points))
-        coords_mask = (index_mask[0] * trans.e + trans.f, index_mask[1] * trans.a + trans.c)
-        # coords_mask is (Y, X) corresponding to (rows, cols) like numpy
-        coords_mask = p(coords_mask[1], coords_mask[0], inverse=True)[::-1]
-        return coords_mask, data
+        grid = self._probe_grid(info_or_uuid)
+        trans = grid.affine
+        p = grid.proj
+        ring = LinearRing(self._project_points(p, points))
+        index_mask = polygon_index_mask(trans, ring, data.shape)
+
+        def _coordinate_mask():
+            # the centers of the pixels, (Y, X) corresponding to (rows, cols) like numpy
+            coords_mask = ((index_mask[0] + 0.5) * trans.e + trans.f, (index_mask[1] + 0.5) * trans.a + trans.c)
+            return tuple(p(coords_mask[1], coords_mask[0], inverse=True)[::-1])
+
+        # the same region is plotted for many layers and time steps on the same grid
+        key = (grid.proj_str, tuple(trans), tuple(ring.coords), data.shape[:2])
+        coords_mask = CoordinateMask(grid, index_mask, partial(self._coordinate_masks.get, key, _coordinate_mask))
+        return coords_mask, data[index_mask]
 
     def get_content_coordinate_mask(self, uuid: UUID, coords_mask):
+        """Get the content of the dataset at the lon/lat coordinates of the pixels of another dataset.
+
+        If `coords_mask` is a :class:`CoordinateMask` of a grid in the same
+        projection with cell sizes and offsets being integer multiples, the
+        pixel indexes are mapped directly. Otherwise the coordinates are
+        projected to the dataset's grid.
+        """
         data = self.get_content(uuid)
         assert data is not None  # nosec B101 # suppress mypy [index]
-        trans = self._create_dataset_affine(uuid)
-        p = self.dataset_proj(uuid)
+        grid = self._probe_grid(uuid)
+        if isinstance(coords_mask, CoordinateMask):
+            index_mask = map_grid_indexes(coords_mask.grid, grid, coords_mask.index_mask)
+            if index_mask is not None:
+                return data[index_mask]
+        trans = grid.affine
         # coords_mask is (Y, X) like a numpy array
-        coords_mask = p(coords_mask[1], coords_mask[0])[::-1]
+        coords_mask = grid.proj(coords_mask[1], coords_mask[0])[::-1]
         index_mask = (
-            np.round((coords_mask[0] - trans.f) / trans.e).astype(np.uint),
-            np.round((coords_mask[1] - trans.c) / trans.a).astype(np.uint),
+            np.floor((coords_mask[0] - trans.f) / trans.e).astype(np.uint),
+            np.floor((coords_mask[1] - trans.c) / trans.a).astype(np.uint),
         )
         return data[index_mask]
 
@@ -781,6 +1161,16 @@ class BaseWorkspace(QObject):
     def _get_active_content_by_uuid(self, uuid: UUID) -> Optional[ActiveContent]:
         pass
 
+    @abstractmethod
+    def _get_content_key_value(self, uuid: UUID, key: str):
+        """Get a key-value of the content of the dataset, which needn't be active, None if it isn't set."""
+        pass
+
+    @abstractmethod
+    def _update_content_key_values(self, uuid: UUID, key_values: dict):
+        """Persist `key_values` with the key-values of the active content of the dataset."""
+        pass
+
     def get_statistics_for_dataset_by_uuid(self, uuid: UUID) -> dict:
         ac = self._get_active_content_by_uuid(uuid)
         if ac:
@@ -789,43 +1179,56 @@ class BaseWorkspace(QObject):
             stats = {}
         return stats
 
+    def get_histogram_for_dataset_by_uuid(self, uuid: UUID) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Get the counts and bin edges of the histogram of the dataset's content.
+
+        The histogram is computed together with the statistics of the content
+        and kept in a file next to its data, so it isn't computed again when
+        the content is activated later on. None if the dataset isn't loaded or
+        has no histogram (e.g. categorical data).
+        """
+        ac = self._get_active_content_by_uuid(uuid)
+        return None if ac is None else ac.histogram
+
     def get_min_max_value_for_dataset_by_uuid(self, uuid: UUID):
         """Return the minimum and maximum value of a dataset given by its UUID.
 
-        Falls back to calculate these values if the minimum and maximum are not stored.
-        The UUID must identify an existing dataset.
+        The values persisted with the key-values of the content are used
+        without activating the content, otherwise they are calculated from the
+        active content. (None, None) if they can't be determined (yet).
         """
         assert uuid is not None  # nosec B101
+        actual_range = self._actual_ranges.get(uuid)
+        if actual_range is not None:
+            return actual_range
+        actual_range = self._get_content_key_value(uuid, ACTUAL_RANGE_KEY)
+        if actual_range is not None:
+            self._actual_ranges[uuid] = actual_range = tuple(actual_range)
+            return actual_range
         ac = self._get_active_content_by_uuid(uuid)
-        assert ac is not None  # nosec B101
+        if ac is None:
+            LOG.debug("Could not determine 'min/max' values: dataset content is not loaded.")
+            return None, None
         stats = ac.statistics
 
         if not stats:
             LOG.debug("Could not determine 'min/max' values: dataset has no computed statistics.")
             return None, None
 
-        stats_values = stats.get("stats")
-
-        if isinstance(stats_values, dict):
-            min_ranges = stats_values.get("min")
-            max_ranges = stats_values.get("max")
-        else:
+        actual_range = ac.actual_range
+        if actual_range is None:
             # TODO: The following is a workaround for a missing concept for color mapping of categorial data and
             #  should be revised!
             # We seem to have categorial data (a dataset with "flag_{values,meanings,masks}") where the values
             # stored are numbers but have no numerical meaning, only that of an identifier.
             # Currently, for technical reasons, we need to be able to get a value range (i.e. a kind of min/max
             # values) even for such a dataset, otherwise no colormap could be applied automatically.
-            # So, we trick the statistics module to compute everything as if the data was normal data:
-            # To achieve this we simply don't provide the xarr.attrs which the statistics module uses to distinguish
-            # categorial from normal data:
-            dataarray = xarray.DataArray(ac.data)
-            stats = dataset_statistical_analysis(dataarray)
-            min_ranges = stats.get("stats").get("min")
-            max_ranges = stats.get("stats").get("max")
-
-        if not min_ranges or not max_ranges:  # Note: bool([0]) == True!
+            # So, we take the range of the values as if the data was normal data.
+            actual_range = streaming_min_max(ac.data)
+
+        if actual_range is None:
             LOG.error("Could not determine 'min/max' values: dataset statistics are invalid.")
             return None, None
 
-        return min_ranges[0], max_ranges[0]
+        self._actual_ranges[uuid] = actual_range
+        return actual_range